@@ -24,15 +24,18 @@ elif current_platform == "darwin":
     base = None
     icon = os.path.join("icon", "mac", "icon.icns")
 
+# Resource bundles registered at runtime by src/mduyt/gui/resources.py
+rcc_include = [(os.path.join('src', 'resources', name), f'src/resources/{name}') for name in ('splash.rcc', 'shared.rcc')]
+
 # Define include_files with platform-specific bin folder
 if sys.platform == "win32":
     include_files = [
         os.path.join(pyside6_path, "plugins", "platforms"),  # Windows platform plugins
-    ] + bin_include
+    ] + bin_include + rcc_include
 elif sys.platform == "linux" or sys.platform == "darwin":  # Linux or macOS
     include_files = [
         os.path.join(pyside6_path, "Qt", "plugins", "platforms"),  # Linux/macOS platform plugins
-    ] + bin_include
+    ] + bin_include + rcc_include
 else:
     raise RuntimeError("Unsupported platform")
 
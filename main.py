@@ -4,26 +4,31 @@ import platform
 from PySide6.QtWidgets import QApplication, QSplashScreen
 from PySide6.QtGui import QIcon, QPixmap
 from PySide6.QtCore import Qt
-from src.mduyt.gui.mainwindow import MainWindow
-import src.mduyt.gui.resources_rc
-from src.mduyt.core.downloader import Downloader
+from src.mduyt.gui.resources import register_resources
 
 
 if __name__ == "__main__":
+    if "--import-budget" in sys.argv:
+        # Import-time report of everything loaded before the first paint
+        from src.mduyt.utils.importbudget import report
+        sys.exit(report())
+
     qt_app = QApplication(sys.argv)  # Rename app to qt_app
     qt_app.setStyle("fusion")
-    qt_app.setWindowIcon(QIcon("qrc:/icon.ico"))
 
-    # Create and display the splash screen
+    # The splash has its own small bundle so it can be shown before anything else loads
+    register_resources("splash.rcc")
     splash_pix = QPixmap(":/splash.png")  # Load the splash image
     splash = QSplashScreen(splash_pix, Qt.WindowStaysOnTopHint)
     splash.show()
     splash.showMessage("Loading modules...", Qt.AlignBottom | Qt.AlignLeft, Qt.white)
-    window = MainWindow()
-
-    # Simulate a loading process (if needed)
     qt_app.processEvents()  # Ensure the splash screen is displayed
 
+    register_resources("shared.rcc")
+    qt_app.setWindowIcon(QIcon(":/app.ico"))
+    from src.mduyt.gui.mainwindow import MainWindow
+    window = MainWindow()
+
     # Hide the splash screen after the main window is ready
     splash.finish(window)
 
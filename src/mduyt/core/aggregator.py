@@ -0,0 +1,72 @@
+import threading
+from PySide6.QtCore import QObject, QTimer, Signal, Slot
+from src.mduyt.core.progress import format_bytes, format_speed, format_eta
+
+
+class ProgressAggregator(QObject):
+    # Same payload as DownloaderSignals.progress, prefixed with the job key
+    progress = Signal(str, float, str, str, str, int, int)
+
+    def __init__(self, rate=20, parent=None):
+        super().__init__(parent)
+        self._lock = threading.Lock()
+        self._latest = {}
+        self.received = 0
+        self.emitted = 0
+        self.coalesced = 0
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.flush)
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        # Snapshots per second, clamped to something a progress bar can use
+        rate = max(1, min(60, int(rate)))
+        self._timer.setInterval(int(1000 / rate))
+
+    def start(self):
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+        self.flush()
+
+    def submit(self, key, event, current_item, total_items):
+        # Called from download threads for every progress record; only the
+        # latest record per job survives until the next flush.
+        with self._lock:
+            if key in self._latest:
+                self.coalesced += 1
+            self._latest[key] = (event, current_item, total_items)
+            self.received += 1
+
+    @Slot()
+    def flush(self):
+        with self._lock:
+            if not self._latest:
+                return
+            pending = self._latest
+            self._latest = {}
+
+        for key, (event, current_item, total_items) in pending.items():
+            if isinstance(event, tuple):
+                progress, file_size, download_speed, eta = event
+            else:
+                progress = event.percent
+                file_size = format_bytes(event.total_bytes)
+                download_speed = format_speed(event.speed)
+                eta = format_eta(event.eta)
+            self.emitted += 1
+            self.progress.emit(key, progress, file_size, download_speed, eta, current_item, total_items)
+
+    def discard(self, key):
+        with self._lock:
+            self._latest.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'received': self.received,
+                'emitted': self.emitted,
+                'coalesced': self.coalesced,
+                'pending': len(self._latest),
+            }
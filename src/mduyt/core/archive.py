@@ -0,0 +1,122 @@
+import os
+import math
+import hashlib
+import threading
+from env import root
+from src.mduyt.core.metacache import canonical_key, get_cache
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class DownloadArchive:
+    # Keys of everything downloaded before, in the "<extractor> <id>" format of
+    # yt-dlp's --download-archive file. The same file is passed to yt-dlp, so
+    # it records new items itself; the queue checks it before starting a job.
+    def __init__(self, path=None, history_store=None, bloom_threshold=500000):
+        self.path = path or os.path.join(root, 'archive.txt')
+        self.history_store = history_store
+        # Large archives get a Bloom filter in front of the set, which answers
+        # most "not downloaded yet" checks without touching the big set
+        self.bloom_threshold = bloom_threshold
+        self.bloom = None
+        self.keys = set()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        threading.Thread(target=self._load, daemon=True).start()
+
+    def _load(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    keys = set(line.strip() for line in f if line.strip())
+            else:
+                keys = self._import_history()
+            with self._lock:
+                self.keys |= keys
+                self._rebuild_bloom()
+        finally:
+            self._loaded.set()
+
+    def _import_history(self):
+        # First run: seed the archive with the URLs the history knows about
+        keys = set()
+        if self.history_store is not None:
+            for url in self.history_store.urls():
+                key = canonical_key(url)
+                if key:
+                    keys.add(key)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(f"{key}\n" for key in sorted(keys))
+        return keys
+
+    def _rebuild_bloom(self):
+        # Caller holds self._lock
+        if len(self.keys) < self.bloom_threshold:
+            self.bloom = None
+            return
+        self.bloom = BloomFilter(len(self.keys) * 2)
+        for key in self.keys:
+            self.bloom.add(key)
+
+    def wait_loaded(self, timeout=None):
+        return self._loaded.wait(timeout)
+
+    def __contains__(self, key):
+        self._loaded.wait()
+        with self._lock:
+            if self.bloom is not None and key not in self.bloom:
+                return False
+            return key in self.keys
+
+    def __len__(self):
+        with self._lock:
+            return len(self.keys)
+
+    def key_for_url(self, url):
+        return get_cache().key_for_url(url)
+
+    def contains_url(self, url):
+        key = self.key_for_url(url)
+        found = key is not None and key in self
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    def add(self, key, write=False):
+        # yt-dlp appends to the file itself; write=True is for keys it did not record
+        self._loaded.wait()
+        with self._lock:
+            if key in self.keys:
+                return
+            self.keys.add(key)
+            if self.bloom is not None:
+                self.bloom.add(key)
+            elif len(self.keys) >= self.bloom_threshold:
+                self._rebuild_bloom()
+            if write:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(f"{key}\n")
@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import shutil
+import platform
+import threading
+import subprocess
+from env import root
+
+BINARIES = ('yt-dlp', 'ffmpeg', 'ffprobe')
+
+
+def binary_dir(system=None):
+    system = system or platform.system().lower()
+    if system == 'windows':
+        return os.path.join(root, 'bin', 'win')
+    elif system == 'darwin':
+        if getattr(sys, 'frozen', False):
+            # Inside the bundled .app, construct the absolute path to bin/mac
+            return os.path.abspath(os.path.join(root, '..', 'Frameworks', 'bin', 'mac'))
+        # During development or non-bundled execution
+        return os.path.join(root, 'bin', 'mac')
+    elif system.startswith('linux'):
+        return os.path.join(root, 'bin', 'linux')
+    raise OSError(f"Unsupported operating system: {system}")
+
+
+def locate(name, system=None):
+    # Finds a binary without installing anything: the bundled copy on
+    # Windows/macOS, PATH or bin/linux on Linux
+    system = system or platform.system().lower()
+    if system == 'windows':
+        return os.path.join(binary_dir(system), f'{name}.exe')
+    if system == 'darwin':
+        return os.path.join(binary_dir(system), name)
+    found = shutil.which(name)
+    if found:
+        return found
+    bundled = os.path.join(binary_dir(system), name)
+    if os.path.exists(bundled):
+        return bundled
+    return name
+
+
+def run_quiet(cmd, timeout=15):
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace',
+                                timeout=timeout,
+                                creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def probe_version(name, path):
+    if name == 'yt-dlp':
+        output = run_quiet([path, '--version'])
+        return output.strip() if output else None
+    output = run_quiet([path, '-hide_banner', '-version'])
+    if not output:
+        return None
+    # "ffmpeg version 7.0.1-full_build-www.gyan.dev Copyright ..."
+    parts = output.split()
+    return parts[2] if len(parts) > 2 else None
+
+
+def probe_encoders(path):
+    output = run_quiet([path, '-hide_banner', '-encoders'])
+    encoders = []
+    for line in (output or '').splitlines():
+        # " V....D libx264              libx264 H.264 / AVC ..."
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in 'VAS' and parts[1] != '=':
+            encoders.append(parts[1])
+    return encoders
+
+
+class BinaryManifest:
+    # Paths, versions and capabilities of the external tools, stored in
+    # cache/binaries.json. Startup only reads this file; the binaries are
+    # probed again in the background when their mtime or size changed.
+    def __init__(self, path=None):
+        self.path = path or os.path.join(root, 'cache', 'binaries.json')
+        self.system = platform.system().lower()
+        self._lock = threading.Lock()
+        self.entries = self._load()
+        self.revalidating = False
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('system') != self.system:
+            return {}
+        return data.get('binaries', {})
+
+    def save(self):
+        with self._lock:
+            data = {'system': self.system, 'binaries': self.entries}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(temp_path, self.path)
+
+    def path_of(self, name):
+        with self._lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                # First run: locating is cheap, probing waits for revalidate()
+                entry = {'path': locate(name, self.system), 'version': None, 'mtime': None, 'size': None,
+                         'capabilities': {}}
+                self.entries[name] = entry
+            return entry['path']
+
+    def version(self, name):
+        with self._lock:
+            return (self.entries.get(name) or {}).get('version')
+
+    def capability(self, name, key, default=None):
+        with self._lock:
+            return (self.entries.get(name) or {}).get('capabilities', {}).get(key, default)
+
+    def set_capability(self, name, key, value):
+        with self._lock:
+            self.entries.setdefault(name, {'path': locate(name, self.system), 'version': None, 'mtime': None,
+                                           'size': None, 'capabilities': {}})['capabilities'][key] = value
+        self.save()
+
+    def _stat(self, path):
+        resolved = path if os.path.isabs(path) else shutil.which(path)
+        try:
+            stat = os.stat(resolved)
+        except (OSError, TypeError):
+            return None, None
+        return stat.st_mtime, stat.st_size
+
+    def revalidate(self):
+        # Re-probes the binaries that changed on disk since the manifest was written
+        changed = False
+        for name in BINARIES:
+            path = self.path_of(name)
+            mtime, size = self._stat(path)
+            if mtime is None:
+                # Moved or removed; look again
+                path = locate(name, self.system)
+                mtime, size = self._stat(path)
+                if mtime is None:
+                    print(f"{name} was not found; install it with your package manager")
+            with self._lock:
+                entry = self.entries[name]
+                if entry['path'] == path and entry['mtime'] == mtime and entry['size'] == size \
+                        and entry['version'] is not None:
+                    continue
+            entry = {'path': path, 'version': probe_version(name, path) if mtime else None, 'mtime': mtime,
+                     'size': size, 'capabilities': {}}
+            if name == 'ffmpeg' and mtime:
+                entry['capabilities']['encoders'] = probe_encoders(path)
+            with self._lock:
+                self.entries[name] = entry
+            changed = True
+        if changed:
+            self.save()
+        return changed
+
+    def revalidate_async(self, callback=None):
+        if self.revalidating:
+            return
+        self.revalidating = True
+
+        def run():
+            try:
+                changed = self.revalidate()
+            finally:
+                self.revalidating = False
+            if callback is not None:
+                callback(changed)
+
+        threading.Thread(target=run, daemon=True).start()
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_manifest():
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = BinaryManifest()
+        return _manifest
@@ -1,20 +1,28 @@
 import os
 import re
+import json
 import subprocess
-import sys
 import platform
-import shutil
 from PySide6.QtCore import QObject, Signal
 from pathlib import Path
 from env import root
 import unicodedata
-# import yt_dlp
-# import json  # Make sure to import the json module
+from src.mduyt.core.progress import (structured_progress_args, decode_line,
+                                     format_bytes, format_speed, format_eta)
+from src.mduyt.core.inprocess import ENGINE_SUBPROCESS, ENGINE_INPROCESS, get_engine
+from src.mduyt.core.metacache import get_cache
+from src.mduyt.core.binaries import binary_dir, get_manifest
+from src.mduyt.core.postprocessing import PostProcessTask, ENCODE, run_task, estimate_saved, describe_path
+
+def is_youtube_url(url):
+    return "youtube.com" in url or "youtu.be" in url
 
 class DownloaderSignals(QObject):
     progress = Signal(float, str, str, str, int, int)
     title_fetched = Signal(str)
+    item_started = Signal(str)
     file_downloaded = Signal(str, str, str)
+    postprocess = Signal(str, str)
     finished = Signal()
     error = Signal(str)
 
@@ -31,151 +39,360 @@ class Downloader(QObject):
         self.video_file = None
         self.audio_file = None
         self.download_dir = None
+        # ENGINE_SUBPROCESS starts a yt-dlp executable per download,
+        # ENGINE_INPROCESS reuses warm yt_dlp.YoutubeDL instances
+        self.engine = ENGINE_SUBPROCESS
+        self.structured_progress = True
+        # Single videos are started from a cached .info.json when one is fresh
+        self.use_metadata_cache = True
+        self.metadata_cache = get_cache()
+        # Path of a --download-archive file; set by the queue, not for single downloads
+        self.download_archive = None
+        self.item_keys = []
+        self.current_url = None
+        self.completed_urls = set()
+        # Optional ProgressAggregator; when set, progress records are handed to
+        # it instead of being emitted one signal per line.
+        self.progress_sink = None
+        # Optional PostProcessor that runs processing_clip off the download thread
+        self.postprocessor = None
+        self.job_key = 'default'
+        self.current_item = 0
+        self.total_items = 1
 
     rootpath = root
     def get_workdir(self):
-        if self.system == 'windows':  # Windows
-            return os.path.join(self.rootpath, 'bin', 'win')
-        elif self.system == 'darwin':  # macOS
-            if getattr(sys, 'frozen', False):
-                # Inside the bundled .app, construct the absolute path to bin/mac
-                return os.path.abspath(os.path.join(self.rootpath, '..', 'Frameworks', 'bin', 'mac'))
-            else:
-                # During development or non-bundled execution
-                return os.path.join(self.rootpath, 'bin', 'mac')
-        elif self.system.startswith('linux'):  # Linux
-            return '/usr/local/bin'  # Default location for user-installed binaries
-        else:
-            raise OSError(f"Unsupported operating system: {self.system}")
+        return binary_dir(self.system)
 
     def get_yt_dlp_binary(self):
-        if self.system == 'windows':
-            return os.path.join(self.workdir, 'yt-dlp.exe')
-        elif self.system == 'darwin':
-            return os.path.join(self.workdir, 'yt-dlp')
-        elif self.system == 'linux':
-            return self.get_linux_binary('yt-dlp')
-        else:
-            raise OSError(f"Unsupported operating system: {self.system}")
-    
+        # Read from the binary manifest; nothing is probed or installed here
+        return get_manifest().path_of('yt-dlp')
+
     def get_ffmpeg_binary(self):
-        if self.system == 'windows':
-            return os.path.join(self.workdir, 'ffmpeg.exe')
-        elif self.system == 'darwin':
-            return os.path.join(self.workdir, 'ffmpeg')
-        elif self.system == 'linux':
-            return self.get_linux_binary('ffmpeg')
+        return get_manifest().path_of('ffmpeg')
+
+    def is_youtube(self, url):
+        return is_youtube_url(url)
+
+    def build_format(self, url, resolution, fps):
+        # Only YouTube gets an explicit format, other sites use yt-dlp's default
+        if not self.is_youtube(url):
+            return None
+        video_filter = ''
+        if resolution and resolution != 'best':
+            video_filter += f'[height<={resolution}]'
+        if fps and fps != 'auto':
+            video_filter += f'[fps<={fps}]'
+        return f"bestvideo{video_filter}[ext=mp4]+bestaudio[ext=m4a]/best{video_filter}[ext=mp4]/best"
+
+    def build_command(self, url, is_audio, audio_format, resolution, fps, download_dir, is_playlist, with_thumbnail,
+                      batch=False):
+        # With batch=True the URLs are read from stdin and url only decides the format
+        # --continue resumes the .part file left behind by an interrupted run
+        cmd = [self.yt_dlp_binary, '--no-mtime', '--newline', '--continue']
+
+        info_path = None
+        cache_info = self.use_metadata_cache and not is_playlist
+        if cache_info and not batch:
+            info_path = self.metadata_cache.lookup(url)
+        if info_path:
+            # Skips the extraction round trip entirely
+            cmd.extend(['--load-info-json', info_path])
         else:
-            raise OSError(f"Unsupported operating system: {self.system}")        
-
-    def get_linux_binary(self, binary_name):
-        if shutil.which(binary_name):
-            return binary_name
-
-        package_managers = [
-            ('apt-get', f'apt install -y {binary_name}'),
-            ('pacman', f'pacman -S --noconfirm {binary_name}'),
-            ('dnf', f'dnf install -y {binary_name}'),
-            ('yum', f'yum install -y {binary_name}'),
-            ('zypper', f'zypper install -y {binary_name}')
-        ]
-
-        for pm, install_cmd in package_managers:
-            if shutil.which(pm):
-                try:
-                    subprocess.run(['sudo', pm, 'update'], check=True)
-                    subprocess.run(['sudo'] + install_cmd.split(), check=True)
-                    return binary_name
-                except subprocess.CalledProcessError:
-                    print(f"Failed to install {binary_name} using {pm}")
-
-        print(f"Using bundled {binary_name} binary")
-        return os.path.join(bin, 'linux', binary_name)
-    
-    def download(self, url, is_audio, audio_format, resolution, fps, download_dir, is_playlist, with_thumbnail):
+            if batch:
+                cmd.extend(['--batch-file', '-'])
+            else:
+                cmd.append(url)
+            if cache_info:
+                cmd.extend(['--write-info-json', '-o', f'infojson:{self.metadata_cache.output_template()}'])
+
+        if self.system == 'darwin':
+            cmd.append(f'--ffmpeg-location={self.workdir}')
+
+        if self.structured_progress:
+            cmd.extend(structured_progress_args())
+
+        cmd.extend(['-P', download_dir])
+
+        if is_playlist:
+            cmd.extend(['--output', '%(playlist_title)s/%(title)s.%(ext)s'])
+        else:
+            cmd.extend(['--output', '%(title)s.%(ext)s'])
+
+        if with_thumbnail:
+            cmd.extend(["--embed-thumbnail", "--embed-metadata"])
+
+        if is_audio:
+            cmd.extend(['-x', '--audio-format', audio_format])
+        else:
+            format_string = self.build_format(url, resolution, fps)
+            if format_string:
+                cmd.extend(['-f', format_string])
+
+        if self.download_archive:
+            cmd.extend(['--download-archive', self.download_archive])
+
+        cmd.append('--yes-playlist' if is_playlist else '--no-playlist')
+        return cmd
+
+    def reset_state(self, download_dir, is_audio):
         self.download_dir = download_dir
         self.video_file = None
         self.audio_file = None
         self.is_audio_download = is_audio
+        self.current_item = 0
+        self.total_items = 1
+        self.item_keys = []
+        self.current_url = None
+        self.completed_urls = set()
+
+    def run_process(self, cmd, input_text=None):
+        # Runs yt-dlp and dispatches its output; returns the exit code, or None
+        # when the user stopped the download. stop_flag is not reset here: a
+        # stop() that lands before the process starts must still count.
+        if self.stop_flag:
+            self.signals.error.emit("Download stopped by user")
+            return None
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE if input_text is not None else None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            encoding='utf-8',
+            errors='replace',
+            creationflags=subprocess.CREATE_NO_WINDOW if self.system == 'windows' else 0
+        )
+        if input_text is not None:
+            self.process.stdin.write(input_text)
+            self.process.stdin.close()
+
+        for line in self.process.stdout:
+            if self.stop_flag:
+                self.process.terminate()
+                self.signals.error.emit("Download stopped by user")
+                return None
+
+            event = decode_line(line)
+            if event is not None:
+                self.handle_event(event)
+            else:
+                self.handle_text_line(line)
 
-        try:
-            self.stop_flag = False
-            if self.system == 'windows':
-                cmd = [self.yt_dlp_binary, url, '--no-mtime', '--newline']
-            elif self.system == 'darwin':
-                cmd = [self.yt_dlp_binary, url, '--no-mtime', '--newline', f'--ffmpeg-location={self.workdir}']
-            print(self.yt_dlp_binary)
-            print(self.yt_dlp_binary)
-
-            cmd.extend(['-P', download_dir])
+        self.process.wait()
+        if self.stop_flag:
+            return None
+        return self.process.returncode
 
-            if is_playlist:
-                cmd.extend(['--output', '%(playlist_title)s/%(title)s.%(ext)s'])
-            else:
-                cmd.extend(['--output', '%(title)s.%(ext)s'])
+    def download(self, url, is_audio, audio_format, resolution, fps, download_dir, is_playlist, with_thumbnail):
+        self.reset_state(download_dir, is_audio)
 
-            if with_thumbnail:
-                cmd.extend(["--embed-thumbnail", "--embed-metadata"])
+        if self.engine == ENGINE_INPROCESS:
+            get_engine().download(self, url, is_audio, audio_format, resolution, fps, download_dir,
+                                  is_playlist, with_thumbnail)
+            return
 
-            if is_audio:
-                cmd.extend(['-x', '--audio-format', audio_format])
+        try:
+            self.current_url = url
+            cmd = self.build_command(url, is_audio, audio_format, resolution, fps, download_dir,
+                                     is_playlist, with_thumbnail)
+            returncode = self.run_process(cmd)
+            if returncode is None:
+                return
+            if returncode != 0:
+                self.signals.error.emit(f"yt-dlp exited with code {returncode}")
             else:
-                # Check if the URL is for YouTube
-                if "youtube.com" in url or "youtu.be" in url:
-                    format_string = f"bestvideo[height<={resolution}][ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best"
-                    cmd.extend(['-f', format_string])
-                else:
-                    pass
-                # Append FPS option if provided and relevant
-                if fps and ("youtube.com" in url or "youtu.be" in url):
-                    cmd.append(f'--fps={fps}')
-
-            cmd.append('--yes-playlist' if is_playlist else '--no-playlist')
-
-            self.process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                creationflags=subprocess.CREATE_NO_WINDOW if self.system == 'windows' else 0
-            )
-
-            current_item = 0
-            total_items = 1
-            for line in self.process.stdout:
-                if self.stop_flag:
-                    self.process.terminate()
-                    self.signals.error.emit("Download stopped by user")
-                    return
-
-                if '[download] Downloading item' in line:
-                    match = re.search(r'item (\d+) of (\d+)', line)
-                    if match:
-                        current_item = int(match.group(1))
-                        total_items = int(match.group(2))
-                elif '[download]' in line:
-                    progress, file_size, download_speed, eta = self.parse_progress(line)
-                    self.signals.progress.emit(progress, file_size, download_speed, eta, current_item, total_items)
-                elif '[download] Destination:' in line:
-                    self.parse_destination(line)
-                elif '[ExtractAudio] Destination:' in line or '[Merger] Merging formats into' in line:
-                    self.parse_destination(line)
-
-            self.process.wait()
-            if self.process.returncode != 0 and not self.stop_flag:
-                self.signals.error.emit(f"yt-dlp exited with code {self.process.returncode}")
-            elif not self.stop_flag:
+                self.register_cached_info(is_playlist)
                 self.signals.finished.emit()
 
         except Exception as e:
             self.signals.error.emit(str(e))
             print(self.yt_dlp_binary)
 
+    def download_batch(self, urls, is_audio, audio_format, resolution, fps, download_dir, with_thumbnail):
+        # One yt-dlp process for several single-video URLs that share their
+        # options. Item records carry the original URL, which is how progress
+        # and files are attributed; item_started announces each switch.
+        # Returns the set of URLs that produced a file.
+        self.reset_state(download_dir, is_audio)
+        try:
+            cmd = self.build_command(urls[0], is_audio, audio_format, resolution, fps, download_dir,
+                                     False, with_thumbnail, batch=True)
+            returncode = self.run_process(cmd, '\n'.join(urls) + '\n')
+            if returncode is None:
+                return self.completed_urls
+            self.register_cached_info(False)
+            if returncode != 0:
+                self.signals.error.emit(f"yt-dlp exited with code {returncode}")
+            else:
+                self.signals.finished.emit()
+        except Exception as e:
+            self.signals.error.emit(str(e))
+        return self.completed_urls
+
+    def handle_event(self, event):
+        if event.kind == 'download':
+            if self.progress_sink is not None:
+                self.progress_sink.submit(self.job_key, event, self.current_item, self.total_items)
+            else:
+                self.signals.progress.emit(event.percent, format_bytes(event.total_bytes),
+                                           format_speed(event.speed), format_eta(event.eta),
+                                           self.current_item, self.total_items)
+        elif event.kind == 'item':
+            if event.url and event.url != self.current_url:
+                self.current_url = event.url
+                self.signals.item_started.emit(event.url)
+            if event.extractor_key and event.video_id:
+                self.item_keys.append((event.extractor_key, event.video_id, self.current_url))
+            if event.item_index:
+                self.current_item = event.item_index
+            if event.item_count:
+                self.total_items = event.item_count
+            if event.title:
+                self.signals.title_fetched.emit(event.title)
+        elif event.kind == 'destination':
+            if event.filepath:
+                if self.current_url:
+                    self.completed_urls.add(self.current_url)
+                self.report_file(event.filepath)
+        elif event.kind == 'postprocess':
+            if event.postprocessor:
+                self.signals.postprocess.emit(event.postprocessor, event.status)
+
+    def register_cached_info(self, is_playlist):
+        if self.use_metadata_cache and not is_playlist:
+            for extractor_key, video_id, url in self.item_keys:
+                self.metadata_cache.register(url, extractor_key, video_id)
+
+    def handle_text_line(self, line):
+        # Fallback for plain yt-dlp output (structured_progress disabled).
+        # The more specific prefixes have to be checked before the generic one.
+        if '[download] Downloading item' in line:
+            match = re.search(r'item (\d+) of (\d+)', line)
+            if match:
+                self.current_item = int(match.group(1))
+                self.total_items = int(match.group(2))
+        elif '[download] Destination:' in line:
+            self.parse_destination(line)
+        elif '[download]' in line:
+            values = self.parse_progress(line)
+            if self.progress_sink is not None:
+                self.progress_sink.submit(self.job_key, values, self.current_item, self.total_items)
+            else:
+                self.signals.progress.emit(*values, self.current_item, self.total_items)
+        elif '[ExtractAudio] Destination:' in line or '[Merger] Merging formats into' in line:
+            self.parse_destination(line)
+
     def stop(self):
         self.stop_flag = True
         if self.process:
             self.process.terminate()
 
+    def fetch_info(self, url, cancel_event=None):
+        # Resolves metadata for a single video without downloading it. The
+        # result goes through the metadata cache, so a following download()
+        # of the same URL starts from --load-info-json.
+        info = self.metadata_cache.get(url)
+        if info is not None:
+            return info
+
+        if self.engine == ENGINE_INPROCESS:
+            info = get_engine().extract_info(self, url, cancel_event=cancel_event)
+            if info is not None and info.get('_type', 'video') == 'video':
+                self.metadata_cache.put(info, url)
+            return info
+
+        info = self.run_json([self.yt_dlp_binary, '-J', '--no-playlist', '--no-warnings', url], cancel_event)
+        if info is not None and info.get('_type', 'video') == 'video':
+            self.metadata_cache.put(info, url)
+        return info
+
+    def enumerate_playlist(self, url, cancel_event=None):
+        # Cheap listing of a playlist's entries without resolving each video.
+        # Returns (playlist_title, [entry_url, ...]) or None.
+        if self.engine == ENGINE_INPROCESS:
+            info = get_engine().extract_info(self, url, flat=True, cancel_event=cancel_event)
+        else:
+            info = self.run_json([self.yt_dlp_binary, '-J', '--flat-playlist', '--yes-playlist',
+                                  '--no-warnings', url], cancel_event)
+        if info is None:
+            return None
+        entries = []
+        for entry in info.get('entries') or []:
+            if not entry:
+                continue
+            entry_url = entry.get('url') or entry.get('webpage_url')
+            if entry_url:
+                entries.append(entry_url)
+        return info.get('title') or info.get('id') or 'Playlist', entries
+
+    def playlist_title(self, url):
+        # Playlist metadata only; --playlist-items 0 skips the entries
+        if self.engine == ENGINE_INPROCESS:
+            info = get_engine().extract_info(self, url, flat=True)
+        else:
+            info = self.run_json([self.yt_dlp_binary, '-J', '--flat-playlist', '--playlist-items', '0',
+                                  '--no-warnings', url])
+        if info is None:
+            return None
+        return info.get('title') or info.get('id')
+
+    def stream_playlist(self, url):
+        # Yields (video_id, entry_url) in playlist order while yt-dlp is still
+        # listing. Closing the generator early stops the listing, so a caller
+        # that only needs the newest entries never walks the whole playlist.
+        if self.engine == ENGINE_INPROCESS:
+            yield from get_engine().stream_entries(self, url)
+            return
+
+        cmd = [self.yt_dlp_binary, '--flat-playlist', '--lazy-playlist', '--yes-playlist', '--no-warnings',
+               '--print', '%(id)s\t%(url)s', url]
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+            encoding='utf-8',
+            errors='replace',
+            creationflags=subprocess.CREATE_NO_WINDOW if self.system == 'windows' else 0
+        )
+        try:
+            for line in process.stdout:
+                video_id, _, entry_url = line.rstrip('\n').partition('\t')
+                if video_id and entry_url and entry_url != 'NA':
+                    yield video_id, entry_url
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+    def run_json(self, cmd, cancel_event=None):
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+            encoding='utf-8',
+            errors='replace',
+            creationflags=subprocess.CREATE_NO_WINDOW if self.system == 'windows' else 0
+        )
+        while True:
+            try:
+                output, _ = process.communicate(timeout=0.2)
+                break
+            except subprocess.TimeoutExpired:
+                if cancel_event is not None and cancel_event.is_set():
+                    process.kill()
+                    process.communicate()
+                    return None
+
+        if process.returncode != 0:
+            return None
+        try:
+            return json.loads(output)
+        except ValueError:
+            return None
+
     def parse_progress(self, line):
         progress = 0
         file_size = ""
@@ -209,27 +426,30 @@ class Downloader(QObject):
             # Remove quotes if present
             if file_path.startswith('"') and file_path.endswith('"'):
                 file_path = file_path[1:-1]
-            
-            # Ensure the file_path is absolute
-            if not os.path.isabs(file_path):
-                file_path = os.path.join(self.download_dir, file_path)
-            
-            # Normalize the path
-            file_path = os.path.normpath(file_path)
-            
-            # Get the filename and directory path separately
-            filename = os.path.basename(file_path)
-            dir_path = os.path.dirname(file_path)
-            
-            # Determine the file type
-            file_type = self.determine_file_type(filename)
-            
-            # Normalize the paths
-            normalized_filename = self.normalize_unicode(filename)
-            normalized_path = self.normalize_unicode(dir_path)
-            
-            # Emit the file_downloaded signal
-            self.signals.file_downloaded.emit(normalized_filename, normalized_path, file_type)
+
+            self.report_file(file_path)
+
+    def report_file(self, file_path):
+        # Ensure the file_path is absolute
+        if not os.path.isabs(file_path):
+            file_path = os.path.join(self.download_dir, file_path)
+        
+        # Normalize the path
+        file_path = os.path.normpath(file_path)
+        
+        # Get the filename and directory path separately
+        filename = os.path.basename(file_path)
+        dir_path = os.path.dirname(file_path)
+        
+        # Determine the file type
+        file_type = self.determine_file_type(filename)
+        
+        # Normalize the paths
+        normalized_filename = self.normalize_unicode(filename)
+        normalized_path = self.normalize_unicode(dir_path)
+        
+        # Emit the file_downloaded signal
+        self.signals.file_downloaded.emit(normalized_filename, normalized_path, file_type)
 
     def determine_file_type(self, filename):
         if self.is_audio_download:
@@ -243,51 +463,38 @@ class Downloader(QObject):
         # Normalize the Unicode string using NFKC or NFC (Normalization Form)
         return unicodedata.normalize('NFC', text)
 
+    def report_task_progress(self, task):
+        # Encode progress takes the same route as download progress
+        if self.progress_sink is not None:
+            self.progress_sink.submit(task.progress_key, task.progress_values(), 1, 1)
+        else:
+            self.signals.progress.emit(*task.progress_values(), 1, 1)
+
     def processing_clip(self, output_file, codec='libx264', bitrate='5M', preset='fast'):
         if not self.video_file:
             self.signals.error.emit("Video file not available for processing")
-            return
+            return None
 
-        try:
-            output_path, output_filename = os.path.split(output_file)
-            output_name, _ = os.path.splitext(output_filename)
-
-            cmd = [
-                self.ffmpeg_binary,
-                '-y',  # Overwrite output files without asking
-                '-i', self.video_file,  # Input video file
-            ]
-
-            if self.audio_file:
-                cmd.extend(['-i', self.audio_file])  # Input audio file if available
-
-            cmd.extend([
-                '-c:v', codec,  # Video codec
-                '-c:a', 'aac',  # Audio codec
-                '-b:v', bitrate,  # Video bitrate
-                '-preset', preset,  # Encoding preset
-                '-strict', 'experimental',  # Allow experimental codecs
-                f'{os.path.join(output_path, output_name)}.mp4'  # Output file
-            ])
-
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                creationflags=subprocess.CREATE_NO_WINDOW if self.system == 'windows' else 0
-            )
+        output_path, output_filename = os.path.split(output_file)
+        output_name, _ = os.path.splitext(output_filename)
+        output_file_path = f'{os.path.join(output_path, output_name)}.mp4'
+        inputs = [self.video_file] + ([self.audio_file] if self.audio_file else [])
+        # Inputs that already hold the target codecs are only remuxed
+        task = PostProcessTask(ENCODE, inputs, output_file_path,
+                               {'args': ['-c:v', codec, '-b:v', bitrate, '-preset', preset], 'allow_copy': True})
 
-            for line in process.stdout:
-                # You can add progress parsing here if needed
-                print(line.strip())
+        if self.postprocessor is not None:
+            # Converted by the post-processing pool, this thread is free for the
+            # next download; the pool's signals report the result
+            return self.postprocessor.submit(task)
 
-            process.wait()
-            if process.returncode != 0:
-                self.signals.error.emit(f"FFmpeg exited with code {process.returncode}")
-            else:
-                output_file_path = f'{os.path.join(output_path, output_name)}.mp4'
+        try:
+            if run_task(task, self.ffmpeg_binary, self.report_task_progress):
+                task.saved_seconds = estimate_saved(task)
+                self.signals.postprocess.emit(describe_path(task), 'finished')
                 self.signals.file_downloaded.emit(os.path.basename(output_file_path), output_file_path, "Processed Clip")
-
+            else:
+                self.signals.error.emit(task.error)
         except Exception as e:
-            self.signals.error.emit(str(e))
\ No newline at end of file
+            self.signals.error.emit(str(e))
+        return task
\ No newline at end of file
@@ -0,0 +1,640 @@
+import os
+import re
+import heapq
+import itertools
+import threading
+from PySide6.QtCore import QObject, Qt, Signal
+from src.mduyt.core.downloader import Downloader, is_youtube_url
+from src.mduyt.core.inprocess import ENGINE_SUBPROCESS
+from src.mduyt.core.metacache import make_key
+from src.mduyt.core.postprocessing import encode_task
+
+
+class DownloadOptions:
+    def __init__(self, is_audio, audio_format, resolution, fps, download_dir, is_playlist, with_thumbnail,
+                 encoding=None):
+        self.is_audio = is_audio
+        self.audio_format = audio_format
+        self.resolution = resolution
+        self.fps = fps
+        self.download_dir = download_dir
+        self.is_playlist = is_playlist
+        self.with_thumbnail = with_thumbnail
+        # ffmpeg arguments from the custom encoding options; applied by the
+        # post-processing stage after the download, so not part of key()
+        self.encoding = encoding
+
+    def key(self):
+        return (self.is_audio, self.audio_format, self.resolution, self.fps,
+                self.download_dir, self.is_playlist, self.with_thumbnail)
+
+    def as_args(self):
+        # Positional arguments of Downloader.download after the URL
+        return (self.is_audio, self.audio_format, self.resolution, self.fps,
+                self.download_dir, self.is_playlist, self.with_thumbnail)
+
+    def for_playlist_item(self, folder):
+        # Per-item options reproducing the %(playlist_title)s/ output layout
+        return DownloadOptions(self.is_audio, self.audio_format, self.resolution, self.fps,
+                               os.path.join(self.download_dir, folder), False, self.with_thumbnail,
+                               self.encoding)
+
+
+def playlist_folder(title):
+    # Same folder name yt-dlp derives from %(playlist_title)s
+    try:
+        from yt_dlp.utils import sanitize_filename
+        return sanitize_filename(title)
+    except ImportError:
+        return re.sub(r'[<>:"/\\|?*]', '_', title).strip() or 'Playlist'
+
+
+class DownloadJob:
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    # Already in the download archive, never started
+    SKIPPED = 'skipped'
+    # Downloaded, its files are still being converted
+    PROCESSING = 'processing'
+
+    def __init__(self, job_id, url, options, priority=0):
+        self.id = job_id
+        self.url = url
+        self.options = options
+        self.priority = priority
+        self.state = self.PENDING
+        self.progress = 0.0
+        self.error = None
+        self.files = []
+        self.downloader = None
+        self.attempts = 0
+        self.group = None
+        # PostProcessTasks started for the downloaded files
+        self.postprocess = []
+
+    @property
+    def done(self):
+        return self.state in (self.FINISHED, self.FAILED, self.CANCELLED, self.SKIPPED)
+
+
+class PlaylistGroup:
+    def __init__(self, group_id, url, title, concurrency):
+        self.id = group_id
+        self.url = url
+        self.title = title
+        self.concurrency = concurrency
+        self.jobs = []
+        self.running = 0
+        # Entries parked while the playlist is at its concurrency limit
+        self.waiting = []
+
+    @property
+    def progress(self):
+        if not self.jobs:
+            return 0.0
+        return sum(100.0 if job.done else job.progress for job in self.jobs) / len(self.jobs)
+
+    @property
+    def completed(self):
+        return sum(1 for job in self.jobs if job.done)
+
+
+class DownloadQueueSignals(QObject):
+    job_added = Signal(object)
+    job_started = Signal(object)
+    file_downloaded = Signal(object, str, str, str)
+    job_finished = Signal(object)
+    job_failed = Signal(object, str)
+    job_skipped = Signal(object)
+    queue_drained = Signal(dict)
+    playlist_added = Signal(object)
+    playlist_failed = Signal(str, str)
+    postprocess_failed = Signal(object, str)
+
+
+class DownloadQueue:
+    FIFO = 'fifo'
+    PRIORITY = 'priority'
+
+    def __init__(self, max_workers=3, order=FIFO, progress_sink=None, engine=ENGINE_SUBPROCESS, batch_size=1,
+                 journal=None, archive=None, postprocessor=None):
+        self.max_workers = max(1, int(max_workers))
+        # Up to batch_size compatible single-video jobs share one yt-dlp process
+        self.batch_size = max(1, int(batch_size))
+        self.batch_retries = 0
+        self.order = order
+        self.progress_sink = progress_sink
+        self.engine = engine
+        # Optional JobJournal that lets unfinished jobs survive a restart
+        self.journal = journal
+        # Optional DownloadArchive; jobs it already knows are skipped before any process starts
+        self.archive = archive
+        self.skipped = 0
+        # Optional PostProcessor; files of jobs with encoding options go there
+        # and are reported once converted, while the worker moves on
+        self.postprocessor = postprocessor
+        self.signals = DownloadQueueSignals()
+        if postprocessor is not None:
+            postprocessor.signals.task_finished.connect(self._on_task_finished, Qt.DirectConnection)
+            postprocessor.signals.task_failed.connect(self._on_task_failed, Qt.DirectConnection)
+            postprocessor.signals.task_cancelled.connect(self._on_task_cancelled, Qt.DirectConnection)
+        self.jobs = {}
+        self.groups = {}
+        self._heap = []
+        # Pending heap entries by batch key, so a batch is filled without
+        # scanning the whole heap; stale entries are dropped as they come up
+        self._batchable = {}
+        # Cancel events of playlists that are still being listed
+        self._expansions = set()
+        self._counter = itertools.count(1)
+        self._lock = threading.Condition()
+        self._workers = 0
+        self._running = 0
+        self._processing = 0
+
+    def set_max_workers(self, max_workers):
+        with self._lock:
+            self.max_workers = max(1, int(max_workers))
+            self._spawn_workers()
+
+    def enqueue(self, url, options, priority=0, group=None):
+        return self.enqueue_many([url], options, priority, group)[0]
+
+    def enqueue_many(self, urls, options, priority=0, group=None, cancel_event=None):
+        # The journal is written before the jobs become visible to workers and
+        # cancel(), outside the lock and with one fsync for all of them
+        jobs = []
+        for url in urls:
+            job = DownloadJob(str(next(self._counter)), url, options, priority)
+            job.group = group
+            jobs.append(job)
+        if self.journal is not None and jobs:
+            for job in jobs:
+                self.journal.enqueue(job.id, job.url, options, priority, group, sync=False)
+            self.journal.sync()
+        with self._lock:
+            # Higher priority first in priority mode; insertion order breaks ties
+            rank = -priority if self.order == self.PRIORITY else 0
+            stopped = cancel_event is not None and cancel_event.is_set()
+            for job in jobs:
+                if stopped:
+                    # cancel_all() ran while the journal was written
+                    job.state = DownloadJob.CANCELLED
+                    if self.journal is not None:
+                        self.journal.cancel(job.id)
+                    continue
+                if group is not None:
+                    group.jobs.append(job)
+                self.jobs[job.id] = job
+                self._push((rank, int(job.id), job))
+            self._spawn_workers()
+        for job in jobs:
+            self.signals.job_added.emit(job)
+        return jobs
+
+    def restore(self):
+        # Rebuilds the jobs the journal says were still pending or running.
+        # yt-dlp picks up their .part files, so finished bytes are not fetched again.
+        if self.journal is None:
+            return []
+        records = self.journal.replay()
+        restored = []
+        groups = {}
+        encodes = []
+        with self._lock:
+            for record in records:
+                group = None
+                fields = record.get('group')
+                if fields:
+                    group = groups.get(fields['id'])
+                    if group is None:
+                        group = PlaylistGroup(f"playlist-{next(self._counter)}", fields['url'], fields['title'],
+                                              fields['concurrency'])
+                        groups[fields['id']] = group
+                        self.groups[group.id] = group
+                seq = next(self._counter)
+                job = DownloadJob(str(seq), record['url'], DownloadOptions(**record['options']),
+                                  record.get('priority', 0))
+                job.group = group
+                if group is not None:
+                    group.jobs.append(job)
+                job.progress = record.get('progress', 0.0)
+                self.jobs[job.id] = job
+                restored.append(job)
+                pending = record.get('encodes') or []
+                if self.postprocessor is not None and pending and all(os.path.exists(path) for path in pending):
+                    # Downloaded before the crash; only the conversion is run again
+                    job.state = DownloadJob.PROCESSING
+                    job.progress = 100.0
+                    self._processing += 1
+                    job.postprocess = [encode_task(path, job.options.encoding, job) for path in pending]
+                    encodes.extend(job.postprocess)
+            # Renumbered, so the old ids never clash with jobs of this session
+            self.journal.rewrite(restored)
+            for job in restored:
+                if job.state == DownloadJob.PENDING:
+                    rank = -job.priority if self.order == self.PRIORITY else 0
+                    self._push((rank, int(job.id), job))
+            self._spawn_workers()
+        for task in encodes:
+            self.postprocessor.submit(task)
+        for group in groups.values():
+            self.signals.playlist_added.emit(group)
+        for job in restored:
+            self.signals.job_added.emit(job)
+        return restored
+
+    def enqueue_playlist(self, url, options, concurrency=2, priority=0):
+        # Lists the entries with --flat-playlist in the background, then queues
+        # every entry as its own job. At most `concurrency` items of the
+        # playlist run at the same time.
+        cancel_event = threading.Event()
+        with self._lock:
+            self._expansions.add(cancel_event)
+        threading.Thread(target=self._expand_playlist, args=(url, options, concurrency, priority, cancel_event),
+                         daemon=True).start()
+
+    def _expand_playlist(self, url, options, concurrency, priority, cancel_event):
+        downloader = Downloader()
+        downloader.engine = self.engine
+        try:
+            result = downloader.enumerate_playlist(url, cancel_event)
+            if cancel_event.is_set():
+                # Stopped while listing; nothing of the playlist is queued
+                self.signals.playlist_failed.emit(url, "Stopped while listing the entries")
+                return
+            if result is None:
+                self.signals.playlist_failed.emit(url, "Could not list the playlist entries")
+                return
+            title, entries = result
+            if not entries:
+                self.signals.playlist_failed.emit(url, "The playlist is empty")
+                return
+
+            self.add_playlist(url, title, entries, options, concurrency, priority, cancel_event)
+        finally:
+            with self._lock:
+                self._expansions.discard(cancel_event)
+
+    def add_playlist(self, url, title, entries, options, concurrency=2, priority=0, cancel_event=None):
+        # Queues already listed entries as one PlaylistGroup
+        with self._lock:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            group = PlaylistGroup(f"playlist-{next(self._counter)}", url, title, max(1, int(concurrency)))
+            self.groups[group.id] = group
+        item_options = options.for_playlist_item(playlist_folder(title))
+        self.enqueue_many(entries, item_options, priority, group, cancel_event)
+        self.signals.playlist_added.emit(group)
+        return group
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.done:
+                return
+            if job.state == DownloadJob.PENDING:
+                # Left in the heap and skipped when a worker pops it
+                job.state = DownloadJob.CANCELLED
+                if self.journal is not None:
+                    self.journal.cancel(job.id)
+                return
+            tasks = []
+            drained = False
+            if job.state == DownloadJob.PROCESSING:
+                job.state = DownloadJob.CANCELLED
+                self._processing -= 1
+                if self.journal is not None:
+                    self.journal.cancel(job.id)
+                tasks = [task for task in job.postprocess if not task.done]
+                drained = self._is_drained()
+            downloader = job.downloader
+            job.state = DownloadJob.CANCELLED
+        if downloader:
+            downloader.stop()
+        for task in tasks:
+            self.postprocessor.cancel(task.id)
+        if drained:
+            self._on_drained()
+
+    def cancel_all(self):
+        with self._lock:
+            for cancel_event in self._expansions:
+                cancel_event.set()
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+
+    def pending_count(self):
+        with self._lock:
+            return sum(1 for job in self.jobs.values() if job.state == DownloadJob.PENDING)
+
+    def running_count(self):
+        with self._lock:
+            return self._running
+
+    def summary(self):
+        with self._lock:
+            summary = {state: 0 for state in (DownloadJob.PENDING, DownloadJob.RUNNING, DownloadJob.PROCESSING,
+                                              DownloadJob.FINISHED, DownloadJob.FAILED, DownloadJob.CANCELLED,
+                                              DownloadJob.SKIPPED)}
+            for job in self.jobs.values():
+                summary[job.state] += 1
+            return summary
+
+    def _spawn_workers(self):
+        # Caller holds self._lock
+        wanted = min(self.max_workers, len(self._heap) + self._running)
+        while self._workers < wanted:
+            self._workers += 1
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def _batch_key(self, job):
+        # Jobs with equal keys can share one yt-dlp process
+        if self.batch_size <= 1 or self.engine != ENGINE_SUBPROCESS:
+            return None
+        # Playlist items keep their own processes, so their concurrency limit
+        # means items running side by side, not items sharing one process
+        if job.options.is_playlist or job.attempts > 0 or job.group is not None:
+            return None
+        return job.options.key() + (is_youtube_url(job.url),)
+
+    def _next_batch(self):
+        skipped = []
+        drained = False
+        with self._lock:
+            batch = self._take_batch(skipped)
+            if batch is None:
+                self._workers -= 1
+                drained = self._is_drained()
+        for job in skipped:
+            self.signals.job_skipped.emit(job)
+        if drained:
+            self._on_drained()
+        return batch
+
+    def _is_drained(self):
+        # Caller holds self._lock
+        return self._workers == 0 and self._running == 0 and not self._heap and not self._processing
+
+    def _on_drained(self):
+        if self.journal is not None:
+            with self._lock:
+                unfinished = [job for job in self.jobs.values() if not job.done]
+                owned = set(self.jobs)
+            # Records of ids the queue does not own, like the main window's
+            # single download or a job being enqueued right now, are kept
+            self.journal.rewrite(unfinished, owned)
+        self.signals.queue_drained.emit(self.summary())
+
+    def _group_full(self, job):
+        return job.group is not None and job.group.running >= job.group.concurrency
+
+    def _skip_archived(self, job, skipped):
+        # Caller holds self._lock. An archive that is still loading is not
+        # waited for; yt-dlp checks the same file itself.
+        if self.archive is None or job.options.is_playlist or not self.archive.wait_loaded(0):
+            return False
+        if not self.archive.contains_url(job.url):
+            return False
+        job.state = DownloadJob.SKIPPED
+        job.progress = 100.0
+        self.skipped += 1
+        if self.journal is not None:
+            self.journal.skip(job.id)
+        skipped.append(job)
+        return True
+
+    def _push(self, entry):
+        # Caller holds self._lock
+        heapq.heappush(self._heap, entry)
+        key = self._batch_key(entry[2])
+        if key is not None:
+            heapq.heappush(self._batchable.setdefault(key, []), entry)
+
+    def _release_waiting(self, group):
+        # Caller holds self._lock; one slot of the playlist came free
+        while group.waiting:
+            entry = heapq.heappop(group.waiting)
+            if entry[2].state == DownloadJob.PENDING:
+                heapq.heappush(self._heap, entry)
+                return
+
+    def _take_batch(self, skipped):
+        # Caller holds self._lock. Jobs taken into a batch stay in the heap
+        # and are skipped when they come up, as cancelled ones are.
+        while self._heap:
+            if self._running >= self.max_workers:
+                break
+            entry = heapq.heappop(self._heap)
+            job = entry[2]
+            if job.state != DownloadJob.PENDING or self._skip_archived(job, skipped):
+                continue
+            if self._group_full(job):
+                # Parked until an item of the same playlist finishes
+                heapq.heappush(job.group.waiting, entry)
+                continue
+            batch = [job]
+            key = self._batch_key(job)
+            companions = self._batchable.get(key) if key is not None else None
+            while companions and len(batch) < self.batch_size:
+                other = heapq.heappop(companions)[2]
+                if other is not job and other.state == DownloadJob.PENDING \
+                        and not self._skip_archived(other, skipped):
+                    batch.append(other)
+            if companions is not None and not companions:
+                del self._batchable[key]
+
+            downloader = self._create_downloader(batch)
+            for job in batch:
+                job.state = DownloadJob.RUNNING
+                job.attempts += 1
+                job.downloader = downloader
+                if self.journal is not None:
+                    self.journal.start(job.id)
+            # A batch is one process, so it takes one slot of its playlist
+            for group in self._batch_groups(batch):
+                group.running += 1
+            self._running += 1
+            return batch
+        return None
+
+    def _batch_groups(self, batch):
+        return set(job.group for job in batch if job.group is not None)
+
+    def _create_downloader(self, batch):
+        # One Downloader, and therefore one yt-dlp process or warm instance,
+        # per job or per batch of compatible jobs
+        downloader = Downloader()
+        downloader.engine = self.engine
+        # Progress passes through submit() so the journal can checkpoint it
+        downloader.progress_sink = self if self.progress_sink is not None else None
+        downloader.job_key = batch[0].id
+        if self.archive is not None:
+            downloader.download_archive = self.archive.path
+        by_url = {job.url: job for job in batch}
+        current = {'job': batch[0]}
+
+        def on_item_started(url):
+            job = by_url.get(url)
+            if job is not None:
+                current['job'] = job
+                downloader.job_key = job.id
+
+        downloader.signals.item_started.connect(on_item_started, Qt.DirectConnection)
+        downloader.signals.file_downloaded.connect(
+            lambda filename, path, file_type: self._on_file(current['job'], filename, path, file_type),
+            Qt.DirectConnection)
+        if len(batch) == 1:
+            # Batches judge success per URL instead
+            downloader.signals.error.connect(lambda message: self._on_error(batch[0], message), Qt.DirectConnection)
+        return downloader
+
+    def _worker(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            for job in batch:
+                self.signals.job_started.emit(job)
+            if len(batch) == 1:
+                self._run_single(batch[0])
+            else:
+                self._run_batch(batch)
+            with self._lock:
+                self._running -= 1
+                for group in self._batch_groups(batch):
+                    group.running -= 1
+                    self._release_waiting(group)
+                self._spawn_workers()
+
+    def _run_single(self, job):
+        downloader = job.downloader
+        try:
+            downloader.download(job.url, *job.options.as_args())
+        except Exception as e:
+            self._on_error(job, str(e))
+        self._finish(job)
+        self._archive_items(job, downloader, all_items=True)
+
+    def _run_batch(self, batch):
+        options = batch[0].options
+        downloader = batch[0].downloader
+        completed = downloader.download_batch([job.url for job in batch], options.is_audio, options.audio_format,
+                                              options.resolution, options.fps, options.download_dir,
+                                              options.with_thumbnail)
+        for job in batch:
+            if job.state == DownloadJob.RUNNING and job.url not in completed:
+                # Only the items that failed are run again, each on its own
+                self._requeue(job)
+            else:
+                self._finish(job)
+                self._archive_items(job, downloader)
+
+    def _archive_items(self, job, downloader, all_items=False):
+        # yt-dlp wrote these to the archive file; keep the in-memory set current
+        if self.archive is None or job.state != DownloadJob.FINISHED:
+            return
+        for extractor_key, video_id, url in downloader.item_keys:
+            if all_items or url == job.url:
+                self.archive.add(make_key(extractor_key, video_id))
+
+    def _requeue(self, job):
+        with self._lock:
+            job.state = DownloadJob.PENDING
+            job.downloader = None
+            job.progress = 0.0
+            rank = -job.priority if self.order == self.PRIORITY else 0
+            self._push((rank, int(job.id), job))
+        self.batch_retries += 1
+
+    def submit(self, key, event, current_item, total_items):
+        if self.journal is not None and key in self.jobs:
+            self.journal.checkpoint(key, event[0] if isinstance(event, tuple) else event.percent)
+        self.progress_sink.submit(key, event, current_item, total_items)
+
+    def _on_file(self, job, filename, path, file_type):
+        job.files.append((filename, path, file_type))
+        if self.journal is not None:
+            self.journal.destination(job.id, os.path.join(path, filename))
+        if self.postprocessor is not None and job.options.encoding and file_type == "Video":
+            file_path = os.path.join(path, filename)
+            if self.journal is not None:
+                # The job stays open in the journal until this encode is done
+                self.journal.record('encode', job.id, input=file_path)
+            job.postprocess.append(self.postprocessor.submit(encode_task(file_path, job.options.encoding, job)))
+            return
+        self.signals.file_downloaded.emit(job, filename, path, file_type)
+
+    def _on_task_finished(self, task):
+        job = task.job
+        if job is None or self.jobs.get(job.id) is not job:
+            return
+        if self.journal is not None:
+            # Which path the encode took and what it saved, next to the job's other records
+            self.journal.record('postprocess', job.id, input=task.inputs[0], kind=task.kind, path=task.path,
+                                elapsed=round(task.elapsed, 1), saved=round(task.saved_seconds, 1))
+        path, filename = os.path.split(task.output)
+        self.signals.file_downloaded.emit(job, filename, path, "Video")
+        self._postprocess_done(job)
+
+    def _on_task_failed(self, task, message):
+        job = task.job
+        if job is None or self.jobs.get(job.id) is not job:
+            return
+        if self.journal is not None:
+            self.journal.record('postprocess', job.id, input=task.inputs[0], kind=task.kind, error=message)
+        # The download itself is intact, report it unconverted
+        path, filename = os.path.split(task.inputs[0])
+        self.signals.file_downloaded.emit(job, filename, path, "Video")
+        self.signals.postprocess_failed.emit(job, message)
+        self._postprocess_done(job)
+
+    def _on_task_cancelled(self, task):
+        job = task.job
+        if job is None or self.jobs.get(job.id) is not job:
+            return
+        self._postprocess_done(job)
+
+    def _postprocess_done(self, job):
+        # A converting job is finished once the last of its tasks is
+        with self._lock:
+            if job.state != DownloadJob.PROCESSING or any(not task.done for task in job.postprocess):
+                return
+            job.state = DownloadJob.FINISHED
+            self._processing -= 1
+            if self.journal is not None:
+                self.journal.complete(job.id)
+            drained = self._is_drained()
+        self.signals.job_finished.emit(job)
+        if drained:
+            self._on_drained()
+
+    def _on_error(self, job, message):
+        if job.error is None:
+            job.error = message
+
+    def _finish(self, job):
+        with self._lock:
+            job.downloader = None
+            if job.state == DownloadJob.RUNNING:
+                job.state = DownloadJob.FAILED if job.error else DownloadJob.FINISHED
+            if job.state == DownloadJob.FINISHED:
+                job.progress = 100.0
+                if any(not task.done for task in job.postprocess):
+                    # Reported, and closed in the journal, when its encodes are done
+                    job.state = DownloadJob.PROCESSING
+                    self._processing += 1
+            if self.journal is not None:
+                if job.state == DownloadJob.FINISHED:
+                    self.journal.complete(job.id)
+                elif job.state == DownloadJob.FAILED:
+                    self.journal.fail(job.id, job.error)
+                elif job.state == DownloadJob.CANCELLED:
+                    self.journal.cancel(job.id)
+        if job.state == DownloadJob.FINISHED:
+            self.signals.job_finished.emit(job)
+        elif job.state == DownloadJob.FAILED:
+            self.signals.job_failed.emit(job, job.error)
@@ -0,0 +1,141 @@
+import time
+import threading
+from PySide6.QtCore import QObject, Signal
+from src.mduyt.core.binaries import get_manifest, probe_encoders
+from src.mduyt.core.ffmpeg import run_ffmpeg
+
+# Encoders offered for custom encoding, as (combo label, -c:v value)
+ENCODER_CHOICES = [
+    ("x264", 'libx264'),
+    ("qsv (h264)", 'h264_qsv'),
+    ("qsv (hevc)", 'hevc_qsv'),
+    ("nvenc (h264)", 'h264_nvenc'),
+    ("nvenc (hevc)", 'hevc_nvenc'),
+    ("amf (h264)", 'h264_amf'),
+    ("amf (hevc)", 'hevc_amf'),
+]
+SOFTWARE_ENCODER = 'libx264'
+
+# x264 preset names -> the closest preset of each hardware encoder
+QSV_PRESETS = {'ultrafast': 'veryfast', 'superfast': 'veryfast'}
+NVENC_PRESETS = {'ultrafast': 'p1', 'superfast': 'p1', 'veryfast': 'p2', 'faster': 'p3', 'fast': 'p3',
+                 'medium': 'p4', 'slow': 'p5', 'slower': 'p6', 'veryslow': 'p7'}
+AMF_QUALITY = {'ultrafast': 'speed', 'superfast': 'speed', 'veryfast': 'speed', 'faster': 'speed',
+               'fast': 'balanced', 'medium': 'balanced', 'slow': 'quality', 'slower': 'quality',
+               'veryslow': 'quality'}
+
+# Micro-benchmark: a few seconds of generated video, encoded to nowhere
+BENCH_SECONDS = 3
+BENCH_SOURCE = 'testsrc2=size=1280x720:rate=30'
+BENCH_TIMEOUT = 20
+# Drivers change without ffmpeg changing, so results are redone after a while
+BENCH_MAX_AGE = 30 * 24 * 3600
+
+
+def encoder_label(encoder):
+    return next((label for label, name in ENCODER_CHOICES if name == encoder), encoder)
+
+
+def encoder_args(encoder, preset="medium", quality=23):
+    if encoder.endswith('_qsv'):
+        return ['-c:v', encoder, '-preset', QSV_PRESETS.get(preset, preset), '-global_quality', str(quality)]
+    if encoder.endswith('_nvenc'):
+        return ['-c:v', encoder, '-preset', NVENC_PRESETS.get(preset, 'p4'), '-cq', str(quality)]
+    if encoder.endswith('_amf'):
+        return ['-c:v', encoder, '-quality', AMF_QUALITY.get(preset, 'balanced'), '-rc', 'cqp',
+                '-qp_i', str(quality), '-qp_p', str(quality), '-qp_b', str(quality)]
+    return ['-c:v', encoder, '-preset', preset, '-crf', str(quality)]
+
+
+def bench_encoder(ffmpeg, encoder, seconds=BENCH_SECONDS, source=BENCH_SOURCE, timeout=BENCH_TIMEOUT):
+    # Returns {'ok': bool, 'fps': float or None, 'error': str or None}. Encoders
+    # that ffmpeg lists but the machine cannot open (no GPU, no driver, headless
+    # CI) fail within a second; a hung driver is killed after timeout.
+    cmd = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', f'{source}:duration={seconds}',
+           *encoder_args(encoder), '-an', '-f', 'null', '-']
+    last = []
+    processes = []
+    timer = threading.Timer(timeout, lambda: [p.kill() for p in processes if p.poll() is None])
+    timer.start()
+    start = time.perf_counter()
+    try:
+        returncode, errors = run_ffmpeg(cmd, seconds, last.append, processes.append)
+    except OSError as e:
+        return {'ok': False, 'fps': None, 'error': str(e)}
+    finally:
+        timer.cancel()
+    elapsed = time.perf_counter() - start
+
+    if returncode != 0:
+        error = errors[-1] if errors else f"FFmpeg exited with code {returncode}"
+        if elapsed >= timeout:
+            error = f"Timed out after {timeout} s"
+        return {'ok': False, 'fps': None, 'error': error}
+    progress = last[-1] if last else None
+    frames = progress.frame if progress is not None else None
+    # ffmpeg's own fps leaves out process start and device setup
+    fps = progress.fps if progress is not None and progress.fps else (frames / elapsed if frames else None)
+    return {'ok': True, 'fps': round(fps, 1) if fps else None, 'error': None}
+
+
+def bench_encoders(ffmpeg=None, candidates=None, seconds=BENCH_SECONDS):
+    manifest = get_manifest()
+    ffmpeg = ffmpeg or manifest.path_of('ffmpeg')
+    available = manifest.capability('ffmpeg', 'encoders') or probe_encoders(ffmpeg)
+    results = {}
+    for encoder in candidates or [name for _, name in ENCODER_CHOICES]:
+        if encoder not in available:
+            results[encoder] = {'ok': False, 'fps': None, 'error': "Not built into this ffmpeg"}
+        else:
+            results[encoder] = bench_encoder(ffmpeg, encoder, seconds)
+    return results
+
+
+def ranked(results):
+    # Working encoders, fastest first; x264 when nothing could be measured,
+    # so there is always the software encoder to fall back to
+    working = [name for name, result in results.items() if result.get('ok')]
+    working.sort(key=lambda name: results[name].get('fps') or 0, reverse=True)
+    return working or [SOFTWARE_ENCODER]
+
+
+def cached_results():
+    bench = get_manifest().capability('ffmpeg', 'encoder_bench')
+    if not bench or time.time() - bench.get('time', 0) > BENCH_MAX_AGE:
+        return None
+    return bench.get('results')
+
+
+def probe_and_cache(force=False):
+    # Call after BinaryManifest.revalidate(): it drops the capabilities of a
+    # changed ffmpeg, which takes the old benchmark with it
+    manifest = get_manifest()
+    results = None if force else cached_results()
+    if results is None:
+        results = bench_encoders()
+        manifest.set_capability('ffmpeg', 'encoder_bench', {'time': time.time(), 'results': results})
+    return results
+
+
+class EncoderProbeSignals(QObject):
+    finished = Signal(dict)
+
+
+class EncoderProbe:
+    def __init__(self):
+        self.signals = EncoderProbeSignals()
+        self.running = False
+
+    def start(self, force=False):
+        if self.running:
+            return
+        self.running = True
+
+        def run():
+            try:
+                results = probe_and_cache(force)
+            finally:
+                self.running = False
+            self.signals.finished.emit(results)
+
+        threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,103 @@
+import sys
+import threading
+import subprocess
+from collections import deque
+
+# Machine readable key=value progress on stdout instead of the \r-rewritten
+# stats line on stderr; every block ends with progress=continue|end
+PROGRESS_ARGS = ['-progress', 'pipe:1', '-nostats']
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _clock(value):
+    # "00:01:02.500000" -> 62.5
+    try:
+        hours, minutes, seconds = value.split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except (AttributeError, ValueError):
+        return None
+
+
+class FFmpegProgress:
+    __slots__ = ('out_time', 'frame', 'fps', 'speed', 'total_size', 'done', 'duration')
+
+    def __init__(self, fields, duration=None):
+        out_time_us = _number(fields.get('out_time_us') or fields.get('out_time_ms'))
+        self.out_time = out_time_us / 1000000 if out_time_us is not None and out_time_us >= 0 \
+            else _clock(fields.get('out_time'))
+        self.frame = _number(fields.get('frame'))
+        self.fps = _number(fields.get('fps'))
+        self.speed = _number((fields.get('speed') or '').rstrip('x'))
+        self.total_size = _number(fields.get('total_size'))
+        self.done = fields.get('progress') == 'end'
+        self.duration = duration
+
+    @property
+    def percent(self):
+        if self.done:
+            return 100.0
+        if not self.duration or self.out_time is None:
+            return 0.0
+        return max(0.0, min(100.0, self.out_time * 100.0 / self.duration))
+
+    @property
+    def eta(self):
+        if not self.duration or self.out_time is None or not self.speed:
+            return None
+        return max(0.0, (self.duration - self.out_time) / self.speed)
+
+    def rate_text(self):
+        parts = []
+        if self.fps:
+            parts.append(f"{self.fps:.0f} fps")
+        if self.speed:
+            parts.append(f"{self.speed:.2f}x")
+        return ', '.join(parts)
+
+
+def with_progress(cmd):
+    return [cmd[0]] + PROGRESS_ARGS + list(cmd[1:])
+
+
+def run_ffmpeg(cmd, duration=None, on_progress=None, on_start=None):
+    # Runs ffmpeg with -progress pipe:1 and calls on_progress with an
+    # FFmpegProgress per block. on_start receives the Popen object, so the
+    # caller can terminate it. Returns (returncode, last stderr lines).
+    process = subprocess.Popen(
+        with_progress(cmd),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        encoding='utf-8',
+        errors='replace',
+        creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+    )
+    if on_start is not None:
+        on_start(process)
+
+    # stderr only carries errors now, but it still has to be drained
+    errors = deque(maxlen=20)
+    reader = threading.Thread(target=lambda: errors.extend(line.rstrip() for line in process.stderr), daemon=True)
+    reader.start()
+
+    fields = {}
+    for line in process.stdout:
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            continue
+        fields[key] = value
+        if key == 'progress':
+            if on_progress is not None:
+                on_progress(FFmpegProgress(fields, duration))
+            fields = {}
+
+    process.wait()
+    reader.join()
+    return process.returncode, [line for line in errors if line]
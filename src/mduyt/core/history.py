@@ -0,0 +1,342 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+from env import root
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    url TEXT,
+    downloaded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_file ON history (path, filename);
+"""
+
+# Search index over the same columns plus the download date; kept in sync by
+# triggers so the writer thread does not have to know about it
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    filename, path, file_type, url, downloaded, tokenize='{tokenizer}');
+CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+    INSERT INTO history_fts (rowid, filename, path, file_type, url, downloaded)
+    VALUES (new.id, new.filename, new.path, new.file_type, coalesce(new.url, ''),
+            date(new.downloaded_at, 'unixepoch', 'localtime'));
+END;
+CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+    DELETE FROM history_fts WHERE rowid = old.id;
+END;
+"""
+
+# Columns scanned with LIKE for words the index cannot match
+LIKE_MATCH = "(h.filename LIKE {0} OR h.path LIKE {0} OR h.file_type LIKE {0} OR h.url LIKE {0})"
+
+COLUMNS = ('id', 'filename', 'path', 'file_type', 'url', 'downloaded_at')
+
+
+def best_tokenizer():
+    # trigram (SQLite 3.34+) matches any substring of 3+ characters; older
+    # builds get word prefixes, builds without FTS5 fall back to LIKE
+    conn = sqlite3.connect(':memory:')
+    try:
+        for tokenizer in ('trigram', 'unicode61'):
+            try:
+                conn.execute(f"CREATE VIRTUAL TABLE probe_{tokenizer} USING fts5(x, tokenize='{tokenizer}')")
+                return tokenizer
+            except sqlite3.OperationalError:
+                continue
+        return None
+    finally:
+        conn.close()
+
+
+class HistoryStore:
+    # Download history in SQLite. Every add or delete touches a single row
+    # instead of rewriting the whole file; newest entries have the highest id.
+    def __init__(self, path=None, json_path=None):
+        self.path = path or os.path.join(root, 'history.db')
+        self.json_path = json_path or os.path.join(root, 'history.json')
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        # WAL keeps readers and the writer from blocking each other and makes
+        # small commits cheap; NORMAL sync is safe with WAL
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.fts_tokenizer = self.create_index()
+        self.migrate_json()
+        # Ids are handed out up front so rows can be shown before they are written
+        self._next_id = (self.conn.execute('SELECT MAX(id) FROM history').fetchone()[0] or 0) + 1
+
+    def create_index(self):
+        # Returns the tokenizer the index really uses. CREATE ... IF NOT EXISTS
+        # keeps a table built earlier with another tokenizer, so that case is
+        # detected from the stored schema and the index is rebuilt.
+        tokenizer = best_tokenizer()
+        if tokenizer is None:
+            return None
+        row = self.conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'"
+                                ).fetchone()
+        rebuild = row is not None and f"'{tokenizer}'" not in row[0]
+        try:
+            with self.conn:
+                if rebuild:
+                    self.conn.execute('DROP TABLE history_fts')
+                self.conn.executescript(FTS_SCHEMA.format(tokenizer=tokenizer))
+                if rebuild or self.conn.execute('PRAGMA user_version').fetchone()[0] < 1:
+                    # Rows written before the index existed
+                    self.conn.execute(
+                        "INSERT INTO history_fts (rowid, filename, path, file_type, url, downloaded) "
+                        "SELECT id, filename, path, file_type, coalesce(url, ''), "
+                        "date(downloaded_at, 'unixepoch', 'localtime') FROM history")
+                    self.conn.execute('PRAGMA user_version = 1')
+        except sqlite3.OperationalError:
+            return None
+        return tokenizer
+
+    def migrate_json(self):
+        # One-time import of the old history.json (newest entry first)
+        if not os.path.exists(self.json_path):
+            return 0
+        try:
+            with open(self.json_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return 0
+
+        now = time.time()
+        rows = [(entry.get('filename', ''), entry.get('path', ''), entry.get('file_type', 'Unknown'),
+                 entry.get('url'), now) for entry in reversed(entries) if isinstance(entry, dict)]
+        with self._lock, self.conn:
+            if self.conn.execute('SELECT COUNT(*) FROM history').fetchone()[0] == 0:
+                self.conn.executemany(
+                    'INSERT INTO history (filename, path, file_type, url, downloaded_at) VALUES (?, ?, ?, ?, ?)',
+                    rows)
+        os.replace(self.json_path, self.json_path + '.migrated')
+        return len(rows)
+
+    def last_id(self):
+        # Highest id handed out so far, without using one up
+        with self._lock:
+            return self._next_id - 1
+
+    def allocate_id(self):
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            return entry_id
+
+    def add(self, filename, path, file_type, url=None, downloaded_at=None):
+        entry_id = self.allocate_id()
+        with self._lock, self.conn:
+            self.conn.execute(
+                'INSERT INTO history (id, filename, path, file_type, url, downloaded_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (entry_id, filename, path, file_type, url, downloaded_at or time.time()))
+        return entry_id
+
+    def delete(self, entry_id):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM history WHERE id = ?', (entry_id,))
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM history')
+
+    def count(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM history').fetchone()[0]
+
+    def urls(self):
+        with self._lock:
+            return [row[0] for row in self.conn.execute('SELECT DISTINCT url FROM history WHERE url IS NOT NULL')]
+
+    def load(self, limit=None, before_id=None):
+        # Newest first; pass the id of the last row seen as before_id for the next page
+        query = 'SELECT id, filename, path, file_type, url, downloaded_at FROM history'
+        params = []
+        if before_id is not None:
+            query += ' WHERE id < ?'
+            params.append(before_id)
+        query += ' ORDER BY id DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def search(self, text):
+        # Ids of the rows matching every word of text, or None for an empty search
+        built = self._search_query(text, 'h.id')
+        if built is None:
+            return None
+        query, params = built
+        with self._lock:
+            return set(row[0] for row in self.conn.execute(query, params))
+
+    def _search_query(self, text, columns):
+        terms = text.split()
+        if not terms:
+            return None
+        if self.fts_tokenizer == 'trigram':
+            # Trigrams need 3+ characters; shorter words filter the FTS hits
+            indexed = [term for term in terms if len(term) >= 3]
+            short = [term for term in terms if len(term) < 3]
+        elif self.fts_tokenizer:
+            indexed, short = terms, []
+        else:
+            indexed, short = [], terms
+
+        suffix = '' if self.fts_tokenizer == 'trigram' else '*'
+        conditions = []
+        params = []
+        if indexed:
+            query = f'SELECT {columns} FROM history_fts JOIN history h ON h.id = history_fts.rowid'
+            conditions.append('history_fts MATCH ?')
+            params.append(' AND '.join('"{}"{}'.format(term.replace('"', '""'), suffix) for term in indexed))
+        else:
+            query = f'SELECT {columns} FROM history h'
+        for term in short:
+            params.append(f"%{term}%")
+            conditions.append(LIKE_MATCH.format(f"?{len(params)}"))
+        query += ' WHERE ' + ' AND '.join(conditions)
+        return query, params
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class HistoryWriter:
+    # Write-behind persistence for HistoryStore. Mutations are queued by the
+    # GUI thread and applied by a worker thread with its own connection; ops
+    # arriving within `delay` seconds of each other share one transaction.
+    def __init__(self, store, delay=0.5, max_batch=500, retries=3):
+        self.store = store
+        self.delay = delay
+        self.max_batch = max_batch
+        self.retries = retries
+        self.batches = 0
+        self.operations = 0
+        self.largest_batch = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        self.failed_operations = 0
+        self.last_error = None
+        # Highest row id committed so far; newer rows are not searchable yet.
+        # Read before any add() can be queued, so no queued row counts as committed.
+        self.committed_id = store.last_id()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, filename, path, file_type, url=None):
+        # Returns the row as the model shows it; the id is final
+        row = {'id': self.store.allocate_id(), 'filename': filename, 'path': path, 'file_type': file_type,
+               'url': url, 'downloaded_at': time.time()}
+        self._queue.put(('add', row, time.perf_counter()))
+        return row
+
+    def delete(self, entry_id):
+        self._queue.put(('delete', entry_id, time.perf_counter()))
+
+    def clear(self):
+        self._queue.put(('clear', None, time.perf_counter()))
+
+    def flush(self, timeout=None):
+        # Blocks until everything queued so far is committed
+        done = threading.Event()
+        self._queue.put(('flush', done, time.perf_counter()))
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        self._queue.put(('close', None, time.perf_counter()))
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'operations': self.operations,
+            'largest_batch': self.largest_batch,
+            'average_batch': self.operations / self.batches if self.batches else 0.0,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency,
+            'average_latency': self.total_latency / self.batches if self.batches else 0.0,
+            'failed_operations': self.failed_operations,
+            'last_error': self.last_error,
+        }
+
+    def _run(self):
+        conn = sqlite3.connect(self.store.path)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.delay
+            # Collect the rest of the burst
+            while batch[-1][0] not in ('flush', 'close') and len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            waiters = [value for op, value, _ in batch if op == 'flush']
+            running = not any(op == 'close' for op, _, _ in batch)
+            writes = [(op, value) for op, value, _ in batch if op in ('add', 'delete', 'clear')]
+            try:
+                if writes:
+                    self._commit(conn, writes)
+                    added = [value['id'] for op, value in writes if op == 'add']
+                    if added:
+                        self.committed_id = max(self.committed_id, max(added))
+                    self._record(batch)
+            except Exception as e:
+                # The batch is dropped, but the thread keeps serving later ones
+                self.failed_operations += len(writes)
+                self.last_error = str(e)
+                print(f"Could not save {len(writes)} history changes: {e}")
+            finally:
+                for done in waiters:
+                    done.set()
+        conn.close()
+
+    def _commit(self, conn, writes):
+        for attempt in range(self.retries + 1):
+            try:
+                with conn:
+                    for op, value in writes:
+                        if op == 'add':
+                            conn.execute('INSERT OR REPLACE INTO history (id, filename, path, file_type, url, '
+                                         'downloaded_at) VALUES (:id, :filename, :path, :file_type, :url, '
+                                         ':downloaded_at)', value)
+                        elif op == 'delete':
+                            conn.execute('DELETE FROM history WHERE id = ?', (value,))
+                        elif op == 'clear':
+                            conn.execute('DELETE FROM history')
+                return
+            except sqlite3.OperationalError:
+                # A locked database usually frees up; a full disk fails every attempt
+                if attempt == self.retries:
+                    raise
+                time.sleep(0.2 * 2 ** attempt)
+
+    def _record(self, batch):
+        writes = sum(1 for op, _, _ in batch if op in ('add', 'delete', 'clear'))
+        if not writes:
+            return
+        latency = time.perf_counter() - batch[0][2]
+        self.batches += 1
+        self.operations += writes
+        self.largest_batch = max(self.largest_batch, writes)
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
@@ -0,0 +1,270 @@
+import os
+import threading
+from collections import OrderedDict
+from src.mduyt.core.progress import HookDownloadEvent, format_bytes, format_speed, format_eta
+
+ENGINE_SUBPROCESS = 'subprocess'
+ENGINE_INPROCESS = 'inprocess'
+
+
+def cancelled(downloader, cancel_event=None):
+    return downloader.stop_flag or (cancel_event is not None and cancel_event.is_set())
+
+
+class _WarmInstance:
+    # A YoutubeDL object whose hooks forward to whichever Downloader is using it
+    def __init__(self, params):
+        import yt_dlp
+        self.downloader = None
+        self.last_info_id = None
+        params = dict(params)
+        params['progress_hooks'] = [self.progress_hook]
+        params['postprocessor_hooks'] = [self.postprocessor_hook]
+        self.ydl = yt_dlp.YoutubeDL(params)
+
+    def check_stop(self):
+        if self.downloader is not None and self.downloader.stop_flag:
+            import yt_dlp
+            raise yt_dlp.utils.DownloadCancelled("Download stopped by user")
+
+    def progress_hook(self, status_dict):
+        self.check_stop()
+        downloader = self.downloader
+        if downloader is None:
+            return
+
+        info = status_dict.get('info_dict') or {}
+        if info.get('id') != self.last_info_id:
+            # First record of a new item
+            self.last_info_id = info.get('id')
+            if info.get('playlist_index'):
+                downloader.current_item = info['playlist_index']
+            if info.get('n_entries'):
+                downloader.total_items = info['n_entries']
+            if info.get('title'):
+                downloader.signals.title_fetched.emit(info['title'])
+
+        event = HookDownloadEvent(status_dict)
+        if downloader.progress_sink is not None:
+            downloader.progress_sink.submit(downloader.job_key, event, downloader.current_item,
+                                            downloader.total_items)
+        else:
+            downloader.signals.progress.emit(event.percent, format_bytes(event.total_bytes),
+                                             format_speed(event.speed), format_eta(event.eta),
+                                             downloader.current_item, downloader.total_items)
+
+    def postprocessor_hook(self, status_dict):
+        self.check_stop()
+        downloader = self.downloader
+        if downloader is None:
+            return
+        postprocessor = status_dict.get('postprocessor')
+        status = status_dict.get('status')
+        if postprocessor:
+            downloader.signals.postprocess.emit(postprocessor, status)
+        # MoveFiles runs last and knows the final location, like --print after_move
+        if postprocessor == 'MoveFiles' and status == 'finished':
+            info = status_dict.get('info_dict') or {}
+            # The archive key the subprocess engine gets from --print before_dl
+            if info.get('extractor_key') and info.get('id'):
+                downloader.item_keys.append((info['extractor_key'], info['id'], downloader.current_url))
+            filepath = info.get('filepath')
+            if filepath:
+                downloader.report_file(filepath)
+
+    def lazy_listing(self, url):
+        # Unprocessed result whose entries are a generator; redirects such as
+        # a channel URL pointing at its videos tab are followed by hand
+        info = self.ydl.extract_info(url, download=False, process=False)
+        for _ in range(5):
+            if not info or info.get('_type') not in ('url', 'url_transparent'):
+                break
+            info = self.ydl.extract_info(info['url'], download=False, process=False)
+        return info
+
+    def close(self):
+        try:
+            self.ydl.close()
+        except Exception:
+            pass
+
+
+class InProcessEngine:
+    def __init__(self, max_idle=4):
+        # Idle instances keyed by their option signature, least recently used first
+        self.max_idle = max_idle
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def build_params(self, downloader, url, is_audio, audio_format, resolution, fps, download_dir,
+                     is_playlist, with_thumbnail):
+        # Mirrors Downloader.build_command
+        params = {
+            'paths': {'home': download_dir},
+            'outtmpl': {'default': '%(playlist_title)s/%(title)s.%(ext)s' if is_playlist else '%(title)s.%(ext)s'},
+            'noplaylist': not is_playlist,
+            'updatetime': False,
+            'continuedl': True,
+            'quiet': True,
+            'no_warnings': True,
+            'noprogress': True,
+            'ignoreerrors': 'only_download',
+        }
+        if downloader.download_archive:
+            params['download_archive'] = downloader.download_archive
+        if os.path.isabs(downloader.ffmpeg_binary):
+            params['ffmpeg_location'] = downloader.ffmpeg_binary
+
+        postprocessors = []
+        if is_audio:
+            params['format'] = 'bestaudio/best'
+            postprocessors.append({'key': 'FFmpegExtractAudio', 'preferredcodec': audio_format})
+        else:
+            format_string = downloader.build_format(url, resolution, fps)
+            if format_string:
+                params['format'] = format_string
+
+        if with_thumbnail:
+            params['writethumbnail'] = True
+            postprocessors.append({'key': 'FFmpegMetadata', 'add_metadata': True})
+            postprocessors.append({'key': 'EmbedThumbnail', 'already_have_thumbnail': False})
+
+        params['postprocessors'] = postprocessors
+        return params
+
+    def acquire(self, params):
+        key = repr(sorted(params.items()))
+        with self._lock:
+            instances = self._idle.get(key)
+            if instances:
+                instance = instances.pop()
+                if not instances:
+                    del self._idle[key]
+                self.reused += 1
+                return key, instance
+            self.created += 1
+        return key, _WarmInstance(params)
+
+    def release(self, key, instance, reuse=True):
+        instance.downloader = None
+        if not reuse:
+            instance.close()
+            return
+        evicted = []
+        with self._lock:
+            self._idle.setdefault(key, []).append(instance)
+            self._idle.move_to_end(key)
+            while sum(len(instances) for instances in self._idle.values()) > self.max_idle:
+                _, instances = self._idle.popitem(last=False)
+                evicted.extend(instances)
+        for old in evicted:
+            old.close()
+
+    def extract_info(self, downloader, url, flat=False, cancel_event=None):
+        # Metadata only; uses a warm instance with neutral download options.
+        # A flat listing is paged lazily so a stop or cancel is seen between
+        # entries; a single video cannot be interrupted and is dropped after.
+        if flat:
+            params = {'quiet': True, 'no_warnings': True, 'noplaylist': False, 'extract_flat': 'in_playlist',
+                      'lazy_playlist': True}
+        else:
+            params = {'quiet': True, 'no_warnings': True, 'noplaylist': True}
+        if cancelled(downloader, cancel_event):
+            return None
+        key, instance = self.acquire(params)
+        try:
+            if flat:
+                info = instance.lazy_listing(url)
+                if info is None:
+                    return None
+                entries = []
+                for entry in info.get('entries') or []:
+                    if cancelled(downloader, cancel_event):
+                        return None
+                    entries.append(entry)
+                info['entries'] = entries
+            else:
+                info = instance.ydl.extract_info(url, download=False)
+            if cancelled(downloader, cancel_event):
+                return None
+            return instance.ydl.sanitize_info(info)
+        except Exception as e:
+            print(f"Could not read the metadata of {url}: {e}")
+            return None
+        finally:
+            self.release(key, instance)
+
+    def stream_entries(self, downloader, url):
+        # Flat, lazily paged listing; see Downloader.stream_playlist. Errors
+        # reach the caller, like a listing that produced nothing would.
+        params = {'quiet': True, 'no_warnings': True, 'noplaylist': False, 'extract_flat': 'in_playlist',
+                  'lazy_playlist': True}
+        key, instance = self.acquire(params)
+        try:
+            info = instance.lazy_listing(url)
+            for entry in (info or {}).get('entries') or []:
+                if downloader.stop_flag:
+                    return
+                if entry and entry.get('id') and entry.get('url'):
+                    yield entry['id'], entry['url']
+        finally:
+            self.release(key, instance)
+
+    def download(self, downloader, url, is_audio, audio_format, resolution, fps, download_dir,
+                 is_playlist, with_thumbnail):
+        try:
+            import yt_dlp
+        except ImportError:
+            downloader.signals.error.emit("The in-process engine needs the yt_dlp package")
+            return
+
+        if downloader.stop_flag:
+            downloader.signals.error.emit("Download stopped by user")
+            return
+
+        params = self.build_params(downloader, url, is_audio, audio_format, resolution, fps, download_dir,
+                                   is_playlist, with_thumbnail)
+        key, instance = self.acquire(params)
+        instance.downloader = downloader
+        instance.last_info_id = None
+        downloader.current_url = url
+        # YoutubeDL keeps a non-zero return code for good, so only instances
+        # whose downloads all succeeded go back to the pool
+        retcode = 1
+        try:
+            if downloader.use_metadata_cache and not is_playlist:
+                cache = downloader.metadata_cache
+                info_path = cache.lookup(url)
+                if info_path is None:
+                    info = instance.ydl.extract_info(url, download=False)
+                    info_path = cache.put(instance.ydl.sanitize_info(info), url)
+                retcode = instance.ydl.download_with_info_file(info_path)
+            else:
+                retcode = instance.ydl.download([url])
+            if downloader.stop_flag:
+                downloader.signals.error.emit("Download stopped by user")
+            elif retcode != 0:
+                downloader.signals.error.emit(f"yt-dlp exited with code {retcode}")
+            else:
+                downloader.register_cached_info(is_playlist)
+                downloader.signals.finished.emit()
+        except yt_dlp.utils.DownloadCancelled:
+            downloader.signals.error.emit("Download stopped by user")
+        except Exception as e:
+            downloader.signals.error.emit(str(e))
+        finally:
+            self.release(key, instance, reuse=retcode == 0)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = InProcessEngine()
+        return _engine
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import threading
+from env import root
+
+
+class JobJournal:
+    # Append-only record of the download queue, one JSON object per line:
+    #   enqueue, start, destination, progress, encode, postprocess, complete, fail, cancel, skip
+    # Jobs without a complete/fail/cancel/skip record were in flight when the app
+    # stopped and are handed back by replay(). An encode without a postprocess
+    # record for the same input was still queued or running.
+    def __init__(self, path=None, checkpoint_step=5.0):
+        self.path = path or os.path.join(root, 'jobs.journal')
+        # Progress is only written when it moved by at least this many percent
+        self.checkpoint_step = checkpoint_step
+        self._checkpoints = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _write(self, record, sync=True):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def record(self, op, job_id, sync=None, **fields):
+        record = {'op': op, 'job': job_id, 't': time.time()}
+        record.update(fields)
+        # Progress checkpoints are frequent and cheap to lose, skip the fsync
+        self._write(record, sync=op != 'progress' if sync is None else sync)
+
+    def enqueue(self, job_id, url, options, priority=0, group=None, sync=True):
+        # Pass sync=False when queuing many jobs at once and call sync() after the last
+        self.record('enqueue', job_id, sync=sync, url=url, options=vars(options), priority=priority,
+                    group=self._group_fields(group))
+
+    def sync(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def start(self, job_id):
+        self.record('start', job_id)
+
+    def destination(self, job_id, path):
+        self.record('destination', job_id, path=path)
+
+    def checkpoint(self, job_id, percent):
+        last = self._checkpoints.get(job_id)
+        if last is not None and percent - last < self.checkpoint_step:
+            return
+        self._checkpoints[job_id] = percent
+        self.record('progress', job_id, percent=round(percent, 1))
+
+    def complete(self, job_id):
+        self._checkpoints.pop(job_id, None)
+        self.record('complete', job_id)
+
+    def fail(self, job_id, error):
+        self._checkpoints.pop(job_id, None)
+        self.record('fail', job_id, error=error)
+
+    def cancel(self, job_id):
+        self._checkpoints.pop(job_id, None)
+        self.record('cancel', job_id)
+
+    def skip(self, job_id):
+        self.record('skip', job_id)
+
+    def replay(self):
+        # Returns the enqueue records of unfinished jobs, in enqueue order, with
+        # the last known progress and destinations merged in
+        jobs = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+                    op = record.get('op')
+                    job_id = record.get('job')
+                    if op == 'enqueue':
+                        record.update(started=False, progress=0.0, destinations=[], encodes=[])
+                        jobs[job_id] = record
+                    elif job_id not in jobs:
+                        continue
+                    elif op == 'start':
+                        jobs[job_id]['started'] = True
+                    elif op == 'progress':
+                        jobs[job_id]['progress'] = record.get('percent', 0.0)
+                    elif op == 'destination':
+                        jobs[job_id]['destinations'].append(record.get('path'))
+                    elif op == 'encode':
+                        jobs[job_id]['encodes'].append(record.get('input'))
+                    elif op == 'postprocess':
+                        if record.get('input') in jobs[job_id]['encodes']:
+                            jobs[job_id]['encodes'].remove(record.get('input'))
+                    elif op in ('complete', 'fail', 'cancel', 'skip'):
+                        del jobs[job_id]
+        except OSError:
+            return []
+        return list(jobs.values())
+
+    def rewrite(self, jobs, owned=None):
+        # Compacts the journal down to the given DownloadJob objects. With
+        # owned, the ids the caller speaks for, unfinished records of any other
+        # id (the main window's single download) are carried over.
+        temp_path = self.path + '.tmp'
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            carried = [record for record in self.replay() if record['job'] not in owned] \
+                if owned is not None else []
+            self._checkpoints = {}
+            now = time.time()
+            records = []
+            for job in jobs:
+                records.append({'op': 'enqueue', 'job': job.id, 't': now, 'url': job.url,
+                                'options': vars(job.options), 'priority': job.priority,
+                                'group': self._group_fields(job.group)})
+                if job.progress:
+                    records.append({'op': 'progress', 'job': job.id, 't': now, 'percent': round(job.progress, 1)})
+                for task in job.postprocess:
+                    if not task.done:
+                        records.append({'op': 'encode', 'job': job.id, 't': now, 'input': task.inputs[0]})
+            for record in carried:
+                job_id = record['job']
+                records.append({key: value for key, value in record.items()
+                                if key not in ('started', 'progress', 'destinations', 'encodes')})
+                if record['started']:
+                    records.append({'op': 'start', 'job': job_id, 't': now})
+                if record['progress']:
+                    records.append({'op': 'progress', 'job': job_id, 't': now, 'percent': record['progress']})
+                for path in record['destinations']:
+                    records.append({'op': 'destination', 'job': job_id, 't': now, 'path': path})
+                for path in record['encodes']:
+                    records.append({'op': 'encode', 'job': job_id, 't': now, 'input': path})
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _group_fields(self, group):
+        if group is None:
+            return None
+        return {'id': group.id, 'url': group.url, 'title': group.title, 'concurrency': group.concurrency}
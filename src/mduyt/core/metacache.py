@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from env import root
+
+# Matches the usual YouTube URL shapes so a pasted URL can be mapped to its
+# video ID without asking yt-dlp
+YOUTUBE_ID_RE = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)([0-9A-Za-z_-]{11})')
+
+
+def make_key(extractor_key, video_id):
+    # Same "<extractor> <id>" form yt-dlp writes to --download-archive files
+    return f"{extractor_key.lower()} {video_id}"
+
+
+def canonical_key(url):
+    match = YOUTUBE_ID_RE.search(url)
+    if match:
+        return make_key('Youtube', match.group(1))
+    return None
+
+
+def safe_name(text):
+    return re.sub(r'[^0-9A-Za-z_.-]', '_', text)
+
+
+class MetadataCache:
+    def __init__(self, cache_dir=None, ttl=3 * 3600, max_entries=500, max_bytes=200 * 1024 * 1024):
+        # The TTL stays below the ~6 hour lifetime of YouTube's signed format URLs
+        self.cache_dir = cache_dir or os.path.join(root, 'cache', 'info')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> {'path', 'created', 'size'}, least recently used first
+        self._entries = OrderedDict()
+        # URL -> key for URLs canonical_key() cannot resolve on its own
+        self._aliases = {}
+        self._load_index()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.cache_dir, 'index.json')
+
+    def output_template(self):
+        # yt-dlp appends ".info.json" to this template
+        return os.path.join(self.cache_dir, '%(extractor_key)s_%(id)s')
+
+    def path_for(self, extractor_key, video_id):
+        return os.path.join(self.cache_dir, f"{safe_name(extractor_key)}_{safe_name(video_id)}.info.json")
+
+    def key_for_url(self, url):
+        with self._lock:
+            return self._aliases.get(url) or canonical_key(url)
+
+    def lookup(self, url):
+        # Returns the path of a fresh .info.json for the URL, or None
+        with self._lock:
+            key = self._aliases.get(url) or canonical_key(url)
+            entry = self._entries.get(key) if key else None
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.time() - entry['created'] > self.ttl or not os.path.exists(entry['path']):
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['path']
+
+    def get(self, url):
+        path = self.lookup(url)
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, info, url=None):
+        # info must already be JSON serializable (YoutubeDL.sanitize_info)
+        extractor_key = info.get('extractor_key') or info.get('extractor') or 'generic'
+        path = self.path_for(extractor_key, info['id'])
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(info, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        self.register(url, extractor_key, info['id'])
+        return path
+
+    def register(self, url, extractor_key, video_id):
+        # Records a .info.json that yt-dlp (or put) has written into the cache dir
+        path = self.path_for(extractor_key, video_id)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        key = make_key(extractor_key, video_id)
+        with self._lock:
+            self._entries[key] = {'path': path, 'created': time.time(), 'size': size}
+            self._entries.move_to_end(key)
+            if url and canonical_key(url) != key:
+                self._aliases[url] = key
+            self._evict()
+            self._save_index()
+        return path
+
+    def invalidate(self, url):
+        with self._lock:
+            key = self._aliases.get(url) or canonical_key(url)
+            if key in self._entries:
+                self._remove(key)
+                self._save_index()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(entry['size'] for entry in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def _remove(self, key):
+        # Caller holds self._lock
+        entry = self._entries.pop(key, None)
+        if entry:
+            try:
+                os.remove(entry['path'])
+            except OSError:
+                pass
+        for url in [url for url, alias in self._aliases.items() if alias == key]:
+            del self._aliases[url]
+
+    def _evict(self):
+        # Caller holds self._lock
+        total_bytes = sum(entry['size'] for entry in self._entries.values())
+        while self._entries and (len(self._entries) > self.max_entries or total_bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            total_bytes -= self._entries[key]['size']
+            self._remove(key)
+            self.evictions += 1
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, entry in data.get('entries', []):
+            if now - entry['created'] <= self.ttl and os.path.exists(entry['path']):
+                self._entries[key] = entry
+            else:
+                try:
+                    os.remove(entry['path'])
+                except OSError:
+                    pass
+        self._aliases = {url: key for url, key in data.get('aliases', {}).items() if key in self._entries}
+
+    def _save_index(self):
+        # Caller holds self._lock
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'entries': list(self._entries.items()), 'aliases': self._aliases}, f)
+        os.replace(temp_path, self.index_path)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetadataCache()
+        return _cache
@@ -1 +1,556 @@
-##
\ No newline at end of file
+import os
+import time
+import shlex
+import heapq
+import shutil
+import tempfile
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PySide6.QtCore import QObject, Signal
+from src.mduyt.core.binaries import get_manifest
+from src.mduyt.core.progress import format_eta
+from src.mduyt.core.ffmpeg import run_ffmpeg, FFmpegProgress
+from src.mduyt.core.probe import probe, encoder_family, MP4_VIDEO_CODECS, MP4_AUDIO_CODECS
+
+ENCODE = 'encode'
+REMUX = 'remux'
+EXTRACT = 'extract'
+TAG = 'tag'
+THUMBNAIL = 'thumbnail'
+
+# How an encode task handles its streams, decided from the probe
+PATH_COPY = 'copy'
+PATH_AUDIO = 'audio'
+PATH_TRANSCODE = 'transcode'
+
+DEFAULT_ENCODE_ARGS = ['-c:v', 'libx264', '-preset', 'fast', '-b:v', '5M']
+# Media seconds encoded per second, until the pool has measured its own
+DEFAULT_TRANSCODE_SPEED = 1.0
+# Arguments that change the picture, so the video stream cannot be copied
+VIDEO_FILTER_ARGS = ('-vf', '-filter:v', '-filter_complex', '-s', '-r', '-pix_fmt')
+
+# Segmented encoding: software encoders leave cores idle in their serial
+# parts, so long sources are cut at keyframes and the pieces encoded side by
+# side. Hardware encoders are limited by the encoder block, not the CPU.
+SEGMENT_ENCODERS = ('libx264', 'libx265', 'libsvtav1', 'libaom-av1', 'libvpx-vp9')
+SEGMENT_MIN_DURATION = 600
+SEGMENT_THREADS = 4
+SEGMENT_LENGTH = (20, 300)
+AUDIO_ARGS = ('-c:a', '-b:a', '-q:a', '-ar', '-ac', '-af', '-filter:a')
+
+
+def default_workers():
+    # ffmpeg encoders are multithreaded themselves; two encodes per core pair
+    # keeps the CPU busy without starving the download workers
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def encoding_args(args):
+    # MainWindow.get_encoding_command returns one string, tasks want a list
+    if not args:
+        return []
+    return shlex.split(args) if isinstance(args, str) else list(args)
+
+
+class PostProcessTask:
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, kind, inputs, output, options=None, job=None, priority=0):
+        self.id = None
+        self.kind = kind
+        self.inputs = list(inputs)
+        self.output = output
+        # Kind specific: 'args' and 'allow_copy' for encode, 'codec' for extract,
+        # 'metadata' for tag, 'at' for thumbnail; 'replace_input' removes the
+        # source afterwards
+        self.options = options or {}
+        # The DownloadJob whose file this is, if any
+        self.job = job
+        self.priority = priority
+        self.state = self.PENDING
+        self.error = None
+        # Running ffmpeg processes; several while a segmented encode runs.
+        # The lock pairs attach() with cancel() so no process escapes a cancel.
+        self.processes = []
+        self.lock = threading.Lock()
+        self.queued_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+        self.input_bytes = 0
+        # Filled in by plan_encode() for encode tasks
+        self.path = None
+        self.audio_copy = False
+        self.duration = None
+        self.saved_seconds = 0.0
+        # Latest FFmpegProgress while running
+        self.progress = None
+
+    @property
+    def done(self):
+        return self.state in (self.FINISHED, self.FAILED, self.CANCELLED)
+
+    def attach(self, process):
+        # on_start callback for run_ffmpeg; a process started after the task
+        # was cancelled is stopped right away
+        with self.lock:
+            self.processes.append(process)
+            cancelled = self.state == self.CANCELLED
+        if cancelled:
+            process.terminate()
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def progress_key(self):
+        # Key of this task in the ProgressAggregator, next to the download jobs
+        return f"encode:{self.id}"
+
+    def progress_values(self):
+        # Same shape as a parsed yt-dlp progress line: percent, size, rate, ETA
+        if self.progress is None:
+            return 0.0, "", "", ""
+        return self.progress.percent, "", self.progress.rate_text(), format_eta(self.progress.eta)
+
+    def temp_output(self):
+        # ffmpeg picks the muxer from the extension, so it has to stay last
+        base, ext = os.path.splitext(self.output)
+        return f"{base}.pp{ext}"
+
+
+def stream_maps(task):
+    # A separate video and audio download: first video of one, first audio of
+    # the other. A single input keeps ffmpeg's default stream selection.
+    if len(task.inputs) < 2:
+        return []
+    return ['-map', '0:v:0', '-map', '1:a:0']
+
+
+def option_value(args, name):
+    try:
+        return args[args.index(name) + 1]
+    except (ValueError, IndexError):
+        return None
+
+
+def plan_encode(task, ffprobe=None):
+    # Picks stream copy, audio-only transcode or full transcode from the
+    # actual codecs, so H.264/AAC downloads are only remuxed
+    args = encoding_args(task.options.get('args')) or DEFAULT_ENCODE_ARGS
+    video_info = probe(task.inputs[0], ffprobe)
+    audio_info = probe(task.inputs[1], ffprobe) if len(task.inputs) > 1 else video_info
+    task.path = PATH_TRANSCODE
+    task.audio_copy = False
+    if video_info is None:
+        return task.path
+    task.duration = video_info.duration
+    if not task.output.lower().endswith(('.mp4', '.m4v', '.mov')):
+        return task.path
+
+    task.audio_copy = audio_info is not None and (not audio_info.has_audio
+                                                  or audio_info.audio_codec in MP4_AUDIO_CODECS)
+    target = encoder_family(option_value(args, '-c:v'))
+    video_copy = (task.options.get('allow_copy', False)
+                  and video_info.video_codec in MP4_VIDEO_CODECS
+                  and target in (None, 'copy', video_info.video_codec)
+                  and not any(name in args for name in VIDEO_FILTER_ARGS))
+    if video_copy:
+        task.path = PATH_COPY if task.audio_copy else PATH_AUDIO
+    return task.path
+
+
+def estimate_saved(task, transcode_speed=DEFAULT_TRANSCODE_SPEED):
+    # Time a full transcode would have taken, minus what the chosen path took
+    if task.path == PATH_TRANSCODE or not task.duration or not transcode_speed:
+        return 0.0
+    return max(0.0, task.duration / transcode_speed - task.elapsed)
+
+
+def describe_path(task):
+    text = {PATH_COPY: "stream copy", PATH_AUDIO: "audio transcode", PATH_TRANSCODE: "transcode"}.get(task.path, task.kind)
+    if task.saved_seconds >= 1:
+        text += f", {format_eta(task.saved_seconds)} saved"
+    return text
+
+
+def build_command(ffmpeg, task, output):
+    cmd = [ffmpeg, '-y', '-hide_banner', '-loglevel', 'error']
+    if task.kind == THUMBNAIL:
+        cmd.extend(['-ss', str(task.options.get('at', 1))])
+    for path in task.inputs:
+        cmd.extend(['-i', path])
+
+    if task.kind == ENCODE:
+        args = encoding_args(task.options.get('args')) or DEFAULT_ENCODE_ARGS
+        cmd.extend(stream_maps(task))
+        if task.path == PATH_COPY:
+            cmd.extend(['-c:v', 'copy', '-c:a', 'copy'])
+        elif task.path == PATH_AUDIO:
+            cmd.extend(['-c:v', 'copy', '-c:a', 'aac'])
+        else:
+            cmd.extend(args)
+            if '-c:a' not in args:
+                cmd.extend(['-c:a', 'copy' if task.audio_copy else 'aac'])
+    elif task.kind == REMUX:
+        cmd.extend(stream_maps(task))
+        cmd.extend(['-c', 'copy'])
+    elif task.kind == EXTRACT:
+        cmd.extend(['-vn', '-c:a', task.options.get('codec', 'copy')])
+    elif task.kind == TAG:
+        cmd.extend(['-map', '0', '-c', 'copy'])
+        for key, value in task.options.get('metadata', {}).items():
+            cmd.extend(['-metadata', f'{key}={value}'])
+    elif task.kind == THUMBNAIL:
+        cmd.extend(['-frames:v', '1'])
+    else:
+        raise ValueError(f"Unknown post-processing task: {task.kind}")
+
+    if output.lower().endswith(('.mp4', '.m4a', '.mov')) and task.kind != THUMBNAIL:
+        cmd.extend(['-movflags', '+faststart'])
+    cmd.append(output)
+    return cmd
+
+
+def run_task(task, ffmpeg=None, on_progress=None):
+    # Runs one task to completion in the calling thread. The result is written
+    # next to the output and moved into place only when ffmpeg succeeded.
+    # on_progress(task) is called for every ffmpeg progress block.
+    ffmpeg = ffmpeg or get_manifest().path_of('ffmpeg')
+    if task.kind == ENCODE and task.path is None:
+        plan_encode(task)
+    if task.duration is None and task.kind != THUMBNAIL:
+        # Same cached probe as plan_encode(), so no second ffprobe run
+        info = probe(task.inputs[0])
+        task.duration = info.duration if info is not None else None
+    task.input_bytes = sum(os.path.getsize(path) for path in task.inputs if os.path.exists(path))
+    if task.state == PostProcessTask.CANCELLED:
+        return False
+    if task.path == PATH_COPY and len(task.inputs) == 1 \
+            and os.path.normcase(os.path.abspath(task.inputs[0])) == os.path.normcase(os.path.abspath(task.output)):
+        # Already an MP4 with streams that fit, there is nothing to rewrite
+        return True
+    temp_output = task.temp_output()
+    cmd = build_command(ffmpeg, task, temp_output)
+
+    def progress(update):
+        task.progress = update
+        if on_progress is not None:
+            on_progress(task)
+
+    if use_segments(task):
+        returncode, errors = run_segmented(task, ffmpeg, temp_output, progress)
+    else:
+        returncode, errors = run_ffmpeg(cmd, task.duration, progress, task.attach)
+    with task.lock:
+        task.processes = []
+
+    if task.state == PostProcessTask.CANCELLED or returncode != 0:
+        if os.path.exists(temp_output):
+            os.remove(temp_output)
+        if task.state != PostProcessTask.CANCELLED:
+            task.error = errors[-1] if errors else f"FFmpeg exited with code {returncode}"
+        return False
+
+    os.replace(temp_output, task.output)
+    if task.options.get('replace_input'):
+        for path in task.inputs:
+            if os.path.normcase(os.path.abspath(path)) != os.path.normcase(os.path.abspath(task.output)) \
+                    and os.path.exists(path):
+                os.remove(path)
+    return True
+
+
+def use_segments(task):
+    segmented = task.options.get('segmented')
+    if task.kind != ENCODE or task.path != PATH_TRANSCODE or segmented is False:
+        return False
+    args = encoding_args(task.options.get('args')) or DEFAULT_ENCODE_ARGS
+    if option_value(args, '-c:v') not in SEGMENT_ENCODERS or any(name in args for name in VIDEO_FILTER_ARGS):
+        return False
+    if segmented:
+        return bool(task.duration)
+    cores = task.options.get('cores') or os.cpu_count() or 1
+    return bool(task.duration) and task.duration >= SEGMENT_MIN_DURATION and cores >= 2 * SEGMENT_THREADS
+
+
+def video_args(args):
+    # The encoder options without the audio ones; audio is handled once, at the concat step
+    result = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in AUDIO_ARGS:
+            skip = True
+        else:
+            result.append(arg)
+    return result
+
+
+def segment_layout(duration, cores, threads=SEGMENT_THREADS):
+    # Parallel encodes, ffmpeg threads per encode and target piece length.
+    # Three pieces per encoder keep the pool busy until the end.
+    threads = max(1, min(threads, cores))
+    jobs = max(1, cores // threads)
+    length = min(SEGMENT_LENGTH[1], max(SEGMENT_LENGTH[0], duration / (jobs * 3)))
+    return jobs, threads, length
+
+
+def run_segmented(task, ffmpeg, output, on_progress=None):
+    # Splits the video at keyframes without re-encoding, encodes the pieces
+    # on a bounded set of ffmpeg processes with per-process thread limits, then
+    # joins them with the concat demuxer and muxes the audio back in.
+    # Returns (returncode, error lines) like run_ffmpeg.
+    args = video_args(encoding_args(task.options.get('args')) or DEFAULT_ENCODE_ARGS)
+    cores = task.options.get('cores') or os.cpu_count() or 1
+    jobs, threads, length = segment_layout(task.duration, cores, task.options.get('chunk_threads', SEGMENT_THREADS))
+    base_cmd = [ffmpeg, '-y', '-hide_banner', '-loglevel', 'error']
+    workdir = tempfile.mkdtemp(prefix='.mdu-segments-', dir=os.path.dirname(os.path.abspath(output)))
+    try:
+        returncode, errors = run_ffmpeg(base_cmd + ['-i', task.inputs[0], '-map', '0:v:0', '-c', 'copy',
+                                                    '-f', 'segment', '-segment_time', f"{length:.3f}",
+                                                    '-reset_timestamps', '1',
+                                                    os.path.join(workdir, 'source%05d.mkv')],
+                                        None, None, task.attach)
+        if returncode != 0:
+            return returncode, errors
+        sources = sorted(os.path.join(workdir, name) for name in os.listdir(workdir) if name.startswith('source'))
+
+        # Encoded media seconds per piece, and the rates of the pieces still
+        # running, summed into one progress for the task
+        done_time = {}
+        rates = {}
+        lock = threading.Lock()
+
+        def report(index, update):
+            with lock:
+                done_time[index] = update.out_time or 0.0
+                if update.done:
+                    rates.pop(index, None)
+                else:
+                    rates[index] = (update.fps or 0.0, update.speed or 0.0)
+                combined = FFmpegProgress({}, task.duration)
+                combined.out_time = sum(done_time.values())
+                combined.fps = sum(fps for fps, _ in rates.values()) or None
+                combined.speed = sum(speed for _, speed in rates.values()) or None
+            if on_progress is not None:
+                on_progress(combined)
+
+        def encode(index):
+            if task.state == PostProcessTask.CANCELLED:
+                return 1, []
+            target = os.path.join(workdir, f"encoded{index:05d}.mkv")
+            return run_ffmpeg(base_cmd + ['-i', sources[index], '-map', '0:v:0'] + args + ['-threads', str(threads),
+                                                                                         target],
+                              None, lambda update: report(index, update), task.attach)
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(encode, range(len(sources))))
+        for returncode, errors in results:
+            if returncode != 0:
+                return returncode, errors
+
+        list_path = os.path.join(workdir, 'segments.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for index in range(len(sources)):
+                path = os.path.join(workdir, f"encoded{index:05d}.mkv").replace("'", "'\\''")
+                f.write(f"file '{path}'\n")
+        audio_input = task.inputs[1] if len(task.inputs) > 1 else task.inputs[0]
+        return run_ffmpeg(base_cmd + ['-f', 'concat', '-safe', '0', '-i', list_path, '-i', audio_input,
+                                      '-map', '0:v:0', '-map', '1:a:0?', '-c:v', 'copy',
+                                      '-c:a', 'copy' if task.audio_copy else 'aac', '-movflags', '+faststart',
+                                      output],
+                          task.duration, None, task.attach)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def encode_task(file_path, args, job=None):
+    # Converts a downloaded file to MP4 with the custom encoding options; the
+    # original is replaced once the encode succeeded. The video is always
+    # encoded as asked, only a compatible audio stream is copied.
+    base, _ = os.path.splitext(file_path)
+    return PostProcessTask(ENCODE, [file_path], f"{base}.mp4", {'args': args, 'replace_input': True}, job)
+
+
+class PostProcessSignals(QObject):
+    task_added = Signal(object)
+    task_started = Signal(object)
+    task_finished = Signal(object)
+    task_failed = Signal(object, str)
+    task_cancelled = Signal(object)
+    stats_changed = Signal(dict)
+
+
+class PostProcessor:
+    # Second pipeline stage after the download queue. ffmpeg work is queued
+    # here and run by at most max_workers processes, so the download workers
+    # move on to the next item while this one is still being converted.
+    def __init__(self, max_workers=None, ffmpeg_binary=None, progress_sink=None):
+        self.max_workers = max(1, int(max_workers or default_workers()))
+        self.ffmpeg_binary = ffmpeg_binary
+        # Optional ProgressAggregator; tasks report under task.progress_key
+        self.progress_sink = progress_sink
+        self.signals = PostProcessSignals()
+        self.tasks = {}
+        self._heap = []
+        self._counter = itertools.count(1)
+        self._lock = threading.Condition()
+        self._workers = 0
+        self._running = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.processed_bytes = 0
+        self.started_at = None
+        # Media seconds and wall seconds of full transcodes, for estimate_saved()
+        self.transcoded_media = 0.0
+        self.transcode_seconds = 0.0
+        self.saved_seconds = 0.0
+        self.paths = {PATH_COPY: 0, PATH_AUDIO: 0, PATH_TRANSCODE: 0}
+
+    def set_max_workers(self, max_workers):
+        with self._lock:
+            self.max_workers = max(1, int(max_workers))
+            self._spawn_workers()
+
+    def submit(self, task):
+        with self._lock:
+            seq = next(self._counter)
+            task.id = str(seq)
+            task.queued_at = time.perf_counter()
+            if self.started_at is None:
+                self.started_at = task.queued_at
+            self.tasks[task.id] = task
+            heapq.heappush(self._heap, (-task.priority, seq, task))
+            self._spawn_workers()
+        self.signals.task_added.emit(task)
+        self.signals.stats_changed.emit(self.stats())
+        return task
+
+    def cancel(self, task_id):
+        with self._lock:
+            task = self.tasks.get(task_id)
+            if task is None or task.done:
+                return
+            # A running task is reported by its worker once ffmpeg has exited
+            was_pending = task.state == PostProcessTask.PENDING
+            with task.lock:
+                processes = list(task.processes)
+                task.state = PostProcessTask.CANCELLED
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        if was_pending:
+            self.signals.task_cancelled.emit(task)
+
+    def cancel_all(self):
+        for task_id in list(self.tasks):
+            self.cancel(task_id)
+
+    def active_count(self):
+        with self._lock:
+            return self._running + sum(1 for entry in self._heap if entry[2].state == PostProcessTask.PENDING)
+
+    def queue_depth(self):
+        with self._lock:
+            return sum(1 for entry in self._heap if entry[2].state == PostProcessTask.PENDING)
+
+    def stats(self):
+        # Stage level numbers for the status bar and the benchmarks
+        with self._lock:
+            wall = time.perf_counter() - self.started_at if self.started_at is not None else 0.0
+            finished = [task for task in self.tasks.values() if task.state == PostProcessTask.FINISHED]
+            waits = [task.started_at - task.queued_at for task in finished]
+            return {
+                'queued': sum(1 for entry in self._heap if entry[2].state == PostProcessTask.PENDING),
+                'running': self._running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'workers': self.max_workers,
+                'tasks_per_minute': self.completed * 60.0 / wall if wall else 0.0,
+                'bytes_per_second': self.processed_bytes / self.busy_seconds if self.busy_seconds else 0.0,
+                'average_wait': sum(waits) / len(waits) if waits else 0.0,
+                'utilization': self.busy_seconds / (wall * self.max_workers) if wall else 0.0,
+                'paths': dict(self.paths),
+                'saved_seconds': self.saved_seconds,
+            }
+
+    def transcode_speed(self):
+        # Caller holds self._lock
+        if self.transcode_seconds < 1.0:
+            return DEFAULT_TRANSCODE_SPEED
+        return self.transcoded_media / self.transcode_seconds
+
+    def _on_progress(self, task):
+        if self.progress_sink is not None:
+            self.progress_sink.submit(task.progress_key, task.progress_values(), 1, 1)
+
+    def _spawn_workers(self):
+        # Caller holds self._lock
+        wanted = min(self.max_workers, len(self._heap) + self._running)
+        while self._workers < wanted:
+            self._workers += 1
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def _next_task(self):
+        with self._lock:
+            while self._heap and self._running < self.max_workers:
+                task = heapq.heappop(self._heap)[2]
+                if task.state != PostProcessTask.PENDING:
+                    continue
+                task.state = PostProcessTask.RUNNING
+                task.started_at = time.perf_counter()
+                self._running += 1
+                # A segmented encode shares the cores with the tasks already running
+                task.options.setdefault('cores', max(1, (os.cpu_count() or 1) // self._running))
+                return task
+            self._workers -= 1
+            return None
+
+    def _worker(self):
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+            self.signals.task_started.emit(task)
+            self.signals.stats_changed.emit(self.stats())
+            try:
+                ok = run_task(task, self.ffmpeg_binary, self._on_progress)
+            except Exception as e:
+                task.error = str(e)
+                ok = False
+            with self._lock:
+                task.finished_at = time.perf_counter()
+                self._running -= 1
+                self.busy_seconds += task.elapsed
+                if task.state != PostProcessTask.CANCELLED:
+                    task.state = PostProcessTask.FINISHED if ok else PostProcessTask.FAILED
+                if task.state == PostProcessTask.FINISHED:
+                    self.completed += 1
+                    self.processed_bytes += task.input_bytes
+                    if task.path is not None:
+                        self.paths[task.path] += 1
+                        if task.path == PATH_TRANSCODE and task.duration:
+                            self.transcoded_media += task.duration
+                            self.transcode_seconds += task.elapsed
+                        task.saved_seconds = estimate_saved(task, self.transcode_speed())
+                        self.saved_seconds += task.saved_seconds
+                elif task.state == PostProcessTask.FAILED:
+                    self.failed += 1
+                self._spawn_workers()
+            if task.state == PostProcessTask.FINISHED:
+                self.signals.task_finished.emit(task)
+            elif task.state == PostProcessTask.FAILED:
+                self.signals.task_failed.emit(task, task.error or "Post-processing failed")
+            else:
+                self.signals.task_cancelled.emit(task)
+            self.signals.stats_changed.emit(self.stats())
@@ -0,0 +1,66 @@
+import threading
+from PySide6.QtCore import QObject, Signal
+
+
+class PrefetchSignals(QObject):
+    resolved = Signal(int, str, object)
+    failed = Signal(int, str)
+
+
+class MetadataPrefetcher:
+    # Resolves metadata for the URL being typed in a background thread. Every
+    # request gets a generation number; results of older generations are
+    # dropped and their yt-dlp process is killed.
+    def __init__(self, downloader):
+        self.downloader = downloader
+        self.signals = PrefetchSignals()
+        self.generation = 0
+        self._cancel_event = None
+        self._lock = threading.Lock()
+
+    def request(self, url):
+        with self._lock:
+            if self._cancel_event is not None:
+                self._cancel_event.set()
+            self.generation += 1
+            generation = self.generation
+            cancel_event = threading.Event()
+            self._cancel_event = cancel_event
+        threading.Thread(target=self._run, args=(generation, url, cancel_event), daemon=True).start()
+        return generation
+
+    def cancel(self):
+        with self._lock:
+            if self._cancel_event is not None:
+                self._cancel_event.set()
+                self._cancel_event = None
+            self.generation += 1
+
+    def is_current(self, generation):
+        return generation == self.generation
+
+    def _run(self, generation, url, cancel_event):
+        try:
+            info = self.downloader.fetch_info(url, cancel_event)
+        except Exception:
+            info = None
+        if cancel_event.is_set() or not self.is_current(generation):
+            return
+        if info is None:
+            self.signals.failed.emit(generation, url)
+        else:
+            self.signals.resolved.emit(generation, url, info)
+
+
+def available_formats(info):
+    # Heights and frame rates of the video formats the site actually offers
+    heights = set()
+    frame_rates = set()
+    for fmt in info.get('formats') or []:
+        if fmt.get('vcodec') in (None, 'none'):
+            continue
+        if fmt.get('height'):
+            heights.add(int(fmt['height']))
+        if fmt.get('fps'):
+            frame_rates.add(int(round(fmt['fps'])))
+    return sorted(heights), sorted(frame_rates)
@@ -0,0 +1,127 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from src.mduyt.core.binaries import get_manifest, run_quiet
+
+# Codecs the MP4 muxer takes as they are
+MP4_VIDEO_CODECS = {'h264', 'hevc', 'av1'}
+MP4_AUDIO_CODECS = {'aac', 'mp3', 'ac3', 'eac3', 'alac'}
+
+# -c:v value -> codec family it produces
+ENCODER_FAMILIES = {
+    'libx264': 'h264', 'h264_qsv': 'h264', 'h264_nvenc': 'h264', 'h264_amf': 'h264',
+    'h264_videotoolbox': 'h264', 'h264_vaapi': 'h264',
+    'libx265': 'hevc', 'hevc_qsv': 'hevc', 'hevc_nvenc': 'hevc', 'hevc_amf': 'hevc',
+    'hevc_videotoolbox': 'hevc', 'hevc_vaapi': 'hevc',
+    'libsvtav1': 'av1', 'libaom-av1': 'av1', 'av1_qsv': 'av1', 'av1_nvenc': 'av1', 'av1_amf': 'av1',
+}
+
+
+def encoder_family(encoder):
+    return ENCODER_FAMILIES.get(encoder, encoder)
+
+
+def _rate(value):
+    # "30000/1001" -> 29.97
+    try:
+        num, _, den = (value or '').partition('/')
+        return float(num) / float(den or 1) if float(den or 1) else None
+    except ValueError:
+        return None
+
+
+class MediaInfo:
+    def __init__(self, data):
+        fmt = data.get('format', {})
+        self.format_name = fmt.get('format_name', '')
+        try:
+            self.duration = float(fmt.get('duration'))
+        except (TypeError, ValueError):
+            self.duration = None
+        self.streams = data.get('streams', [])
+        video = next((s for s in self.streams if s.get('codec_type') == 'video'
+                      and not s.get('disposition', {}).get('attached_pic')), None)
+        audio = next((s for s in self.streams if s.get('codec_type') == 'audio'), None)
+        self.video_codec = video.get('codec_name') if video else None
+        self.audio_codec = audio.get('codec_name') if audio else None
+        self.width = video.get('width') if video else None
+        self.height = video.get('height') if video else None
+        self.fps = _rate(video.get('avg_frame_rate')) if video else None
+
+    @property
+    def has_video(self):
+        return self.video_codec is not None
+
+    @property
+    def has_audio(self):
+        return self.audio_codec is not None
+
+
+class ProbeCache:
+    # ffprobe results per file, valid while the file's mtime and size are unchanged
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def get(self, path, ffprobe=None):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = self._key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == (stat.st_mtime, stat.st_size):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        info = run_probe(path, ffprobe)
+        if info is not None:
+            with self._lock:
+                self._entries[key] = ((stat.st_mtime, stat.st_size), info)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return info
+
+    def invalidate(self, path):
+        with self._lock:
+            self._entries.pop(self._key(path), None)
+
+
+def run_probe(path, ffprobe=None):
+    ffprobe = ffprobe or get_manifest().path_of('ffprobe')
+    output = run_quiet([ffprobe, '-v', 'error', '-show_entries',
+                        'format=format_name,duration:stream=codec_type,codec_name,width,height,avg_frame_rate'
+                        ':stream_disposition=attached_pic',
+                        '-of', 'json', path], timeout=30)
+    if not output:
+        return None
+    try:
+        return MediaInfo(json.loads(output))
+    except ValueError:
+        return None
+
+
+_probe_cache = None
+_probe_cache_lock = threading.Lock()
+
+
+def get_probe_cache():
+    global _probe_cache
+    with _probe_cache_lock:
+        if _probe_cache is None:
+            _probe_cache = ProbeCache()
+        return _probe_cache
+
+
+def probe(path, ffprobe=None):
+    return get_probe_cache().get(path, ffprobe)
@@ -0,0 +1,251 @@
+# Every record yt-dlp prints for us starts with this marker followed by a tab
+# separated list of fields. Tabs never occur in the numeric fields and the
+# free-text field (file path / title) is always the last one, so a single
+# split is enough to decode a record.
+MARKER = '[mdu]'
+NA = 'NA'
+
+DOWNLOAD_TEMPLATE = '\t'.join([
+    MARKER, 'download',
+    '%(progress.status)s',
+    '%(progress.downloaded_bytes)s',
+    '%(progress.total_bytes)s',
+    '%(progress.total_bytes_estimate)s',
+    '%(progress.speed)s',
+    '%(progress.eta)s',
+    '%(progress.fragment_index)s',
+    '%(progress.fragment_count)s',
+    '%(info.playlist_index)s',
+    '%(info.n_entries)s',
+    '%(progress.filename)s',
+])
+
+POSTPROCESS_TEMPLATE = '\t'.join([
+    MARKER, 'postprocess',
+    '%(progress.status)s',
+    '%(progress.postprocessor)s',
+    '%(info.filepath)s',
+])
+
+ITEM_TEMPLATE = '\t'.join([
+    MARKER, 'item',
+    '%(playlist_index)s',
+    '%(n_entries)s',
+    '%(extractor_key)s',
+    '%(id)s',
+    '%(original_url)s',
+    '%(title)s',
+])
+
+DESTINATION_TEMPLATE = '\t'.join([
+    MARKER, 'destination',
+    '%(filepath)s',
+])
+
+
+def structured_progress_args():
+    # --print implies --quiet, so --progress is needed to keep progress output
+    return [
+        '--progress',
+        '--progress-template', f'download:{DOWNLOAD_TEMPLATE}',
+        '--progress-template', f'postprocess:{POSTPROCESS_TEMPLATE}',
+        '--print', f'before_dl:{ITEM_TEMPLATE}',
+        '--print', f'after_move:{DESTINATION_TEMPLATE}',
+    ]
+
+
+class DownloadEvent:
+    # Fields are only converted when they are read, so records that get
+    # superseded before anybody looks at them cost a split and nothing more.
+    kind = 'download'
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    @property
+    def status(self):
+        return self.fields[0]
+
+    @property
+    def downloaded_bytes(self):
+        return _float(self.fields[1])
+
+    @property
+    def total_bytes(self):
+        total = _float(self.fields[2])
+        if total is None:
+            total = _float(self.fields[3])
+        return total
+
+    @property
+    def speed(self):
+        return _float(self.fields[4])
+
+    @property
+    def eta(self):
+        return _float(self.fields[5])
+
+    @property
+    def fragment_index(self):
+        return _int(self.fields[6])
+
+    @property
+    def fragment_count(self):
+        return _int(self.fields[7])
+
+    @property
+    def item_index(self):
+        return _int(self.fields[8])
+
+    @property
+    def item_count(self):
+        return _int(self.fields[9])
+
+    @property
+    def filename(self):
+        return _text(self.fields[10])
+
+    @property
+    def percent(self):
+        if self.status == 'finished':
+            return 100.0
+        total = self.total_bytes
+        downloaded = self.downloaded_bytes
+        if total and downloaded is not None:
+            return min(100.0, downloaded * 100.0 / total)
+        fragment_count = self.fragment_count
+        fragment_index = self.fragment_index
+        if fragment_count and fragment_index:
+            return min(100.0, fragment_index * 100.0 / fragment_count)
+        return 0.0
+
+
+class HookDownloadEvent:
+    # Same interface as DownloadEvent for a progress_hooks dict coming from an
+    # in-process YoutubeDL instance
+    kind = 'download'
+    __slots__ = ('status', 'downloaded_bytes', 'total_bytes', 'speed', 'eta',
+                 'fragment_index', 'fragment_count', 'item_index', 'item_count', 'filename')
+
+    def __init__(self, status_dict):
+        info = status_dict.get('info_dict') or {}
+        self.status = status_dict.get('status')
+        self.downloaded_bytes = status_dict.get('downloaded_bytes')
+        self.total_bytes = status_dict.get('total_bytes') or status_dict.get('total_bytes_estimate')
+        self.speed = status_dict.get('speed')
+        self.eta = status_dict.get('eta')
+        self.fragment_index = status_dict.get('fragment_index')
+        self.fragment_count = status_dict.get('fragment_count')
+        self.item_index = info.get('playlist_index')
+        self.item_count = info.get('n_entries')
+        self.filename = status_dict.get('filename')
+
+    percent = DownloadEvent.percent
+
+
+class PostProcessEvent:
+    kind = 'postprocess'
+    __slots__ = ('status', 'postprocessor', 'filepath')
+
+    def __init__(self, status, postprocessor, filepath):
+        self.status = status
+        self.postprocessor = postprocessor
+        self.filepath = filepath
+
+
+class ItemEvent:
+    kind = 'item'
+    __slots__ = ('item_index', 'item_count', 'extractor_key', 'video_id', 'url', 'title')
+
+    def __init__(self, item_index, item_count, extractor_key, video_id, url, title):
+        self.item_index = item_index
+        self.item_count = item_count
+        self.extractor_key = extractor_key
+        self.video_id = video_id
+        self.url = url
+        self.title = title
+
+
+class DestinationEvent:
+    kind = 'destination'
+    __slots__ = ('filepath',)
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+
+def _float(value):
+    if value == NA or not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _int(value):
+    if value == NA or not value:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        return None
+
+
+def _text(value):
+    return None if value == NA else value
+
+
+def decode_line(line):
+    # Returns a typed event for a structured record, or None for any other line
+    if not line.startswith(MARKER):
+        return None
+    kind, _, rest = line[len(MARKER) + 1:].rstrip('\r\n').partition('\t')
+
+    if kind == 'download':
+        fields = rest.split('\t', 10)
+        if len(fields) != 11:
+            return None
+        return DownloadEvent(fields)
+    elif kind == 'postprocess':
+        fields = rest.split('\t', 2)
+        if len(fields) != 3:
+            return None
+        return PostProcessEvent(fields[0], _text(fields[1]), _text(fields[2]))
+    elif kind == 'item':
+        fields = rest.split('\t', 5)
+        if len(fields) != 6:
+            return None
+        return ItemEvent(_int(fields[0]), _int(fields[1]), _text(fields[2]),
+                         _text(fields[3]), _text(fields[4]), _text(fields[5]))
+    elif kind == 'destination':
+        return DestinationEvent(_text(rest))
+    return None
+
+
+def format_bytes(num_bytes):
+    if num_bytes is None:
+        return ""
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(num_bytes) < 1024.0:
+            return f"{num_bytes:.2f}{unit}"
+        num_bytes /= 1024.0
+    return f"{num_bytes:.2f}TiB"
+
+
+def format_speed(bytes_per_second):
+    if bytes_per_second is None:
+        return ""
+    return f"{format_bytes(bytes_per_second)}/s"
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return ""
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
@@ -0,0 +1,188 @@
+import re
+import json
+import time
+import sqlite3
+import threading
+from PySide6.QtCore import QObject, Signal
+from src.mduyt.core.downloader import Downloader
+from src.mduyt.core.downloadqueue import DownloadOptions
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    options TEXT NOT NULL,
+    newest_first INTEGER NOT NULL,
+    seen_ids TEXT NOT NULL,
+    last_synced REAL
+);
+"""
+
+# Channel pages list their uploads newest first; ordinary playlists append
+# new entries at the end
+CHANNEL_RE = re.compile(r'youtube\.com/(?:@[^/?#]+|channel/|c/|user/)')
+# A channel URL without a tab lists the channel's tabs, not its videos
+CHANNEL_HOME_RE = re.compile(r'^(https?://(?:www\.|m\.)?youtube\.com/(?:@[^/?#]+|(?:channel|c|user)/[^/?#]+))/?(?:[?#].*)?$')
+
+
+def channel_videos_url(url):
+    match = CHANNEL_HOME_RE.match(url)
+    return match.group(1) + '/videos' if match else url
+
+
+class Subscription:
+    def __init__(self, sub_id, url, title, options, newest_first, seen_ids, last_synced):
+        self.id = sub_id
+        self.url = url
+        self.title = title
+        self.options = options
+        self.newest_first = newest_first
+        # Most recent video ids, newest first
+        self.seen_ids = seen_ids
+        self.last_synced = last_synced
+
+
+class SubscriptionStore:
+    # Saved playlists and channels, kept in the history database
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+    def add(self, url, title, options):
+        newest_first = bool(CHANNEL_RE.search(url))
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                'INSERT OR REPLACE INTO subscriptions (url, title, options, newest_first, seen_ids) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (url, title, json.dumps(vars(options)), newest_first, '[]'))
+        return Subscription(cursor.lastrowid, url, title, options, newest_first, [], None)
+
+    def remove(self, sub_id):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM subscriptions WHERE id = ?', (sub_id,))
+
+    def all(self):
+        with self._lock:
+            rows = self.conn.execute('SELECT id, url, title, options, newest_first, seen_ids, last_synced '
+                                     'FROM subscriptions ORDER BY title').fetchall()
+        return [Subscription(sub_id, url, title, DownloadOptions(**json.loads(options)), bool(newest_first),
+                             json.loads(seen_ids), last_synced)
+                for sub_id, url, title, options, newest_first, seen_ids, last_synced in rows]
+
+    def update_seen(self, sub, seen_ids):
+        sub.seen_ids = seen_ids
+        sub.last_synced = time.time()
+        with self._lock, self.conn:
+            self.conn.execute('UPDATE subscriptions SET seen_ids = ?, last_synced = ? WHERE id = ?',
+                              (json.dumps(seen_ids), sub.last_synced, sub.id))
+
+
+class SubscriptionSignals(QObject):
+    subscribed = Signal(str)
+    synced = Signal(str, int, float)
+    failed = Signal(str, str)
+    finished = Signal(int)
+
+
+class SubscriptionSync:
+    # Lists each subscription with --flat-playlist and queues only the entries
+    # that are new since the last sync. Channels stop listing at the first id
+    # that was already seen; playlists are listed fully (a flat listing is
+    # cheap) and new entries are the ones not seen before. Subscribing lists
+    # the current entries as seen, so only videos added afterwards are queued.
+    def __init__(self, store, queue, engine, keep_ids=50, max_new=500, concurrency=2):
+        self.store = store
+        self.queue = queue
+        self.engine = engine
+        # Several ids are kept so a deleted video does not make a sync walk the whole channel
+        self.keep_ids = keep_ids
+        self.max_new = max_new
+        self.concurrency = concurrency
+        self.signals = SubscriptionSignals()
+        self.running = False
+
+    def subscribe(self, url, options):
+        threading.Thread(target=self._subscribe, args=(url, options), daemon=True).start()
+
+    def _subscribe(self, url, options):
+        url = channel_videos_url(url)
+        downloader = Downloader()
+        downloader.engine = self.engine
+        title = downloader.playlist_title(url)
+        if title is None:
+            self.signals.failed.emit(url, "Not a playlist or channel")
+            return
+        sub = self.store.add(url, title, options)
+        try:
+            self.sync(sub, queue_new=False)
+        except Exception as e:
+            # Without seen ids the first sync would queue the whole channel
+            self.store.remove(sub.id)
+            self.signals.failed.emit(title, str(e))
+            return
+        self.signals.subscribed.emit(title)
+
+    def sync_all(self):
+        if self.running:
+            return
+        self.running = True
+        threading.Thread(target=self._sync_all, daemon=True).start()
+
+    def _sync_all(self):
+        total = 0
+        try:
+            for sub in self.store.all():
+                try:
+                    total += self.sync(sub)
+                except Exception as e:
+                    self.signals.failed.emit(sub.title, str(e))
+        finally:
+            self.running = False
+            self.signals.finished.emit(total)
+
+    def sync(self, sub, queue_new=True):
+        start = time.perf_counter()
+        # Seeding only needs the ids a later sync stops at
+        max_new = self.max_new if queue_new else self.keep_ids
+        downloader = Downloader()
+        downloader.engine = self.engine
+        seen = set(sub.seen_ids)
+        listed = []
+        new_entries = []
+        # Entries the listing returned, seen ones included
+        returned = 0
+        entries = downloader.stream_playlist(sub.url)
+        try:
+            for video_id, entry_url in entries:
+                returned += 1
+                if video_id in seen:
+                    if sub.newest_first:
+                        break
+                    listed.append(video_id)
+                    continue
+                listed.append(video_id)
+                new_entries.append(entry_url)
+                if sub.newest_first and len(new_entries) >= max_new:
+                    break
+        finally:
+            # Stops yt-dlp if the listing ended early
+            entries.close()
+
+        if not returned:
+            raise RuntimeError("Could not list the playlist entries")
+        if sub.newest_first:
+            # Download in upload order
+            new_entries.reverse()
+            seen_ids = (listed + sub.seen_ids)[:self.keep_ids]
+        else:
+            seen_ids = listed
+        if queue_new and new_entries:
+            self.queue.add_playlist(sub.url, sub.title, new_entries, sub.options, self.concurrency)
+        self.store.update_seen(sub, seen_ids)
+        if not queue_new:
+            return 0
+        self.signals.synced.emit(sub.title, len(new_entries), time.perf_counter() - start)
+        return len(new_entries)
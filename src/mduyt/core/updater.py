@@ -1,5 +1,8 @@
 import os
 import sys
+import json
+import time
+import threading
 import requests
 from packaging import version
 import tempfile
@@ -8,6 +11,26 @@ import shutil
 import subprocess
 from PySide6.QtWidgets import QMessageBox
 from PySide6.QtCore import QObject, Signal
+from env import root
+from src.mduyt.utils.version import appname, appversion
+
+RELEASES_URL = "https://api.github.com/repos/project-mdu/mdu-yt/releases/latest"
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    # One connection pool for every update request
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update({
+                'User-Agent': f"{appname.replace(' ', '-')}/{appversion}",
+                'Accept': 'application/vnd.github+json',
+            })
+        return _session
 
 
 class UpdaterSignals(QObject):
@@ -17,26 +40,78 @@ class UpdaterSignals(QObject):
     update_error = Signal(str)
 
 class GitHubUpdater:
-    def __init__(self, current_version, is_portable=False):
+    def __init__(self, current_version, is_portable=False, api_url=RELEASES_URL, cache_path=None,
+                 ttl=6 * 3600, timeout=(5, 15)):
         self.current_version = current_version
         self.is_portable = is_portable
-        self.api_url = "https://api.github.com/repos/project-mdu/mdu-yt/releases/latest"
+        self.api_url = api_url
+        # Last response of the releases API, reused for ttl seconds and then
+        # revalidated with If-None-Match / If-Modified-Since
+        self.cache_path = cache_path or os.path.join(root, 'cache', 'update.json')
+        self.ttl = ttl
+        self.timeout = timeout
         self.signals = UpdaterSignals()
+        self.requests_sent = 0
+        self.not_modified = 0
 
-    def check_for_updates(self):
+    def _load_cache(self):
         try:
-            response = requests.get(self.api_url)
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # A cache written for another endpoint is of no use
+        return cache if cache.get('url') == self.api_url else {}
+
+    def _save_cache(self, cache):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        temp_path = self.cache_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(temp_path, self.cache_path)
+
+    def latest_release(self, force=False):
+        cache = self._load_cache()
+        release = cache.get('release')
+        if not force and release is not None and time.time() - cache.get('checked', 0) < self.ttl:
+            return release
+
+        headers = {}
+        if release is not None:
+            if cache.get('etag'):
+                headers['If-None-Match'] = cache['etag']
+            if cache.get('last_modified'):
+                headers['If-Modified-Since'] = cache['last_modified']
+        self.requests_sent += 1
+        response = get_session().get(self.api_url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and release is not None:
+            self.not_modified += 1
+        else:
             response.raise_for_status()
-            latest_release = response.json()
+            release = response.json()
+            cache = {'url': self.api_url, 'release': release, 'etag': response.headers.get('ETag'),
+                     'last_modified': response.headers.get('Last-Modified')}
+        cache['checked'] = time.time()
+        try:
+            self._save_cache(cache)
+        except OSError:
+            pass
+        return release
+
+    def check_for_updates(self, force=False, notify=True):
+        try:
+            latest_release = self.latest_release(force)
             latest_version = latest_release['tag_name'].lstrip('v')
 
             if version.parse(latest_version) > version.parse(self.current_version):
-                self.signals.update_available.emit(latest_version)
+                if notify:
+                    self.signals.update_available.emit(latest_version)
                 return latest_release
             else:
                 return None
-        except requests.RequestException as e:
-            self.signals.update_error.emit(f"Error checking for updates: {str(e)}")
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            if notify:
+                self.signals.update_error.emit(f"Error checking for updates: {str(e)}")
             return None
 
     def download_and_install_update(self, release):
@@ -64,7 +139,7 @@ class GitHubUpdater:
             self.signals.update_error.emit(f"Error during update: {str(e)}")
 
     def _download_file(self, url, local_path):
-        response = requests.get(url, stream=True)
+        response = get_session().get(url, stream=True, timeout=self.timeout)
         response.raise_for_status()
         total_size = int(response.headers.get('content-length', 0))
         block_size = 8192
@@ -74,8 +149,9 @@ class GitHubUpdater:
             for data in response.iter_content(block_size):
                 file.write(data)
                 downloaded += len(data)
-                progress = int((downloaded / total_size) * 100)
-                self.signals.update_progress.emit(progress)
+                if total_size:
+                    progress = int((downloaded / total_size) * 100)
+                    self.signals.update_progress.emit(progress)
 
     def _update_portable(self, zip_path):
         app_dir = os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else __file__)
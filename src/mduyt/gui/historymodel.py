@@ -0,0 +1,327 @@
+import os
+import sys
+import subprocess
+import time
+import threading
+from PySide6.QtCore import (Qt, QObject, Signal, Slot, QAbstractListModel, QSortFilterProxyModel, QModelIndex,
+                            QRect, QSize, QEvent)
+from PySide6.QtGui import QIcon, QColor, QPalette, QFont
+from PySide6.QtWidgets import QApplication, QStyledItemDelegate, QStyle, QToolTip
+
+ROW_HEIGHT = 50
+ICON_SIZE = 32
+BUTTON_SIZE = 32
+
+
+def open_file_location(data):
+    file_path = os.path.join(data['path'], data['filename'])
+    if sys.platform == "win32":
+        file_path = file_path.replace('/', '\\')
+        subprocess.run(['explorer', '/select,', file_path])
+        print(f"Opening file location: {file_path}")
+    elif sys.platform == "darwin":
+        subprocess.run(['open', '-R', file_path])
+    else:
+        # For Linux, we'll open the folder and try to select the file if possible
+        folder_path = os.path.dirname(file_path)
+        subprocess.run(['xdg-open', folder_path])
+
+
+def row_matches(row, terms):
+    text = ' '.join((row['filename'], row['path'], row['file_type'], row['url'] or '')).lower()
+    return all(term in text for term in terms)
+
+
+class HistoryLoaderSignals(QObject):
+    chunk_loaded = Signal(int, list)
+    finished = Signal(int)
+
+
+class HistoryModel(QAbstractListModel):
+    # Rows are read from HistoryStore on a background thread, newest first.
+    # The first screenful comes as one small chunk, the rest follows in
+    # larger chunks. Only the first chunk goes into the model right away; the
+    # rest wait in a buffer until the view asks for them through fetchMore
+    # while scrolling. Each row is the plain dict the store returns; no
+    # widgets are created per row.
+    def __init__(self, store, first_chunk=50, chunk_size=2000, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.first_chunk = first_chunk
+        self.chunk_size = chunk_size
+        self.loading = False
+        self.signals = HistoryLoaderSignals()
+        self.signals.chunk_loaded.connect(self.on_chunk_loaded)
+        self.signals.finished.connect(self.on_load_finished)
+        self._rows = []
+        # Chunks read by the loader thread and not yet in the model
+        self._buffer = []
+        # The view asked for more before the loader had the next chunk
+        self._fetch_pending = False
+        # Set by fetch_all(): chunks go into the model as soon as they arrive
+        self._eager = False
+        # Bumped by reload/clear so chunks of an older load are dropped
+        self._generation = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.UserRole:
+            return row
+        if role == Qt.DisplayRole:
+            return row['filename']
+        if role == Qt.ToolTipRole:
+            return os.path.join(row['path'], row['filename'])
+        return None
+
+    def entry(self, row):
+        return self._rows[row]
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and (bool(self._buffer) or self.loading)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        if not self._buffer:
+            # Inserted by on_chunk_loaded once the loader has it
+            self._fetch_pending = self.loading
+            return
+        rows = self._buffer.pop(0)
+        self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def fetch_all(self):
+        # Everything loaded so far and from now on goes into the model, for
+        # callers that need every row, like the search filter
+        self._eager = True
+        while self._buffer:
+            self.fetchMore()
+
+    def reload(self):
+        self.beginResetModel()
+        self._rows = []
+        self._buffer = []
+        self._fetch_pending = False
+        self._eager = False
+        self._generation += 1
+        self.endResetModel()
+        self.loading = True
+        # Rows added after this point are prepended by the window, not loaded
+        boundary = self.store.last_id() + 1
+        threading.Thread(target=self._load, args=(self._generation, boundary), daemon=True).start()
+
+    def _load(self, generation, before_id):
+        limit = self.first_chunk
+        while generation == self._generation:
+            rows = self.store.load(limit, before_id)
+            if rows:
+                self.signals.chunk_loaded.emit(generation, rows)
+            if len(rows) < limit:
+                break
+            before_id = rows[-1]['id']
+            limit = self.chunk_size
+        self.signals.finished.emit(generation)
+
+    @Slot(int, list)
+    def on_chunk_loaded(self, generation, rows):
+        if generation != self._generation:
+            return
+        self._buffer.append(rows)
+        if self._eager or self._fetch_pending or not self._rows:
+            self._fetch_pending = False
+            self.fetchMore()
+
+    @Slot(int)
+    def on_load_finished(self, generation):
+        if generation == self._generation:
+            self.loading = False
+            self._fetch_pending = False
+
+    def prepend(self, row):
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._rows.insert(0, row)
+        self.endInsertRows()
+
+    def remove_row(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._rows[row]
+        self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self._buffer = []
+        self._fetch_pending = False
+        self._eager = False
+        self._generation += 1
+        self.loading = False
+        self.endResetModel()
+
+
+class HistorySearchSignals(QObject):
+    finished = Signal(int, str, object, float)
+
+
+class HistoryFilterProxy(QSortFilterProxyModel):
+    # Shows the HistoryModel rows whose ids the search returned. The query
+    # runs on a worker thread and typing only re-filters; the source model is
+    # never rebuilt and the filter is a set lookup per row.
+    def __init__(self, store, writer=None, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.writer = writer
+        self.ids = None
+        self.terms = []
+        self.last_search_time = 0.0
+        self.signals = HistorySearchSignals()
+        self.signals.finished.connect(self.on_search_finished)
+        self._generation = 0
+
+    def search(self, text):
+        self._generation += 1
+        text = text.strip()
+        if not text:
+            self.ids = None
+            self.terms = []
+            self.invalidateFilter()
+            return
+        # Rows the writer has not committed are not in the index yet; they
+        # are the newest ones, at the top of the source model
+        committed = self.writer.committed_id if self.writer is not None else float('inf')
+        source = self.sourceModel()
+        pending = []
+        while len(pending) < source.rowCount() and source.entry(len(pending))['id'] > committed:
+            pending.append(source.entry(len(pending)))
+        threading.Thread(target=self._search, args=(self._generation, text, pending), daemon=True).start()
+
+    def _search(self, generation, text, pending):
+        start = time.perf_counter()
+        ids = self.store.search(text)
+        terms = text.lower().split()
+        ids.update(row['id'] for row in pending if row_matches(row, terms))
+        if generation == self._generation:
+            self.signals.finished.emit(generation, text, ids, time.perf_counter() - start)
+
+    @Slot(int, str, object, float)
+    def on_search_finished(self, generation, text, ids, elapsed):
+        if generation != self._generation:
+            return
+        self.ids = ids
+        self.terms = text.lower().split()
+        self.last_search_time = elapsed
+        # Matches can sit in chunks the view has not scrolled to yet
+        self.sourceModel().fetch_all()
+        self.invalidateFilter()
+
+    def include(self, row):
+        # Call before a new row is added to the source model
+        if self.ids is not None and row_matches(row, self.terms):
+            self.ids.add(row['id'])
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self.ids is None or self.sourceModel().entry(source_row)['id'] in self.ids
+
+
+class HistoryDelegate(QStyledItemDelegate):
+    # Paints icon, filename, path and the "open file location" button of a row
+    # directly; clicks on the button are handled in editorEvent.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.alt_color1 = QColor(53, 53, 53)  # Darker gray
+        self.alt_color2 = QColor(45, 45, 45)  # Slightly lighter gray
+        self.icons = {
+            'Audio': QIcon(":/audio.ico"),
+            'Video': QIcon(":/vid.ico"),
+        }
+        self.file_icon = QIcon(":/file.ico")
+        self.folder_icon = QIcon(":/folder.svg")
+        self.hover_row = -1
+        self.update_colors()
+
+    def update_colors(self):
+        palette = QApplication.palette()
+        base_color = palette.color(QPalette.ColorRole.Base)
+        if base_color.lightness() < 128:  # Dark theme
+            self.alt_color1 = base_color.darker(110)
+            self.alt_color2 = base_color.darker(120)
+        else:  # Light theme
+            self.alt_color1 = base_color.darker(105)
+            self.alt_color2 = base_color.darker(110)
+
+    def button_rect(self, rect):
+        return QRect(rect.right() - BUTTON_SIZE - 5, rect.top() + (rect.height() - BUTTON_SIZE) // 2,
+                     BUTTON_SIZE, BUTTON_SIZE)
+
+    def paint(self, painter, option, index):
+        data = index.data(Qt.UserRole)
+        if not data:
+            return
+        rect = option.rect
+        painter.save()
+
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(rect, QColor(42, 130, 218))
+        elif index.row() % 2 == 0:
+            painter.fillRect(rect, self.alt_color1)
+        else:
+            painter.fillRect(rect, self.alt_color2)
+
+        icon = self.icons.get(data['file_type'], self.file_icon)
+        icon_rect = QRect(rect.left() + 5, rect.top() + (rect.height() - ICON_SIZE) // 2, ICON_SIZE, ICON_SIZE)
+        icon.paint(painter, icon_rect)
+
+        button_rect = self.button_rect(rect)
+        text_left = icon_rect.right() + 8
+        text_width = button_rect.left() - 8 - text_left
+        line_height = (rect.height() - 10) // 2
+        palette = option.palette
+
+        bold_font = QFont(option.font)
+        bold_font.setBold(True)
+        painter.setFont(bold_font)
+        painter.setPen(palette.color(QPalette.ColorRole.Text))
+        filename_rect = QRect(text_left, rect.top() + 5, text_width, line_height)
+        painter.drawText(filename_rect, Qt.AlignLeft | Qt.AlignVCenter,
+                         painter.fontMetrics().elidedText(data['filename'], Qt.ElideRight, text_width))
+
+        painter.setFont(option.font)
+        painter.setPen(QColor('gray'))
+        path_rect = QRect(text_left, filename_rect.bottom(), text_width, line_height)
+        painter.drawText(path_rect, Qt.AlignLeft | Qt.AlignVCenter,
+                         painter.fontMetrics().elidedText(data['path'], Qt.ElideMiddle, text_width))
+
+        if index.row() == self.hover_row:
+            painter.fillRect(button_rect, QColor(255, 255, 255, 25))
+        self.folder_icon.paint(painter, button_rect.adjusted(6, 6, -6, -6))
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QSize(0, ROW_HEIGHT)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseMove:
+            row = index.row() if self.button_rect(option.rect).contains(event.position().toPoint()) else -1
+            if row != self.hover_row:
+                self.hover_row = row
+                self.parent().viewport().update()
+        elif event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            if self.button_rect(option.rect).contains(event.position().toPoint()):
+                data = index.data(Qt.UserRole)
+                if data:
+                    open_file_location(data)
+                return True
+        return super().editorEvent(event, model, option, index)
+
+    def helpEvent(self, event, view, option, index):
+        if event.type() == QEvent.ToolTip and self.button_rect(option.rect).contains(event.pos()):
+            QToolTip.showText(event.globalPos(), "Open File Location", view)
+            return True
+        return super().helpEvent(event, view, option, index)
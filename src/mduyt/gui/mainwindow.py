@@ -1,22 +1,31 @@
 import os
 import sys
-import json
 import threading
 import subprocess
 import platform
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                                QLineEdit, QPushButton, QProgressBar, QLabel, QRadioButton,
                                QComboBox, QButtonGroup, QFileDialog, QMessageBox, QListView,
-                               QStyledItemDelegate, QStatusBar, QStyle, QMenu, QDialog, QCheckBox, QSpinBox)
-from PySide6.QtCore import Qt, Slot, QSize, QPoint, QObject, Signal, __version__
-from PySide6.QtGui import QStandardItemModel, QStandardItem, QIcon, QPalette, QColor, QAction
+                               QStatusBar, QMenu, QDialog, QCheckBox, QSpinBox)
+from PySide6.QtCore import Qt, Slot, QPoint, QObject, Signal, QTimer, QSettings, __version__
+from PySide6.QtGui import QIcon, QPalette, QColor, QAction
 from src.mduyt.core.downloader import Downloader
+from src.mduyt.core.aggregator import ProgressAggregator
+from src.mduyt.core.downloadqueue import DownloadQueue, DownloadOptions, DownloadJob
+from src.mduyt.core.inprocess import ENGINE_SUBPROCESS, ENGINE_INPROCESS
+from src.mduyt.core.prefetch import MetadataPrefetcher, available_formats
+from src.mduyt.core.journal import JobJournal
+from src.mduyt.core.history import HistoryStore, HistoryWriter
+from src.mduyt.core.archive import DownloadArchive
+from src.mduyt.core.subscriptions import SubscriptionStore, SubscriptionSync
+from src.mduyt.core.binaries import get_manifest
+from src.mduyt.core.progress import format_eta
+from src.mduyt.core.postprocessing import PostProcessor, ENCODE, encode_task, describe_path
+from src.mduyt.core.encoders import EncoderProbe, encoder_args, encoder_label, ranked, cached_results
+from src.mduyt.gui.historymodel import HistoryModel, HistoryFilterProxy, HistoryDelegate
 from src.mduyt.gui.menubar import MenuBar
-from src.mduyt.gui.multipledownloaddialog import MultipleDownloadDialog
-from src.mduyt.core.updater import GitHubUpdater
 from src.mduyt.utils.version import appversion, appname, ytdlp_version
 from pathlib import Path
-from src.mduyt.data.donator import donators
 # from ui_mainwindow import Ui_MainWindow
 
 
@@ -26,113 +35,6 @@ def normalize_path(path):
 def windows_path(path):
     return path.replace('/', '\\')
 
-class HoverButton(QPushButton):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setStyleSheet("""
-            QPushButton {
-                background-color: transparent;
-                border: none;
-                opacity: 0.7;
-            }
-            QPushButton:hover {
-                background-color: rgba(255, 255, 255, 0.1);
-                opacity: 1.0;
-            }
-        """)
-        self.setFixedSize(32, 32)
-
-class HistoryItemWidget(QWidget):
-    def __init__(self, data, parent=None):
-        super().__init__(parent)
-        layout = QHBoxLayout(self)
-        layout.setContentsMargins(5, 5, 5, 5)
-
-        icon = QIcon(self.get_icon_path(data['file_type']))
-        self.icon_label = QLabel()
-        self.icon_label.setPixmap(icon.pixmap(QSize(32, 32)))
-        layout.addWidget(self.icon_label)
-
-        info_layout = QVBoxLayout()
-        self.filename_label = QLabel(data['filename'])
-        self.filename_label.setStyleSheet("font-weight: bold;")
-        info_layout.addWidget(self.filename_label)
-
-        self.path_label = QLabel(data['path'])
-        self.path_label.setStyleSheet("color: gray;")
-        info_layout.addWidget(self.path_label)
-
-        layout.addLayout(info_layout)
-        layout.addStretch()
-
-        # Add "Open File Location" button with hover effect
-        self.open_location_button = HoverButton(self)
-        self.open_location_button.setIcon(QIcon(":/folder.svg"))
-        self.open_location_button.setToolTip("Open File Location")
-        self.open_location_button.clicked.connect(lambda: self.open_file_location(data))
-        layout.addWidget(self.open_location_button)
-
-        self.setObjectName("historyItem")
-        self.filename_label.setObjectName("filenameLabel")
-        self.path_label.setObjectName("pathLabel")
-
-    def get_icon_path(self, file_type):
-        if file_type == 'Audio':
-            return ":/audio.ico"
-        elif file_type == 'Video':
-            return ":/vid.ico"
-        else:
-            return ":/file.ico"
-
-    def open_file_location(self, data):
-        file_path = os.path.join(data['path'], data['filename'])
-        if sys.platform == "win32":
-            file_path = windows_path(file_path)
-            subprocess.run(['explorer', '/select,', file_path])
-            print(f"Opening file location: {file_path}")
-        elif sys.platform == "darwin":
-            subprocess.run(['open', '-R', file_path])
-        else:
-            # For Linux, we'll open the folder and try to select the file if possible
-            folder_path = os.path.dirname(file_path)
-            subprocess.run(['xdg-open', folder_path])
-
-
-class HistoryDelegate(QStyledItemDelegate):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.alt_color1 = QColor(53, 53, 53)  # Darker gray
-        self.alt_color2 = QColor(45, 45, 45)  # Slightly lighter gray
-        self.update_colors()
-
-    def update_colors(self):
-        palette = QApplication.palette()
-        base_color = palette.color(QPalette.ColorRole.Base)
-        if base_color.lightness() < 128:  # Dark theme
-            self.alt_color1 = base_color.darker(110)
-            self.alt_color2 = base_color.darker(120)
-        else:  # Light theme
-            self.alt_color1 = base_color.darker(105)
-            self.alt_color2 = base_color.darker(110)
-
-    def paint(self, painter, option, index):
-        if index.row() % 2 == 0:
-            painter.fillRect(option.rect, self.alt_color1)
-        else:
-            painter.fillRect(option.rect, self.alt_color2)
-
-        if not self.parent().indexWidget(index):
-            data = index.data(Qt.UserRole)
-            if data:
-                widget = HistoryItemWidget(data, self.parent())
-                self.parent().setIndexWidget(index, widget)
-
-        if option.state & QStyle.State_Selected:
-            painter.fillRect(option.rect, QColor(42, 130, 218))
-
-    def sizeHint(self, option, index):
-        return QSize(0, 50)
-
 class DeleteConfirmationDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -165,6 +67,9 @@ class DeleteConfirmationDialog(QDialog):
 #     file_downloaded = Signal(str, str, str)
 
 class MainWindow(QMainWindow):
+    DEFAULT_RESOLUTIONS = ["720", "1080", "1440", "2160", "best"]
+    DEFAULT_FPS = ["30", "60", "auto"]
+
     def __init__(self):
         super().__init__()
 
@@ -172,15 +77,17 @@ class MainWindow(QMainWindow):
         self.setFixedSize(800, 600)
         self.setWindowFlags(self.windowFlags() & ~Qt.WindowMaximizeButtonHint | Qt.WindowCloseButtonHint)
         self.setWindowIcon(QIcon(":/app.ico"))
+        self.settings = QSettings("mdu", "mdu-yt")
+        # ENGINE_INPROCESS runs yt_dlp.YoutubeDL inside the app instead of yt-dlp.exe
+        self.download_engine = self.settings.value("engine", ENGINE_SUBPROCESS)
         self.setMenuBar(MenuBar(self))
         option_layout = QHBoxLayout()
 
         self.current_version = appversion  # Replace with your actual current version
-        self.updater = GitHubUpdater(self.current_version)
-        self.updater.signals.update_available.connect(self.on_update_available)
-        self.updater.signals.update_progress.connect(self.on_update_progress)
-        self.updater.signals.update_completed.connect(self.on_update_completed)
-        self.updater.signals.update_error.connect(self.on_update_error)
+        # Created on first use, it pulls in requests and packaging
+        self.updater = None
+        # Launches within this many seconds of the last check reuse its answer
+        self.update_check_ttl = 6 * 3600
 
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -202,14 +109,14 @@ class MainWindow(QMainWindow):
         option_layout.addWidget(self.video_radio)
 
         self.resolution_combo = QComboBox()
-        self.resolution_combo.addItems(["720", "1080", "1440", "2160", "best"])
+        self.resolution_combo.addItems(self.DEFAULT_RESOLUTIONS)
         option_layout.addWidget(self.resolution_combo)
 
         self.fps_checkbox = QCheckBox("FPS:")
         option_layout.addWidget(self.fps_checkbox)
 
         self.fps_combo = QComboBox()
-        self.fps_combo.addItems(["30", "60", "auto"])
+        self.fps_combo.addItems(self.DEFAULT_FPS)
         option_layout.addWidget(self.fps_combo)
 
         # Audio options
@@ -238,10 +145,7 @@ class MainWindow(QMainWindow):
         option_layout.addStretch()
         layout.addLayout(option_layout)
 
-        # self.setup_encoding_options(option_layout)
-        # encoding_layout = QHBoxLayout()
-        # self.setup_encoding_options(encoding_layout)
-        # layout.addLayout(encoding_layout)
+        self.setup_encoding_options(layout)
        
 
         # Add stop button
@@ -271,11 +175,30 @@ class MainWindow(QMainWindow):
         self.setStatusBar(self.statusBar)
         self.statusBar.showMessage("Developed by Nawapon Boonjua")
 
-        self.history_model = QStandardItemModel()
+        self.history_store = HistoryStore()
+        # History changes are written by a background thread in batches
+        self.history_writer = HistoryWriter(self.history_store)
+        self.history_model = HistoryModel(self.history_store)
+        # Search filters through a proxy backed by the store's full-text index;
+        # the source model stays loaded
+        self.history_proxy = HistoryFilterProxy(self.history_store, self.history_writer)
+        self.history_proxy.setSourceModel(self.history_model)
+        self.history_search = QLineEdit()
+        self.history_search.setPlaceholderText("Search history")
+        self.history_search.setClearButtonEnabled(True)
+        self.history_search_timer = QTimer(self)
+        self.history_search_timer.setSingleShot(True)
+        self.history_search_timer.setInterval(150)
+        self.history_search_timer.timeout.connect(self.search_history)
+        self.history_search.textChanged.connect(self.history_search_timer.start)
+        self.history_proxy.signals.finished.connect(self.on_history_search_finished)
+        layout.addWidget(self.history_search)
         self.history_list = QListView()
-        self.history_list.setModel(self.history_model)
+        self.history_list.setModel(self.history_proxy)
         self.history_list.setItemDelegate(HistoryDelegate(self.history_list))
-        self.history_list.setUniformItemSizes(False)
+        # Every row has the same height, so the view never measures rows it does not show
+        self.history_list.setUniformItemSizes(True)
+        self.history_list.setMouseTracking(True)
         self.history_list.setSpacing(2)
         self.history_list.doubleClicked.connect(self.open_file)
         self.history_list.setContextMenuPolicy(Qt.CustomContextMenu)
@@ -300,12 +223,82 @@ class MainWindow(QMainWindow):
         self.clear_history_button.clicked.connect(self.clear_history)
         layout.addWidget(self.clear_history_button)
 
+        # Progress updates reach the GUI at most progress_rate times a second
+        self.progress_rate = 20
+        self.progress_aggregator = ProgressAggregator(self.progress_rate, self)
+        self.progress_aggregator.progress.connect(self.update_job_progress)
+
+        self.is_downloading = False
+        self.download_url = None
+        # Binary paths come from the cached manifest; versions and capabilities
+        # are only probed again, off the GUI thread, when a binary changed.
+        # The encoder benchmark follows, unless its cached results still hold.
+        self.encoder_probe = EncoderProbe()
+        self.encoder_probe.signals.finished.connect(self.on_encoders_probed)
+        get_manifest().revalidate_async(lambda changed: self.encoder_probe.start())
         self.downloader = Downloader()
+        self.downloader.engine = self.download_engine
+        self.downloader.progress_sink = self.progress_aggregator
         self.downloader.signals.progress.connect(self.update_progress)
-        self.downloader.signals.file_downloaded.connect(self.add_to_history)
+        self.downloader.signals.file_downloaded.connect(self.on_file_downloaded)
+        self.downloader.signals.postprocess.connect(self.update_postprocess)
         self.downloader.signals.finished.connect(self.download_finished)
         self.downloader.signals.error.connect(self.show_error)
 
+        # Custom encoding runs on its own bounded ffmpeg pool, so the next
+        # download starts while the previous file is still being converted
+        self.postprocessor = PostProcessor(progress_sink=self.progress_aggregator)
+        self.postprocessor.signals.task_finished.connect(self.on_postprocess_finished)
+        self.postprocessor.signals.task_failed.connect(self.on_postprocess_failed)
+        self.postprocessor.signals.stats_changed.connect(self.on_postprocess_stats)
+        self.downloader.postprocessor = self.postprocessor
+        self.download_encoding = None
+
+        # Metadata for a pasted URL is resolved in the background once typing
+        # pauses, so the combos show real formats and the download starts from
+        # the cached info
+        self.prefetcher = MetadataPrefetcher(self.downloader)
+        self.prefetcher.signals.resolved.connect(self.on_prefetch_resolved)
+        self.prefetcher.signals.failed.connect(self.on_prefetch_failed)
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(500)
+        self.prefetch_timer.timeout.connect(self.start_prefetch)
+
+        # Queue used by "Add Multiple Download"; every job runs its own yt-dlp process
+        # Compatible single videos are grouped into one yt-dlp process per batch_size URLs
+        self.max_parallel_downloads = 3
+        self.batch_size = 10
+        # Unfinished jobs in the journal are picked up again on the next start
+        self.journal = JobJournal()
+        # Queue jobs already in the archive are skipped; it is seeded from the history on first run
+        self.download_archive = DownloadArchive(history_store=self.history_store)
+        self.download_queue = DownloadQueue(self.max_parallel_downloads, DownloadQueue.FIFO,
+                                            self.progress_aggregator, self.download_engine, self.batch_size,
+                                            self.journal, self.download_archive, self.postprocessor)
+        self.download_queue.signals.file_downloaded.connect(self.on_queue_file_downloaded)
+        self.download_queue.signals.job_finished.connect(self.update_queue_status)
+        self.download_queue.signals.job_failed.connect(self.on_queue_job_failed)
+        self.download_queue.signals.job_skipped.connect(self.update_queue_status)
+        self.download_queue.signals.queue_drained.connect(self.on_queue_drained)
+        self.download_queue.signals.playlist_added.connect(self.on_playlist_added)
+        self.download_queue.signals.playlist_failed.connect(self.on_playlist_failed)
+        self.download_queue.signals.postprocess_failed.connect(self.on_queue_job_failed)
+
+        # Playlists are split into one queue job per entry, playlist_concurrency
+        # of them downloading at the same time
+        self.playlist_fanout = True
+        self.playlist_concurrency = 2
+
+        # Saved playlists/channels; a sync only queues entries added since the last one
+        self.subscriptions = SubscriptionStore(self.history_store.path)
+        self.subscription_sync = SubscriptionSync(self.subscriptions, self.download_queue, self.download_engine,
+                                                  concurrency=self.playlist_concurrency)
+        self.subscription_sync.signals.subscribed.connect(self.on_subscribed)
+        self.subscription_sync.signals.synced.connect(self.on_subscription_synced)
+        self.subscription_sync.signals.failed.connect(self.on_playlist_failed)
+        self.subscription_sync.signals.finished.connect(self.on_subscriptions_synced)
+
         # Add a label for playlist progress
         self.playlist_progress_label = QLabel()
         layout.addWidget(self.playlist_progress_label)
@@ -319,7 +312,10 @@ class MainWindow(QMainWindow):
         self.toggle_options()
         self.toggle_fps_combo()
 
-        self.load_history()
+        # History streams in once the event loop runs, after the window is shown
+        QTimer.singleShot(0, self.load_history)
+        QTimer.singleShot(5000, self.check_for_updates_in_background)
+        self.resume_journal()
 
         # Connect text change event
         self.url_input.textChanged.connect(self.check_url)
@@ -334,6 +330,40 @@ class MainWindow(QMainWindow):
             # Disable if it's not a YouTube URL
             self.resolution_combo.setEnabled(False)
             self.fps_combo.setEnabled(False)
+        self.prefetch_timer.start()
+
+    def start_prefetch(self):
+        url = self.url_input.text().strip()
+        if not url.startswith(("http://", "https://")) or self.playlist_checkbox.isChecked():
+            self.prefetcher.cancel()
+            self.set_combo_items(self.resolution_combo, self.DEFAULT_RESOLUTIONS)
+            self.set_combo_items(self.fps_combo, self.DEFAULT_FPS)
+            return
+        self.status_label.setText("Fetching video information...")
+        self.prefetcher.request(url)
+
+    @Slot(int, str, object)
+    def on_prefetch_resolved(self, generation, url, info):
+        if not self.prefetcher.is_current(generation) or url != self.url_input.text().strip():
+            return
+        heights, frame_rates = available_formats(info)
+        if heights:
+            self.set_combo_items(self.resolution_combo, [str(height) for height in heights] + ["best"])
+        if frame_rates:
+            self.set_combo_items(self.fps_combo, [str(rate) for rate in frame_rates] + ["auto"])
+        title = info.get('title')
+        self.status_label.setText(f"Ready: {title}" if title else "Ready")
+
+    @Slot(int, str)
+    def on_prefetch_failed(self, generation, url):
+        if self.prefetcher.is_current(generation):
+            self.status_label.setText("Ready")
+
+    def set_combo_items(self, combo, items):
+        current = combo.currentText()
+        combo.clear()
+        combo.addItems(items)
+        combo.setCurrentText(current if current in items else items[-1])
 
 
     def toggle_options(self):
@@ -347,15 +377,133 @@ class MainWindow(QMainWindow):
         self.fps_combo.setEnabled(self.fps_checkbox.isChecked() and self.video_radio.isChecked())
 
     def open_multiple_download_dialog(self):
+        from src.mduyt.gui.multipledownloaddialog import MultipleDownloadDialog
         dialog = MultipleDownloadDialog(self)
         dialog.start_downloads.connect(self.handle_multiple_downloads)
         dialog.exec()
 
     def handle_multiple_downloads(self, urls):
-        for url in urls:
-            # Here you would typically add each URL to your download queue
-            # For demonstration, we'll just print the URLs
-            print(f"Queued for download: {url}")
+        options = self.get_download_options()
+        if options is None:
+            return
+        self.progress_aggregator.start()
+        self.stop_button.setEnabled(True)
+        self.download_queue.enqueue_many(urls, options)
+        self.update_queue_status()
+
+    def resume_journal(self):
+        restored = self.download_queue.restore()
+        if not restored:
+            return
+        self.progress_aggregator.start()
+        self.stop_button.setEnabled(True)
+        self.status_label.setText(f"Resuming {len(restored)} unfinished download(s)")
+        self.update_queue_status()
+
+    def get_download_options(self):
+        download_dir = self.normalize_path(self.folder_path.text())
+        if not os.path.isdir(download_dir):
+            QMessageBox.warning(self, "Error", "Invalid download directory")
+            return None
+
+        is_audio = self.audio_radio.isChecked()
+        return DownloadOptions(
+            is_audio=is_audio,
+            audio_format=self.format_combo.currentText() if is_audio else None,
+            resolution=self.resolution_combo.currentText() if not is_audio else None,
+            fps=self.fps_combo.currentText() if (not is_audio and self.fps_checkbox.isChecked()) else None,
+            download_dir=download_dir,
+            is_playlist=self.playlist_checkbox.isChecked(),
+            with_thumbnail=self.thumbnail_checkbox.isChecked(),
+            encoding=self.get_encoding_command(self.preset_combo.currentText(),
+                                               self.quality_spinbox.value()) if not is_audio else None,
+        )
+
+    def update_queue_status(self, job=None):
+        summary = self.download_queue.summary()
+        total = sum(summary.values())
+        if not total:
+            return
+        done = summary['finished'] + summary['failed'] + summary['cancelled'] + summary['skipped']
+        running = [j for j in self.download_queue.jobs.values()
+                   if j.state in (DownloadJob.RUNNING, DownloadJob.PROCESSING)]
+        progress = (done * 100.0 + sum(j.progress for j in running)) / total
+        self.progress_bar.setValue(int(progress))
+        text = f"Queue: {done} of {total} done, {summary['running']} running, {summary['pending']} waiting"
+        if summary['processing']:
+            text += f", {summary['processing']} converting"
+        for group in self.download_queue.groups.values():
+            if group.completed < len(group.jobs):
+                text += f" | {group.title}: {group.completed}/{len(group.jobs)} ({group.progress:.0f}%)"
+        self.playlist_progress_label.setText(text)
+
+    @Slot(object, str, str, str)
+    def on_queue_file_downloaded(self, job, filename, file_path, file_type):
+        self.add_to_history(filename, file_path, file_type, job.url)
+
+    @Slot(object, str)
+    def on_queue_job_failed(self, job, error_message):
+        self.status_label.setText(f"Failed: {job.url} ({error_message})")
+        self.update_queue_status()
+
+    @Slot(object)
+    def on_playlist_added(self, group):
+        self.status_label.setText(f"Downloading playlist: {group.title} ({len(group.jobs)} items)")
+        self.update_queue_status()
+
+    @Slot(str, str)
+    def on_playlist_failed(self, url, error_message):
+        self.status_label.setText(f"Failed: {url} ({error_message})")
+        if not self.is_downloading and not self.download_queue.pending_count() \
+                and not self.download_queue.running_count():
+            self.stop_button.setEnabled(False)
+            self.download_button.setEnabled(True)
+
+    @Slot()
+    def subscribe_current_url(self):
+        url = self.url_input.text().strip()
+        if not url.startswith(("http://", "https://")):
+            QMessageBox.warning(self, "Error", "Enter the URL of a playlist or channel first")
+            return
+        options = self.get_download_options()
+        if options is None:
+            return
+        self.status_label.setText("Adding subscription...")
+        self.subscription_sync.subscribe(url, options)
+
+    @Slot()
+    def sync_subscriptions(self):
+        self.status_label.setText("Checking subscriptions for new videos...")
+        self.progress_aggregator.start()
+        self.stop_button.setEnabled(True)
+        self.subscription_sync.sync_all()
+
+    @Slot(str)
+    def on_subscribed(self, title):
+        self.status_label.setText(f"Subscribed to {title}, new videos are queued by Sync Subscriptions")
+
+    @Slot(str, int, float)
+    def on_subscription_synced(self, title, new_items, elapsed):
+        self.statusBar.showMessage(f"{title}: {new_items} new ({elapsed:.1f}s)")
+
+    @Slot(int)
+    def on_subscriptions_synced(self, total):
+        if total == 0:
+            self.status_label.setText("Subscriptions are up to date")
+            self.stop_progress_updates()
+            if not self.is_downloading and not self.download_queue.running_count():
+                self.stop_button.setEnabled(False)
+
+    @Slot(dict)
+    def on_queue_drained(self, summary):
+        self.stop_progress_updates()
+        if not self.is_downloading:
+            self.stop_button.setEnabled(False)
+            self.download_button.setEnabled(True)
+        self.update_queue_status()
+        self.status_label.setText(f"Queue completed: {summary['finished']} finished, "
+                                  f"{summary['skipped']} already downloaded, "
+                                  f"{summary['failed']} failed, {summary['cancelled']} cancelled")
 
     def open_downloads_folder(self):
         folder_path = self.folder_path.text()
@@ -375,8 +523,11 @@ class MainWindow(QMainWindow):
         self.encoding_checkbox = QCheckBox("Custom Encoding")
         encoding_layout.addWidget(self.encoding_checkbox)
 
+        # Only encoders that worked on this machine, fastest first; x264 until
+        # the first benchmark has finished
         self.encoding_method_combo = QComboBox()
-        self.encoding_method_combo.addItems(["x264", "qsv (h264)", "qsv (hevc)", "nvenc (h264)", "nvenc (hevc)", "amf (h264)", "amf (hevc)"])
+        results = cached_results()
+        self.populate_encoders(ranked(results or {}), results or {})
         self.encoding_method_combo.setEnabled(False)
         encoding_layout.addWidget(self.encoding_method_combo)
 
@@ -400,35 +551,52 @@ class MainWindow(QMainWindow):
         if not self.encoding_checkbox.isChecked():
             return None
         
-        encoding_method = self.encoding_method_combo.currentText()
-        
-        # Define a dictionary of encoding methods and their corresponding commands
-        encoding_commands = {
-            "x264": f"-c:v libx264 -preset {preset} -crf {quality}",
-            "qsv (h264)": f"-c:v h264_qsv -preset {preset} -global_quality {quality}",
-            "qsv (hevc)": f"-c:v hevc_qsv -preset {preset} -global_quality {quality}",
-            "nvenc (h264)": f"-c:v h264_nvenc -preset p{preset[0]} -cq {quality}",
-            "nvenc (hevc)": f"-c:v hevc_nvenc -preset p{preset[0]} -cq {quality}",
-            "amf (h264)": f"-c:v h264_amf -quality {preset} -qp_i {quality} -qp_p {quality} -qp_b {quality}",
-            "amf (hevc)": f"-c:v hevc_amf -quality {preset} -qp_i {quality} -qp_p {quality} -qp_b {quality}"
-        }
-        
-        return encoding_commands.get(encoding_method, None)
+        encoder = self.encoding_method_combo.currentData()
+        if not encoder:
+            return None
+        return ' '.join(encoder_args(encoder, preset, quality))
+
+    def populate_encoders(self, encoders, results):
+        combo = self.encoding_method_combo
+        previous = combo.currentData()
+        combo.clear()
+        for encoder in encoders:
+            combo.addItem(encoder_label(encoder), encoder)
+            fps = (results.get(encoder) or {}).get('fps')
+            if fps:
+                combo.setItemData(combo.count() - 1, f"{fps:.0f} fps in the encoder benchmark", Qt.ToolTipRole)
+        # Keep a choice the user made; otherwise the fastest encoder is preselected
+        index = combo.findData(previous) if self.encoding_checkbox.isChecked() else -1
+        combo.setCurrentIndex(index if index >= 0 else 0)
+
+    @Slot(dict)
+    def on_encoders_probed(self, results):
+        self.populate_encoders(ranked(results), results)
+        failed = [encoder_label(encoder) for encoder, result in results.items() if not result.get('ok')]
+        self.encoding_method_combo.setToolTip(
+            f"Not available on this machine: {', '.join(failed)}" if failed else "")
 
     def toggle_encoding_method(self, state):
-        print(f"Toggle encoding method called. State: {state}")
         is_checked = state == 2  # Qt.Checked is equal to 2
-        print(f"Is checked: {is_checked}")
         self.encoding_method_combo.setEnabled(is_checked)
         self.preset_combo.setEnabled(is_checked)
         self.quality_spinbox.setEnabled(is_checked)
-        print(f"Combo box enabled: {self.encoding_method_combo.isEnabled()}")
+
+    @Slot(bool)
+    def set_inprocess_engine(self, enabled):
+        # Jobs that already started keep the engine they started with
+        self.download_engine = ENGINE_INPROCESS if enabled else ENGINE_SUBPROCESS
+        self.downloader.engine = self.download_engine
+        self.download_queue.engine = self.download_engine
+        self.subscription_sync.engine = self.download_engine
+        self.settings.setValue("engine", self.download_engine)
 
     def show_preferences(self):
         # Implement preferences dialog
         QMessageBox.information(self, "Preferences", "Preferences dialog not implemented yet.")
 
     def show_about_dialog(self):
+        from src.mduyt.data.donator import donators
 
         # Create the donator text with each name on a new line, wrapped in <b> tags for bold
         donator_text = "<br>".join([f"{donator}" for donator in donators])
@@ -440,7 +608,7 @@ class MainWindow(QMainWindow):
             f"<b>Developed by</b> Nawapon Boonjua<br><br>"
             f"<b>Qt Version:</b> {__version__}<br>"
             f"<b>Python Version:</b> {sys.version}<br>"
-            f"<b>yt-dlp version:</b> {ytdlp_version}<br><br>"
+            f"<b>yt-dlp version:</b> {get_manifest().version('yt-dlp') or ytdlp_version}<br><br>"
             f"<b>OS:</b> {platform.platform()}<br><br>"
             f"<b>Donators:</b><br>"  # Bold Donators title and list
             f"{donator_text}"
@@ -449,12 +617,35 @@ class MainWindow(QMainWindow):
         # Show the message box
         QMessageBox.about(self, f"About {appname}", about_message)
 
+    def get_updater(self):
+        if self.updater is None:
+            from src.mduyt.core.updater import GitHubUpdater
+            self.updater = GitHubUpdater(self.current_version, ttl=self.update_check_ttl)
+            self.updater.signals.update_available.connect(self.on_update_available)
+            self.updater.signals.update_progress.connect(self.on_update_progress)
+            self.updater.signals.update_completed.connect(self.on_update_completed)
+            self.updater.signals.update_error.connect(self.on_update_error)
+        return self.updater
+
     def check_for_updates(self):
+        self.get_updater()
         self.statusBar.showMessage("Checking for updates...")
         threading.Thread(target=self._check_for_updates_thread, daemon=True).start()
 
+    def check_for_updates_in_background(self):
+        # Silent on errors; only a newer release is worth interrupting the user for
+        updater = self.get_updater()
+
+        def run():
+            release = updater.check_for_updates(notify=False)
+            if release:
+                updater.signals.update_available.emit(release['tag_name'].lstrip('v'))
+
+        threading.Thread(target=run, daemon=True).start()
+
     def _check_for_updates_thread(self):
-        release = self.updater.check_for_updates()
+        # Asked for explicitly, so revalidate even inside the TTL
+        release = self.updater.check_for_updates(force=True)
         if release:
             self.statusBar.showMessage(f"Update available: {release['tag_name']}")
         else:
@@ -472,7 +663,7 @@ class MainWindow(QMainWindow):
         threading.Thread(target=self._update_thread, daemon=True).start()
 
     def _update_thread(self):
-        release = self.updater.check_for_updates()
+        release = self.updater.check_for_updates(notify=False)
         if release:
             self.updater.download_and_install_update(release)
 
@@ -490,6 +681,12 @@ class MainWindow(QMainWindow):
 
 
 
+    def closeEvent(self, event):
+        # Pending history changes are committed before the app exits
+        self.history_writer.close()
+        self.journal.close()
+        super().closeEvent(event)
+
     @Slot()
     def select_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Download Folder")
@@ -500,6 +697,8 @@ class MainWindow(QMainWindow):
     @Slot()
     def stop_download(self):
         self.downloader.stop()
+        self.download_queue.cancel_all()
+        self.postprocessor.cancel_all()
         self.status_label.setText("Stopping download...")
         self.stop_button.setEnabled(False)
 
@@ -510,9 +709,21 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Error", "Please enter a valid URL")
             return
 
-        download_dir = self.normalize_path(self.folder_path.text())
-        if not os.path.isdir(download_dir):
-            QMessageBox.warning(self, "Error", "Invalid download directory")
+        options = self.get_download_options()
+        if options is None:
+            return
+
+        # A finished prefetch is already in the metadata cache; one still in
+        # flight would only duplicate the extraction the download is about to do
+        self.prefetch_timer.stop()
+        self.prefetcher.cancel()
+
+        if options.is_playlist and self.playlist_fanout:
+            self.stop_button.setEnabled(True)
+            self.status_label.setText("Listing playlist entries...")
+            self.progress_bar.setValue(0)
+            self.progress_aggregator.start()
+            self.download_queue.enqueue_playlist(url, options, self.playlist_concurrency)
             return
 
         self.download_button.setEnabled(False)
@@ -520,13 +731,8 @@ class MainWindow(QMainWindow):
         self.status_label.setText("Starting download...")
         self.progress_bar.setValue(0)
         self.playlist_progress_label.setText("")
-
-        is_audio = self.audio_radio.isChecked()
-        audio_format = self.format_combo.currentText() if is_audio else None
-        resolution = self.resolution_combo.currentText() if not is_audio else None
-        fps = self.fps_combo.currentText() if (not is_audio and self.fps_checkbox.isChecked()) else None
-        is_playlist = self.playlist_checkbox.isChecked()
-        with_thumbnail = self.thumbnail_checkbox.isChecked()
+        self.progress_aggregator.start()
+        self.is_downloading = True
 
         # if title is None:
         #     QMessageBox.warning(self, "Error", "Failed to fetch title. Download will not start.")
@@ -534,10 +740,20 @@ class MainWindow(QMainWindow):
         #     self.stop_button.setEnabled(False)
         #     return
 
+        # The single download is journaled too, so a crash leaves it to be
+        # resumed through the queue on the next start
+        self.download_url = url
+        self.download_encoding = options.encoding
+        self.journal.enqueue('single', url, options)
+        self.journal.start('single')
+
+        # Re-armed here, on the GUI thread, so a Stop pressed from now on is
+        # seen even before yt-dlp has started
+        self.downloader.stop_flag = False
+
         # Start the download thread
         self.download_thread = threading.Thread(target=self.download_thread_function,
-                                                args=(url, is_audio, audio_format, resolution, fps, download_dir,
-                                                      is_playlist, with_thumbnail),
+                                                args=(url, *options.as_args()),
                                                 daemon=True)
         self.download_thread.start()
 
@@ -545,6 +761,32 @@ class MainWindow(QMainWindow):
                                  is_playlist, with_thumbnail):
         self.downloader.download(url, is_audio, audio_format, resolution, fps, download_dir, 
                                  is_playlist, with_thumbnail)
+    @Slot(str, float, str, str, str, int, int)
+    def update_job_progress(self, key, progress, file_size, download_speed, eta, current_item, total_items):
+        if key.startswith('encode:'):
+            self.update_encode_progress(key, progress, download_speed, eta)
+            return
+        job = self.download_queue.jobs.get(key)
+        if job is None:
+            self.update_progress(progress, file_size, download_speed, eta, current_item, total_items)
+            return
+        job.progress = progress
+        self.update_queue_status()
+
+    def update_encode_progress(self, key, progress, rate, eta):
+        task = self.postprocessor.tasks.get(key.split(':', 1)[1])
+        if task is None or task.done:
+            return
+        # Downloads own the progress bar while they run
+        if not self.is_downloading and not self.download_queue.running_count():
+            self.progress_bar.setValue(int(progress))
+        status = f"Encoding {os.path.basename(task.output)}: {progress:.1f}%"
+        if rate:
+            status += f" | {rate}"
+        if eta:
+            status += f" | ETA: {eta}"
+        self.status_label.setText(status)
+
     @Slot(float, str, str, str, int, int)
     def update_progress(self, progress, file_size, download_speed, eta, current_item, total_items):
         self.progress_bar.setValue(int(progress))
@@ -562,9 +804,26 @@ class MainWindow(QMainWindow):
         else:
             self.playlist_progress_label.setText("")
 
+    @Slot(str, str)
+    def update_postprocess(self, postprocessor, status):
+        if status == 'started':
+            self.status_label.setText(f"Post-processing: {postprocessor}")
+
+    def stop_progress_updates(self):
+        # Deliver the last coalesced snapshot before the final status is shown,
+        # but keep the timer running while other downloads are still active
+        if self.is_downloading or self.download_queue.pending_count() or self.download_queue.running_count() \
+                or self.postprocessor.active_count():
+            self.progress_aggregator.flush()
+            return
+        self.progress_aggregator.stop()
 
     @Slot(str)
     def show_error(self, error_message):
+        if self.is_downloading:
+            self.journal.fail('single', error_message)
+        self.is_downloading = False
+        self.stop_progress_updates()
         self.status_label.setText(f"Error: {error_message}")
         self.download_button.setEnabled(True)
         self.stop_button.setEnabled(False)
@@ -573,6 +832,10 @@ class MainWindow(QMainWindow):
 
     @Slot()
     def download_finished(self):
+        if self.is_downloading:
+            self.journal.complete('single')
+        self.is_downloading = False
+        self.stop_progress_updates()
         self.status_label.setText("Download completed!")
         self.download_button.setEnabled(True)
         self.stop_button.setEnabled(False)
@@ -587,9 +850,42 @@ class MainWindow(QMainWindow):
         self.format_combo.setEnabled(not is_video)
 
     @Slot(str, str, str)
-    def add_to_history(self, filename, file_path, file_type):
-        item = QStandardItem()
+    def on_file_downloaded(self, filename, file_path, file_type):
+        if self.download_encoding and file_type == "Video":
+            # Added to the history once converted
+            task = encode_task(os.path.join(file_path, filename), self.download_encoding)
+            task.options['url'] = self.download_url
+            self.postprocessor.submit(task)
+            return
+        self.add_to_history(filename, file_path, file_type, self.download_url)
+
+    @Slot(object)
+    def on_postprocess_finished(self, task):
+        # Queue jobs are reported by the queue itself
+        path, filename = os.path.split(task.output)
+        self.status_label.setText(f"Converted {filename} ({describe_path(task)})")
+        if task.job is None and task.kind == ENCODE:
+            self.add_to_history(filename, path, "Video", task.options.get('url'))
+
+    @Slot(object, str)
+    def on_postprocess_failed(self, task, error_message):
+        if task.job is None:
+            path, filename = os.path.split(task.inputs[0])
+            self.add_to_history(filename, path, "Video", task.options.get('url'))
+            self.status_label.setText(f"Encoding failed: {filename} ({error_message})")
+
+    @Slot(dict)
+    def on_postprocess_stats(self, stats):
+        if stats['running'] or stats['queued']:
+            self.progress_aggregator.start()
+            self.statusBar.showMessage(f"Encoding: {stats['running']} running, {stats['queued']} waiting, "
+                                       f"{stats['completed']} done ({stats['tasks_per_minute']:.1f}/min)")
+        else:
+            saved = f", {format_eta(stats['saved_seconds'])} saved by stream copy" if stats['saved_seconds'] >= 1 else ""
+            self.statusBar.showMessage(f"Encoding done: {stats['completed']} converted, {stats['failed']} failed{saved}")
+            self.stop_progress_updates()
 
+    def add_to_history(self, filename, file_path, file_type, url=None):
         # Normalize the filename and path
         normalized_filename = self.normalize_unicode(filename)
         normalized_path = self.normalize_unicode(file_path)
@@ -598,15 +894,10 @@ class MainWindow(QMainWindow):
         if file_type == "Unknown":
             file_type = self.determine_file_type(normalized_filename)
 
-        item_data = {
-            'filename': normalized_filename,
-            'path': normalized_path,
-            'file_type': file_type
-        }
-
-        item.setData(item_data, Qt.UserRole)
-        self.history_model.insertRow(0, item)
-        self.save_history()
+        item_data = self.history_writer.add(normalized_filename, normalized_path, file_type, url)
+        # Not in the index yet, so an active search is told about it first
+        self.history_proxy.include(item_data)
+        self.history_model.prepend(item_data)
 
     def determine_file_type(self, filename):
         if any(filename.lower().endswith(ext) for ext in ['.mp4', '.webm', '.mkv', '.avi', '.mov']):
@@ -625,27 +916,11 @@ class MainWindow(QMainWindow):
             return path.replace('\\', '/')
         return path
 
-    def save_history(self):
-            history_data = []
-            for row in range(self.history_model.rowCount()):
-                item = self.history_model.item(row)
-                item_data = item.data(Qt.UserRole)
-                history_data.append(item_data)
-
-            with open('history.json', 'w', encoding='utf-8') as f:
-                json.dump(history_data, f, ensure_ascii=False, indent=2)
-
     def load_history(self):
-        try:
-            with open('history.json', 'r', encoding='utf-8') as f:
-                history_data = json.load(f)
+        # history.json from older versions is imported by HistoryStore on first use;
+        # HistoryModel reads the rows in chunks on a background thread
+        self.history_model.reload()
 
-            for item_data in history_data:
-                item = QStandardItem()
-                item.setData(item_data, Qt.UserRole)
-                self.history_model.appendRow(item)
-        except FileNotFoundError:
-            pass  # No history file exists yet
     @Slot()
     def clear_history(self):
         reply = QMessageBox.question(self, 'Clear History',
@@ -654,11 +929,19 @@ class MainWindow(QMainWindow):
 
         if reply == QMessageBox.Yes:
             self.history_model.clear()
-            if os.path.exists("download_history.json"):
-                os.remove("download_history.json")
+            self.history_writer.clear()
             self.status_label.setText("History cleared")
 
 
+    @Slot()
+    def search_history(self):
+        self.history_proxy.search(self.history_search.text())
+
+    @Slot(int, str, object, float)
+    def on_history_search_finished(self, generation, text, ids, elapsed):
+        self.statusBar.showMessage(f"{len(ids)} matches for \"{text}\" "
+                                   f"({elapsed * 1000:.0f} ms)")
+
     @Slot(QPoint)
     def show_context_menu(self, position):
         index = self.history_list.indexAt(position)
@@ -691,8 +974,8 @@ class MainWindow(QMainWindow):
         dialog = DeleteConfirmationDialog(self)
         if dialog.exec() == QDialog.Accepted:
             data = index.data(Qt.UserRole)
-            self.history_model.removeRow(index.row())
-            self.save_history()
+            self.history_model.remove_row(self.history_proxy.mapToSource(index).row())
+            self.history_writer.delete(data['id'])
             self.status_label.setText("Item deleted from history")
 
             if dialog.permanent_delete_checkbox.isChecked():
@@ -1,6 +1,7 @@
 from PySide6.QtWidgets import QMenuBar, QMenu
 from PySide6.QtGui import QIcon, QAction
 from PySide6.QtCore import Qt
+from src.mduyt.core.inprocess import ENGINE_INPROCESS
 
 class MenuBar(QMenuBar):
     def __init__(self, parent=None):
@@ -8,6 +9,7 @@ class MenuBar(QMenuBar):
         self.parent = parent
         self.create_file_menu()
         self.create_edit_menu()
+        self.create_subscriptions_menu()
         self.create_help_menu()
 
     def create_file_menu(self):
@@ -38,6 +40,24 @@ class MenuBar(QMenuBar):
         preferences.triggered.connect(self.parent.show_preferences)
         edit_menu.addAction(preferences)
 
+        inprocess = QAction("Run yt-dlp &In-Process", self)
+        inprocess.setCheckable(True)
+        inprocess.setChecked(self.parent.download_engine == ENGINE_INPROCESS)
+        inprocess.toggled.connect(self.parent.set_inprocess_engine)
+        edit_menu.addAction(inprocess)
+
+    def create_subscriptions_menu(self):
+        subscriptions_menu = self.addMenu("&Subscriptions")
+
+        subscribe = QAction("&Subscribe to Playlist/Channel", self)
+        subscribe.triggered.connect(self.parent.subscribe_current_url)
+        subscriptions_menu.addAction(subscribe)
+
+        sync = QAction("S&ync Subscriptions", self)
+        sync.setShortcut("Ctrl+R")
+        sync.triggered.connect(self.parent.sync_subscriptions)
+        subscriptions_menu.addAction(sync)
+
     def create_help_menu(self):
         help_menu = self.addMenu("&Help")
 
@@ -0,0 +1,20 @@
+import os
+from PySide6.QtCore import QResource
+from env import root
+
+RESOURCE_DIR = os.path.join(root, 'src', 'resources')
+
+_registered = set()
+
+
+def register_resources(name):
+    # Qt memory-maps the .rcc and only reads an entry when it is used, instead
+    # of every byte of a generated resources_rc.py module living in the heap
+    if name in _registered:
+        return True
+    path = os.path.join(RESOURCE_DIR, name)
+    if not QResource.registerResource(path):
+        print(f"Could not register resources: {path}")
+        return False
+    _registered.add(name)
+    return True
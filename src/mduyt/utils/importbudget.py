@@ -0,0 +1,81 @@
+import os
+import re
+import sys
+import argparse
+import subprocess
+from env import root
+
+# Everything imported before the splash and the main window shell are painted
+STARTUP_IMPORTS = ('main', 'src.mduyt.gui.mainwindow')
+
+# Only needed after a user action; importing any of them at startup is a regression
+DEFERRED_MODULES = (
+    'requests',
+    'urllib3',
+    'packaging',
+    'yt_dlp',
+    'src.mduyt.core.updater',
+    'src.mduyt.gui.multipledownloaddialog',
+    'src.mduyt.data.donator',
+)
+
+DEFAULT_BUDGET_MS = 500
+
+IMPORT_LINE_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+
+def parse_importtime(output):
+    # Returns (module, self_us, cumulative_us, depth) in the order Python printed them
+    entries = []
+    for line in output.splitlines():
+        match = IMPORT_LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def measure(imports=STARTUP_IMPORTS):
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+    code = '; '.join(f'import {module}' for module in imports)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=root, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+    return parse_importtime(result.stderr)
+
+
+def summarize(entries):
+    total_us = sum(cumulative for _, _, cumulative, depth in entries if depth == 0)
+    packages = {}
+    for module, self_us, _, _ in entries:
+        package = module.split('.')[0] if not module.startswith('src.') else '.'.join(module.split('.')[:4])
+        packages[package] = packages.get(package, 0) + self_us
+    loaded = set(module for module, _, _, _ in entries)
+    violations = sorted(module for module in loaded
+                        if any(module == name or module.startswith(name + '.') for name in DEFERRED_MODULES))
+    return total_us, packages, violations
+
+
+def report(budget_ms=DEFAULT_BUDGET_MS, runs=3, top=15, out=sys.stdout):
+    # The fastest of a few runs, the slower ones are mostly disk cache noise
+    results = [summarize(measure()) for _ in range(max(1, runs))]
+    total_us, packages, violations = min(results, key=lambda result: result[0])
+    out.write(f"Startup imports: {total_us / 1000:.1f} ms (budget {budget_ms} ms)\n")
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        out.write(f"  {package:40} {self_us / 1000:8.1f} ms\n")
+    for module in violations:
+        out.write(f"  deferred module imported at startup: {module}\n")
+    over = total_us / 1000 > budget_ms
+    if over:
+        out.write(f"Over budget by {total_us / 1000 - budget_ms:.1f} ms\n")
+    return 1 if over or violations else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the import time of the GUI startup path")
+    parser.add_argument("--budget", type=int, default=DEFAULT_BUDGET_MS, help="Allowed startup import time in ms")
+    parser.add_argument("--runs", type=int, default=3, help="Measurements to take, the fastest is reported")
+    parser.add_argument("--top", type=int, default=15, help="Packages to list")
+    args = parser.parse_args()
+    sys.exit(report(args.budget, args.runs, args.top))
@@ -1 +1,3 @@
-pyside6-rcc -o ../../src/gui/resources_rc.py ../../src/resources/shared.qrc
\ No newline at end of file
+cd "$(dirname "$0")/../../.."
+pyside6-rcc --binary -o src/resources/splash.rcc src/resources/splash.qrc
+pyside6-rcc --binary -o src/resources/shared.rcc src/resources/shared.qrc
@@ -0,0 +1,37 @@
+import argparse
+from src.mduyt.core.binaries import get_manifest
+from src.mduyt.core.encoders import (ENCODER_CHOICES, BENCH_SECONDS, bench_encoders, cached_results,
+                                     encoder_label, probe_and_cache, ranked)
+
+# Run from the repository root: python -m src.test.cli.benchencoders
+# Runs the encoder probe MainWindow starts in the background and prints what
+# the encoding combo would offer. Without --force the cached results from
+# cache/binaries.json are shown if they are still valid.
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Probe and benchmark the custom encoding encoders")
+    parser.add_argument("--force", action="store_true", help="Benchmark again and update the cache")
+    parser.add_argument("--seconds", type=int, default=BENCH_SECONDS, help="Length of the test clip")
+    parser.add_argument("--no-cache", action="store_true", help="Benchmark without reading or writing the cache")
+    parser.add_argument("--encoders", nargs='+', choices=[name for _, name in ENCODER_CHOICES],
+                        help="Encoders to try (default: all offered ones)")
+    args = parser.parse_args()
+
+    manifest = get_manifest()
+    manifest.revalidate()
+    print(f"ffmpeg: {manifest.path_of('ffmpeg')} ({manifest.version('ffmpeg') or 'not found'})")
+
+    if args.no_cache or args.encoders or args.seconds != BENCH_SECONDS:
+        results = bench_encoders(candidates=args.encoders, seconds=args.seconds)
+    else:
+        cached = not args.force and cached_results() is not None
+        results = probe_and_cache(args.force)
+        print("Cached results" if cached else "Benchmarked and cached")
+
+    for encoder, result in results.items():
+        if result['ok']:
+            fps = f"{result['fps']:8.1f} fps" if result['fps'] else "       ? fps"
+            print(f"  {encoder_label(encoder):14} {encoder:12} {fps}")
+        else:
+            print(f"  {encoder_label(encoder):14} {encoder:12}   failed: {result['error']}")
+    print("Offered: " + ", ".join(encoder_label(encoder) for encoder in ranked(results)))
@@ -0,0 +1,51 @@
+import argparse
+import subprocess
+import time
+import yt_dlp
+from src.mduyt.core.downloader import Downloader
+
+# Run from the repository root: python -m src.test.cli.benchengine --urls urls.txt
+# Both engines only extract (no media is downloaded), so the numbers show the
+# fixed per-URL cost of each engine.
+
+def load_urls(args):
+    if args.urls:
+        with open(args.urls, 'r', encoding='utf-8') as f:
+            urls = [line.strip() for line in f if line.strip()]
+    else:
+        with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': True}) as ydl:
+            info = ydl.extract_info(args.playlist, download=False)
+        urls = [entry['url'] for entry in info.get('entries', []) if entry.get('url')]
+    return urls[:args.count]
+
+def bench_subprocess(downloader, urls):
+    start = time.perf_counter()
+    for url in urls:
+        subprocess.run([downloader.yt_dlp_binary, '--simulate', '--quiet', '--no-warnings', '--no-playlist', url],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def bench_inprocess(urls):
+    start = time.perf_counter()
+    with yt_dlp.YoutubeDL({'simulate': True, 'quiet': True, 'no_warnings': True, 'noplaylist': True,
+                           'ignoreerrors': True}) as ydl:
+        for url in urls:
+            ydl.extract_info(url, download=False)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-URL overhead of the subprocess and in-process engines")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--urls", help="Text file with one URL per line")
+    source.add_argument("--playlist", help="Playlist to take the URLs from")
+    parser.add_argument("--count", type=int, default=100, help="Number of URLs in the batch")
+    args = parser.parse_args()
+
+    urls = load_urls(args)
+    downloader = Downloader()
+    subprocess_time = bench_subprocess(downloader, urls)
+    inprocess_time = bench_inprocess(urls)
+
+    print(f"URLs:       {len(urls)}")
+    print(f"subprocess: {subprocess_time:.1f}s total, {subprocess_time / len(urls) * 1000:.0f} ms/URL")
+    print(f"in-process: {inprocess_time:.1f}s total, {inprocess_time / len(urls) * 1000:.0f} ms/URL")
@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from src.mduyt.core.history import HistoryStore
+
+# Run from the repository root: python -m src.test.cli.benchhistory
+# Compares the old "rewrite history.json on every change" scheme with the
+# SQLite store for load, single inserts and single deletes.
+
+def make_entries(count):
+    return [{'filename': f"Video number {i}.mp4", 'path': f"/home/user/Downloads/Playlist {i // 100}",
+             'file_type': 'Video'} for i in range(count)]
+
+def bench_json(workdir, entries, operations):
+    path = os.path.join(workdir, 'history.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, ensure_ascii=False, indent=2)
+
+    start = time.perf_counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        history = json.load(f)
+    load_time = time.perf_counter() - start
+
+    # What MainWindow.save_history did for every finished file or deletion
+    start = time.perf_counter()
+    for i in range(operations):
+        history.insert(0, {'filename': f"new {i}.mp4", 'path': '/tmp', 'file_type': 'Video'})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(history, f, ensure_ascii=False, indent=2)
+    insert_time = (time.perf_counter() - start) / operations
+
+    start = time.perf_counter()
+    for i in range(operations):
+        del history[0]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(history, f, ensure_ascii=False, indent=2)
+    delete_time = (time.perf_counter() - start) / operations
+    return load_time, insert_time, delete_time
+
+def bench_sqlite(workdir, entries, operations):
+    json_path = os.path.join(workdir, 'history.json')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, ensure_ascii=False)
+    db_path = os.path.join(workdir, 'history.db')
+
+    start = time.perf_counter()
+    store = HistoryStore(db_path, json_path)
+    migrate_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store.load()
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ids = [store.add(f"new {i}.mp4", '/tmp', 'Video') for i in range(operations)]
+    insert_time = (time.perf_counter() - start) / operations
+
+    start = time.perf_counter()
+    for entry_id in ids:
+        store.delete(entry_id)
+    delete_time = (time.perf_counter() - start) / operations
+    store.close()
+    return migrate_time, load_time, insert_time, delete_time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the download history store")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[10000, 100000], help="History sizes to test")
+    parser.add_argument("--operations", type=int, default=200, help="Inserts and deletes per size")
+    parser.add_argument("--json-operations", type=int, default=20,
+                        help="Inserts and deletes for history.json (each one rewrites the file)")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        entries = make_entries(size)
+        with tempfile.TemporaryDirectory() as workdir:
+            json_load, json_insert, json_delete = bench_json(workdir, entries, args.json_operations)
+        with tempfile.TemporaryDirectory() as workdir:
+            migrate, db_load, db_insert, db_delete = bench_sqlite(workdir, entries, args.operations)
+
+        print(f"{size} entries")
+        print(f"  history.json  load {json_load * 1000:8.1f} ms  insert {json_insert * 1000:8.2f} ms  "
+              f"delete {json_delete * 1000:8.2f} ms")
+        print(f"  sqlite        load {db_load * 1000:8.1f} ms  insert {db_insert * 1000:8.2f} ms  "
+              f"delete {db_delete * 1000:8.2f} ms  (migration {migrate * 1000:.0f} ms)")
@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QStandardItemModel, QStandardItem
+from PySide6.QtWidgets import QApplication, QListView, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QPushButton
+from src.mduyt.core.history import HistoryStore
+from src.mduyt.gui.historymodel import HistoryModel, HistoryDelegate
+from src.test.cli.benchhistory import make_entries
+
+# Run from the repository root: python -m src.test.cli.benchhistoryview
+# Memory per row and scroll repaint time of the history list, against the old
+# approach of one QWidget (layout, two labels, button) per painted row.
+
+def rss_bytes():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+def make_row_widget(data, parent):
+    # Same widget tree the old HistoryItemWidget built for every row
+    widget = QWidget(parent)
+    layout = QHBoxLayout(widget)
+    layout.setContentsMargins(5, 5, 5, 5)
+    layout.addWidget(QLabel())
+    info_layout = QVBoxLayout()
+    filename_label = QLabel(data['filename'])
+    filename_label.setStyleSheet("font-weight: bold;")
+    info_layout.addWidget(filename_label)
+    path_label = QLabel(data['path'])
+    path_label.setStyleSheet("color: gray;")
+    info_layout.addWidget(path_label)
+    layout.addLayout(info_layout)
+    layout.addStretch()
+    button = QPushButton(widget)
+    button.setStyleSheet("QPushButton { background-color: transparent; border: none; }")
+    button.setFixedSize(32, 32)
+    layout.addWidget(button)
+    return widget
+
+def scroll_time(view, steps):
+    bar = view.verticalScrollBar()
+    start = time.perf_counter()
+    for step in range(steps):
+        bar.setValue(bar.maximum() * step // max(1, steps - 1))
+        view.viewport().repaint()
+    return (time.perf_counter() - start) / steps
+
+def bench_widgets(entries, steps):
+    before = rss_bytes()
+    model = QStandardItemModel()
+    view = QListView()
+    view.setModel(model)
+    for data in entries:
+        item = QStandardItem()
+        item.setData(data, Qt.UserRole)
+        model.appendRow(item)
+    for row, data in enumerate(entries):
+        view.setIndexWidget(model.index(row, 0), make_row_widget(data, view))
+    after = rss_bytes()
+    view.resize(600, 800)
+    view.show()
+    frame = scroll_time(view, steps)
+    view.deleteLater()
+    return after, before, frame
+
+def bench_delegate(entries, steps):
+    with tempfile.TemporaryDirectory() as workdir:
+        json_path = os.path.join(workdir, 'history.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        store = HistoryStore(os.path.join(workdir, 'history.db'), json_path)
+
+        before = rss_bytes()
+        model = HistoryModel(store)
+        view = QListView()
+        view.setUniformItemSizes(True)
+        view.setItemDelegate(HistoryDelegate(view))
+        view.setModel(model)
+        model.reload()
+        while model.loading:
+            QApplication.processEvents()
+        after = rss_bytes()
+        view.resize(600, 800)
+        view.show()
+        frame = scroll_time(view, steps)
+        view.deleteLater()
+        store.close()
+    return after, before, frame
+
+def report(name, rows, after, before, frame):
+    if after is None or before is None:
+        memory = "n/a"
+    else:
+        memory = f"{(after - before) / rows:8.0f} bytes/row"
+    print(f"  {name:10} {rows:7d} rows  {memory}  scroll {frame * 1000:6.2f} ms/frame")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark memory and scrolling of the history list")
+    parser.add_argument("--rows", type=int, default=100000, help="History entries for the delegate model")
+    parser.add_argument("--widget-rows", type=int, default=5000,
+                        help="Entries for the widget-per-row comparison (it does not scale to --rows)")
+    parser.add_argument("--steps", type=int, default=200, help="Scroll positions to repaint")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    print("History list")
+    report("delegate", args.rows, *bench_delegate(make_entries(args.rows), args.steps))
+    report("widgets", args.widget_rows, *bench_widgets(make_entries(args.widget_rows), args.steps))
@@ -0,0 +1,55 @@
+import argparse
+import time
+from src.mduyt.core.downloader import Downloader
+from src.mduyt.core.progress import decode_line, MARKER
+
+# Run from the repository root: python -m src.test.cli.benchprogress
+
+def make_text_lines(count):
+    lines = []
+    for i in range(count):
+        percent = i * 100.0 / count
+        lines.append(f"[download]  {percent:5.1f}% of  512.34MiB at    8.21MiB/s ETA 01:02 (frag {i}/{count})\n")
+    return lines
+
+def make_structured_lines(count):
+    lines = []
+    total = 512 * 1024 * 1024
+    for i in range(count):
+        fields = [MARKER, 'download', 'downloading', str(total * i // count), str(total), 'NA',
+                  '8608808.2', '62', str(i), str(count), '3', '200', '/tmp/video.f137.mp4.part']
+        lines.append('\t'.join(fields) + '\n')
+    return lines
+
+def bench_text(lines):
+    start = time.perf_counter()
+    for line in lines:
+        if '[download] Downloading item' in line:
+            pass
+        elif '[download] Destination:' in line:
+            pass
+        elif '[download]' in line:
+            Downloader.parse_progress(None, line)
+    return time.perf_counter() - start
+
+def bench_structured(lines, read_fields):
+    start = time.perf_counter()
+    for line in lines:
+        event = decode_line(line)
+        if read_fields and event is not None and event.kind == 'download':
+            event.percent, event.total_bytes, event.speed, event.eta, event.item_index, event.item_count
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare yt-dlp progress line decoding throughput")
+    parser.add_argument("--lines", type=int, default=200000, help="Number of progress lines to decode")
+    args = parser.parse_args()
+
+    text_time = bench_text(make_text_lines(args.lines))
+    structured_lines = make_structured_lines(args.lines)
+    decode_time = bench_structured(structured_lines, read_fields=False)
+    read_time = bench_structured(structured_lines, read_fields=True)
+
+    print(f"regex scraping:                {args.lines / text_time:,.0f} lines/sec")
+    print(f"structured decode:             {args.lines / decode_time:,.0f} lines/sec ({text_time / decode_time:.2f}x)")
+    print(f"structured decode + all reads: {args.lines / read_time:,.0f} lines/sec ({text_time / read_time:.2f}x)")
@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from src.mduyt.gui.resources import RESOURCE_DIR
+
+# Run from the repository root: python -m src.test.cli.benchresources
+# Cold start of a fresh interpreter up to the splash pixmap, and resident
+# memory after the resources are available, for the old generated
+# resources_rc.py module and for the memory-mapped .rcc bundles. The module is
+# rebuilt from the .rcc files so both variants carry the same bytes.
+
+BUNDLES = ('splash.rcc', 'shared.rcc')
+
+CHILD = r"""
+import os, sys, time, json
+start = time.perf_counter()
+from PySide6.QtCore import QResource
+from PySide6.QtGui import QPixmap
+from PySide6.QtWidgets import QApplication
+app = QApplication([])
+qt_ready = time.perf_counter()
+mode, target = sys.argv[1], sys.argv[2]
+if mode == 'rcc':
+    for name in ('splash.rcc', 'shared.rcc'):
+        QResource.registerResource(os.path.join(target, name))
+else:
+    sys.path.insert(0, target)
+    import resources_rc
+loaded = time.perf_counter()
+splash = QPixmap(':/splash.png')
+shown = time.perf_counter()
+try:
+    import psutil
+    rss = psutil.Process().memory_info().rss
+except ImportError:
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        rss = None
+print(json.dumps({'resources': loaded - qt_ready, 'splash': shown - start, 'rss': rss,
+                  'ok': not splash.isNull()}))
+"""
+
+def read_rcc(path):
+    with open(path, 'rb') as f:
+        blob = f.read()
+    magic, version, tree_offset, data_offset, names_offset = struct.unpack('>4sIIII', blob[:20])
+    if magic != b'qres':
+        raise ValueError(f"{path} is not a binary resource bundle")
+    # Sections are written data, names, tree
+    return version, blob[data_offset:names_offset], blob[names_offset:tree_offset], blob[tree_offset:]
+
+def escape(data):
+    out = []
+    for byte in data:
+        if 32 <= byte < 127 and byte not in (0x22, 0x5c):
+            out.append(chr(byte))
+        else:
+            out.append(f"\\x{byte:02x}")
+    return ''.join(out)
+
+def literal(name, data):
+    # Same layout pyside6-rcc uses: one long escaped literal, 16 bytes a line
+    lines = [f'{name} = b"\\']
+    for i in range(0, len(data), 16):
+        lines.append(escape(data[i:i + 16]) + '\\')
+    lines.append('"')
+    return '\n'.join(lines) + '\n\n'
+
+def write_module(directory):
+    parts = ['from PySide6 import QtCore\n\n']
+    for index, name in enumerate(BUNDLES):
+        version, data, names, tree = read_rcc(os.path.join(RESOURCE_DIR, name))
+        parts.append(literal(f'qt_resource_data_{index}', data))
+        parts.append(literal(f'qt_resource_name_{index}', names))
+        parts.append(literal(f'qt_resource_struct_{index}', tree))
+        parts.append(f'QtCore.qRegisterResourceData({version:#04x}, qt_resource_struct_{index}, '
+                     f'qt_resource_name_{index}, qt_resource_data_{index})\n\n')
+    path = os.path.join(directory, 'resources_rc.py')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(''.join(parts))
+    return path
+
+def run_child(mode, target, bytecode):
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    if not bytecode:
+        env['PYTHONDONTWRITEBYTECODE'] = '1'
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD, mode, target], capture_output=True, text=True,
+                            env=env, check=True).stdout
+    wall = time.perf_counter() - start
+    result = json.loads(output.strip().splitlines()[-1])
+    result['wall'] = wall
+    return result
+
+def bench(mode, target, runs, bytecode=True):
+    if bytecode:
+        # Populate __pycache__ first, like every launch after the first
+        run_child(mode, target, True)
+    results = [run_child(mode, target, bytecode) for _ in range(runs)]
+    rss = [r['rss'] for r in results if r['rss'] is not None]
+    return {
+        'wall': statistics.median(r['wall'] for r in results),
+        'splash': statistics.median(r['splash'] for r in results),
+        'resources': statistics.median(r['resources'] for r in results),
+        'rss': statistics.median(rss) if rss else None,
+        'ok': all(r['ok'] for r in results),
+    }
+
+def report(name, result):
+    rss = f"{result['rss'] / 1048576:7.1f} MB" if result['rss'] else "    n/a"
+    status = "" if result['ok'] else "  (splash failed to load)"
+    print(f"  {name:22} process {result['wall'] * 1000:7.1f} ms  to splash {result['splash'] * 1000:7.1f} ms  "
+          f"resources {result['resources'] * 1000:7.2f} ms  rss {rss}{status}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cold start and memory of resource loading")
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters per variant")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        module_path = write_module(workdir)
+        print(f"resources_rc.py {os.path.getsize(module_path) / 1024:.0f} KB, .rcc "
+              f"{sum(os.path.getsize(os.path.join(RESOURCE_DIR, name)) for name in BUNDLES) / 1024:.0f} KB")
+        report("resources_rc (no .pyc)", bench('module', workdir, args.runs, bytecode=False))
+        report("resources_rc (.pyc)", bench('module', workdir, args.runs))
+        report("rcc", bench('rcc', RESOURCE_DIR, args.runs))
@@ -0,0 +1,85 @@
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from src.mduyt.core.binaries import get_manifest
+from src.mduyt.core.postprocessing import PostProcessTask, ENCODE, run_task, segment_layout
+
+# Run from the repository root: python -m src.test.cli.benchsegment
+# Serial against segmented encoding of one long source, per x264 preset and
+# per core count. Core counts are simulated with CPU affinity (Linux), so
+# a 16-core box can report 4, 8 and 16; counts above the machine's are skipped.
+
+PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"]
+
+def make_source(path, duration, size, rate):
+    # Keyframes every two seconds, like most downloaded streams
+    ffmpeg = get_manifest().path_of('ffmpeg')
+    subprocess.run([ffmpeg, '-y', '-hide_banner', '-loglevel', 'error',
+                    '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate={rate}',
+                    '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=48000',
+                    '-t', str(duration), '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(rate * 2),
+                    '-c:a', 'aac', '-shortest', path], check=True)
+
+def limit_cores(cores):
+    # Child ffmpeg processes inherit the affinity mask
+    if not hasattr(os, 'sched_setaffinity'):
+        return False
+    os.sched_setaffinity(0, set(sorted(os.sched_getaffinity(0))[:cores]))
+    return True
+
+def encode(source, output, preset, crf, cores, segmented):
+    args = ['-c:v', 'libx264', '-preset', preset, '-crf', str(crf)]
+    if not segmented:
+        args += ['-threads', str(cores)]
+    task = PostProcessTask(ENCODE, [source], output, {'args': args, 'segmented': segmented, 'cores': cores})
+    start = time.perf_counter()
+    ok = run_task(task)
+    elapsed = time.perf_counter() - start
+    if not ok:
+        raise RuntimeError(task.error)
+    size = os.path.getsize(output)
+    os.remove(output)
+    return elapsed, size
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark segmented against serial encoding")
+    parser.add_argument("--duration", type=int, default=3600, help="Source length in seconds")
+    parser.add_argument("--size", default="1920x1080", help="Source frame size")
+    parser.add_argument("--rate", type=int, default=30, help="Source frame rate")
+    parser.add_argument("--presets", nargs='+', default=["medium", "slow", "veryslow"], choices=PRESETS,
+                        help="x264 presets, the values of the preset combo")
+    parser.add_argument("--crf", type=int, default=23, help="Quality, the value of the quality spin box")
+    parser.add_argument("--cores", type=int, nargs='+', default=[4, 8, 16], help="Core counts to simulate")
+    parser.add_argument("--source", help="Existing source file instead of a generated one")
+    args = parser.parse_args()
+
+    available = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    workdir = tempfile.mkdtemp(prefix='benchsegment-')
+    try:
+        source = args.source
+        if source is None:
+            source = os.path.join(workdir, 'source.mp4')
+            print(f"Generating a {args.duration} s {args.size} source...")
+            make_source(source, args.duration, args.size, args.rate)
+        output = os.path.join(workdir, 'output.mp4')
+
+        for cores in sorted(args.cores, reverse=True):
+            if cores > available:
+                print(f"{cores} cores: skipped, this machine has {available}")
+                continue
+            if not limit_cores(cores) and cores != available:
+                print(f"{cores} cores: skipped, CPU affinity is not available on this platform")
+                continue
+            jobs, threads, length = segment_layout(args.duration, cores)
+            print(f"{cores} cores ({jobs} encodes x {threads} threads, ~{length:.0f} s pieces)")
+            for preset in args.presets:
+                serial, serial_size = encode(source, output, preset, args.crf, cores, False)
+                segmented, segmented_size = encode(source, output, preset, args.crf, cores, True)
+                print(f"  {preset:10} serial {serial:8.1f} s ({args.duration / serial:5.2f}x)  "
+                      f"segmented {segmented:8.1f} s ({args.duration / segmented:5.2f}x)  "
+                      f"speedup {serial / segmented:4.2f}  size {segmented_size / max(1, serial_size):5.3f} of serial")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
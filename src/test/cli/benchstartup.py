@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import Qt, QObject, QEvent
+from PySide6.QtGui import QStandardItemModel, QStandardItem
+from PySide6.QtWidgets import QApplication, QListView
+from src.mduyt.core.history import HistoryStore
+from src.mduyt.gui.historymodel import HistoryModel, HistoryDelegate
+from src.test.cli.benchhistory import make_entries
+
+# Run from the repository root: python -m src.test.cli.benchstartup
+# Time from creating the history list until it first paints rows, for the
+# chunked background load and for the old "json.load + appendRow in
+# __init__" approach.
+
+class PaintWatcher(QObject):
+    def __init__(self, model, start):
+        super().__init__()
+        self.model = model
+        self.start = start
+        self.first_paint = None
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and self.first_paint is None and self.model.rowCount() > 0:
+            self.first_paint = time.perf_counter() - self.start
+        return False
+
+def wait_for_paint(watcher, timeout=60.0):
+    deadline = time.perf_counter() + timeout
+    while watcher.first_paint is None and time.perf_counter() < deadline:
+        QApplication.processEvents()
+
+def bench_chunked(workdir, size):
+    store = HistoryStore(os.path.join(workdir, 'history.db'), os.path.join(workdir, 'history.json'))
+    start = time.perf_counter()
+    model = HistoryModel(store)
+    view = QListView()
+    view.setUniformItemSizes(True)
+    view.setItemDelegate(HistoryDelegate(view))
+    view.setModel(model)
+    watcher = PaintWatcher(model, start)
+    view.viewport().installEventFilter(watcher)
+    view.resize(600, 800)
+    view.show()
+    model.reload()
+    if size:
+        wait_for_paint(watcher)
+    while model.loading:
+        QApplication.processEvents()
+    loaded = time.perf_counter() - start
+    view.deleteLater()
+    store.close()
+    return watcher.first_paint or 0.0, loaded
+
+def bench_json(workdir, size):
+    json_path = os.path.join(workdir, 'legacy.json')
+    start = time.perf_counter()
+    model = QStandardItemModel()
+    with open(json_path, 'r', encoding='utf-8') as f:
+        for item_data in json.load(f):
+            item = QStandardItem()
+            item.setData(item_data, Qt.UserRole)
+            model.appendRow(item)
+    view = QListView()
+    view.setModel(model)
+    watcher = PaintWatcher(model, start)
+    view.viewport().installEventFilter(watcher)
+    view.resize(600, 800)
+    view.show()
+    if size:
+        wait_for_paint(watcher)
+    loaded = time.perf_counter() - start
+    view.deleteLater()
+    return watcher.first_paint or 0.0, loaded
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark history time-to-first-paint at startup")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[0, 10000, 100000], help="History sizes to test")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    for size in args.sizes:
+        entries = make_entries(size)
+        with tempfile.TemporaryDirectory() as workdir:
+            for name in ('history.json', 'legacy.json'):
+                with open(os.path.join(workdir, name), 'w', encoding='utf-8') as f:
+                    json.dump(entries, f, ensure_ascii=False, indent=2)
+            # Migrated once up front, like any start after the first
+            HistoryStore(os.path.join(workdir, 'history.db'), os.path.join(workdir, 'history.json')).close()
+
+            chunked_paint, chunked_loaded = bench_chunked(workdir, size)
+            json_paint, json_loaded = bench_json(workdir, size)
+
+        print(f"{size} entries")
+        print(f"  chunked  first paint {chunked_paint * 1000:8.1f} ms  all rows {chunked_loaded * 1000:8.1f} ms")
+        print(f"  json     first paint {json_paint * 1000:8.1f} ms  all rows {json_loaded * 1000:8.1f} ms")
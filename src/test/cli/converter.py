@@ -1,10 +1,10 @@
 import argparse
-import re
 import os
-import subprocess
 from rich.console import Console
 from rich.progress import Progress
 from rich import print as rprint
+from src.mduyt.core.ffmpeg import run_ffmpeg
+from src.mduyt.core.probe import probe
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="FFmpeg wrapper with progress bar")
@@ -12,11 +12,12 @@ def parse_arguments():
     return parser.parse_args()
 
 def get_video_duration(input_file):
-    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", input_file]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    return float(result.stdout)
+    info = probe(input_file)
+    if info is None or info.duration is None:
+        raise ValueError(f"Could not read the duration of {input_file}")
+    return info.duration
 
-def run_ffmpeg(input_file, output_file, duration, progress):
+def convert(input_file, output_file, duration, progress):
     cmd = [
         "ffmpeg", "-y",
         "-i", input_file,
@@ -28,24 +29,14 @@ def run_ffmpeg(input_file, output_file, duration, progress):
         output_file
     ]
 
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        universal_newlines=True
-    )
-
     task = progress.add_task("[cyan]Converting...", total=100)
 
-    for line in process.stdout:
-        matches = re.search(r"time=(\d{2}):(\d{2}):(\d{2}\.\d{2})", line)
-        if matches:
-            hours, minutes, seconds = map(float, matches.groups())
-            time_in_secs = hours * 3600 + minutes * 60 + seconds
-            progress_percentage = min(100, time_in_secs / duration * 100)
-            progress.update(task, completed=progress_percentage)
+    def on_progress(update):
+        progress.update(task, completed=update.percent, description=f"[cyan]Converting {update.rate_text()}")
 
-    process.wait()
+    returncode, errors = run_ffmpeg(cmd, duration, on_progress)
+    if returncode != 0:
+        raise RuntimeError(errors[-1] if errors else f"FFmpeg exited with code {returncode}")
     progress.update(task, completed=100)
 
 def main():
@@ -59,7 +50,7 @@ def main():
         duration = get_video_duration(input_file)
         
         with Progress() as progress:
-            run_ffmpeg(input_file, output_file, duration, progress)
+            convert(input_file, output_file, duration, progress)
         
         rprint("[green]Conversion completed successfully![/green]")
     except Exception as e:
@@ -0,0 +1,142 @@
+import argparse
+import email.utils
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Run from the repository root: python -m src.test.cli.updateserver
+# Stand-in for the GitHub releases API. It serves one release as JSON with an
+# ETag and Last-Modified and answers conditional requests with 304. Without
+# --serve it drives GitHubUpdater through the fresh, cached and revalidated
+# cases and checks how many requests reached the server.
+
+class ReleaseHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        if self.path != server.release_path:
+            self.send_error(404)
+            return
+        if server.delay:
+            time.sleep(server.delay)
+        etag = server.etag
+        last_modified = email.utils.formatdate(server.modified, usegmt=True)
+        if self.headers.get('If-None-Match') == etag or (
+                'If-None-Match' not in self.headers and self.headers.get('If-Modified-Since') == last_modified):
+            server.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        body = server.body
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class ReleaseServer(ThreadingHTTPServer):
+    release_path = '/repos/project-mdu/mdu-yt/releases/latest'
+
+    def __init__(self, port=0, tag='v9999.01.01', delay=0.0, verbose=False):
+        super().__init__(('127.0.0.1', port), ReleaseHandler)
+        self.delay = delay
+        self.verbose = verbose
+        self.requests = 0
+        self.not_modified = 0
+        self.publish(tag)
+
+    def publish(self, tag):
+        release = {'tag_name': tag, 'name': tag, 'assets': [
+            {'name': f'mdu-{tag}.zip', 'browser_download_url': f'{self.url_root}/download/mdu-{tag}.zip'},
+            {'name': f'mdu-{tag}.exe', 'browser_download_url': f'{self.url_root}/download/mdu-{tag}.exe'},
+        ]}
+        self.body = json.dumps(release).encode('utf-8')
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest() + '"'
+        self.modified = time.time()
+
+    @property
+    def url_root(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    @property
+    def url(self):
+        return self.url_root + self.release_path
+
+def expect(name, condition):
+    print(f"  {'ok  ' if condition else 'FAIL'} {name}")
+    return condition
+
+def run_checks(server, ttl):
+    from src.mduyt.core.updater import GitHubUpdater
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        cache_path = os.path.join(workdir, 'update.json')
+
+        def updater(current_version='2024.11.01', ttl=ttl):
+            return GitHubUpdater(current_version, api_url=server.url, cache_path=cache_path, ttl=ttl)
+
+        start = time.perf_counter()
+        release = updater().check_for_updates(notify=False)
+        elapsed = time.perf_counter() - start
+        results.append(expect(f"first check downloads the release ({elapsed * 1000:.1f} ms)",
+                              release is not None and server.requests == 1))
+
+        start = time.perf_counter()
+        release = updater().check_for_updates(notify=False)
+        elapsed = time.perf_counter() - start
+        results.append(expect(f"second launch within the TTL stays offline ({elapsed * 1000:.1f} ms)",
+                              release is not None and server.requests == 1))
+
+        start = time.perf_counter()
+        release = updater(ttl=0).check_for_updates(notify=False)
+        elapsed = time.perf_counter() - start
+        results.append(expect(f"expired TTL revalidates with a 304 ({elapsed * 1000:.1f} ms)",
+                              release is not None and server.requests == 2 and server.not_modified == 1))
+
+        server.publish('v9999.02.01')
+        release = updater().check_for_updates(force=True, notify=False)
+        results.append(expect("forced check picks up a new release",
+                              release is not None and release['tag_name'] == 'v9999.02.01'
+                              and server.requests == 3))
+
+        release = updater(current_version='9999.12.31').check_for_updates(force=True, notify=False)
+        results.append(expect("no update when the current version is newer", release is None))
+
+        server.shutdown()
+        server.server_close()
+        release = updater(ttl=0).check_for_updates(notify=False)
+        results.append(expect("unreachable server returns None instead of raising", release is None))
+    return all(results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the GitHub releases API")
+    parser.add_argument("--serve", action="store_true", help="Only serve, until interrupted")
+    parser.add_argument("--port", type=int, default=0, help="Port to listen on (default: any free port)")
+    parser.add_argument("--tag", default="v9999.01.01", help="tag_name of the served release")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before each response")
+    parser.add_argument("--ttl", type=int, default=3600, help="TTL passed to GitHubUpdater")
+    args = parser.parse_args()
+
+    server = ReleaseServer(args.port, args.tag, args.delay, verbose=args.serve)
+    if args.serve:
+        print(f"Serving {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Update checks against {server.url}")
+        raise SystemExit(0 if run_checks(server, args.ttl) else 1)
@@ -1,14 +1,15 @@
 import sys
-import re
 import os
-import subprocess
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QProgressBar, QFileDialog
 from PyQt5.QtCore import QThread, pyqtSignal
+from src.mduyt.core.ffmpeg import run_ffmpeg
+from src.mduyt.core.probe import probe
 
 def get_video_duration(input_file):
-    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", input_file]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    return float(result.stdout)
+    info = probe(input_file)
+    if info is None or info.duration is None:
+        raise ValueError(f"Could not read the duration of {input_file}")
+    return info.duration
 
 class FFmpegThread(QThread):
     progress_update = pyqtSignal(float)
@@ -34,22 +35,11 @@ class FFmpegThread(QThread):
         ]
 
         try:
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True
-            )
-
-            for line in process.stdout:
-                matches = re.search(r"time=(\d{2}):(\d{2}):(\d{2}\.\d{2})", line)
-                if matches:
-                    hours, minutes, seconds = map(float, matches.groups())
-                    time_in_secs = hours * 3600 + minutes * 60 + seconds
-                    progress_percentage = min(100, time_in_secs / self.duration * 100)
-                    self.progress_update.emit(progress_percentage)
-
-            process.wait()
+            returncode, errors = run_ffmpeg(cmd, self.duration,
+                                            lambda update: self.progress_update.emit(update.percent))
+            if returncode != 0:
+                self.error_occurred.emit(errors[-1] if errors else f"FFmpeg exited with code {returncode}")
+                return
             self.conversion_complete.emit()
         except Exception as e:
             self.error_occurred.emit(str(e))